@@ -0,0 +1,178 @@
+"""
+MeritSim - Chunking Benchmark
+Coverage and LLM calls per 100 pages: legacy character chunks vs token-budgeted legal chunks.
+
+Reads the PDFs under a materials folder (pages come from the same extractor
+and page cap the generator uses) or, with --synthetic, a generated
+legal-style document, so it runs without materials or a database:
+
+    python benchmarks/chunking_benchmark.py --materials "../MATERIAL DE ESTUDIO 2026"
+    python benchmarks/chunking_benchmark.py --synthetic 300
+
+Coverage is the share of extracted characters that reach a provider after
+the prompt truncation each strategy applies. Pages past GENERATOR_MAX_PAGES,
+when that cap is set, count as extracted but not covered.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_generator import CHUNK_TOKENS, GENERATOR_CHUNK_OVERLAP_TOKENS, GENERATOR_MAX_PAGES
+from text_chunker import LegalChunker, coverage, estimate_tokens
+from text_store import ExtractedText, extract_pages
+
+# What the generator did before token budgets: 15,000-character chunks of
+# which each provider's prompt kept only the first few thousand characters
+LEGACY_CHUNK_CHARS = 15000
+LEGACY_SENT_CHARS = {"openai": 8000, "gemini": 10000}
+
+
+def legacy_spans(text: str, chunk_size: int = LEGACY_CHUNK_CHARS):
+    spans = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end >= len(text):
+            spans.append((start, len(text)))
+            break
+        breakpoint = text.rfind('\n', start, end)
+        if breakpoint == -1 or breakpoint < start + (chunk_size // 2):
+            breakpoint = text.rfind(' ', start, end)
+        if breakpoint == -1:
+            breakpoint = end
+        spans.append((start, breakpoint))
+        start = breakpoint + 1
+    return spans
+
+
+def synthetic_pages(pages: int, seed: int = 7):
+    """Pages of a code-like document: títulos, capítulos, artículos with numerales and parágrafos"""
+    rng = random.Random(seed)
+    words = (
+        "la entidad servidor público deberá garantizar el cumplimiento de los principios de "
+        "igualdad moralidad eficacia economía celeridad imparcialidad publicidad conforme a la "
+        "ley y al reglamento que para tal efecto expida el gobierno nacional dentro del término"
+    ).split()
+
+    def sentence():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(12, 30))).capitalize() + "."
+
+    lines = []
+    article = 0
+    title = 0
+    while sum(len(line) + 1 for line in lines) < pages * 2800:
+        title += 1
+        lines += ["", f"TÍTULO {title}", "DISPOSICIONES GENERALES"]
+        for chapter in range(1, 5):
+            lines += ["", f"CAPÍTULO {chapter}"]
+            for _ in range(rng.randint(4, 10)):
+                article += 1
+                lines.append(f"ARTÍCULO {article}. {sentence()} {sentence()}")
+                for n in range(1, rng.randint(1, 6)):
+                    lines.append(f"{n}. {sentence()}")
+                if rng.random() < 0.3:
+                    lines.append(f"PARÁGRAFO. {sentence()} {sentence()}")
+
+    # About 2,800 characters per page, broken at line ends like extracted PDF text
+    text_pages, current = [], []
+    size = 0
+    for line in lines:
+        current.append(line)
+        size += len(line) + 1
+        if size >= 2800:
+            text_pages.append("\n".join(current))
+            current, size = [], 0
+    if current:
+        text_pages.append("\n".join(current))
+    return text_pages[:pages]
+
+
+def load_documents(args):
+    if args.synthetic:
+        return [("synthetic", synthetic_pages(args.synthetic))]
+    documents = []
+    for root, _, files in os.walk(args.materials):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(root, name)
+                documents.append((os.path.relpath(path, args.materials), extract_pages(path)))
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--materials", help="Folder of PDFs to chunk")
+    parser.add_argument("--synthetic", type=int, metavar="PAGES", help="Use a generated document of this many pages")
+    parser.add_argument("--min-coverage", type=float, default=100.0, help="Percent the new chunker must reach")
+    args = parser.parse_args()
+    if not args.materials and not args.synthetic:
+        parser.error("pass --materials or --synthetic")
+
+    chunk_tokens = CHUNK_TOKENS
+    totals = Counter()
+    boundaries = Counter()
+    chunk_seconds = 0.0
+    for _, pages in load_documents(args):
+        extracted = ExtractedText.from_pages(pages, max_pages=GENERATOR_MAX_PAGES)
+        length = len(extracted.text)
+        if not length:
+            continue
+        # Characters on pages past the cap never reach a provider
+        skipped = len(ExtractedText.from_pages(pages).text) - length
+        totals["documents"] += 1
+        totals["pages"] += len(pages)
+        totals["skipped_pages"] += len(pages[GENERATOR_MAX_PAGES:]) if GENERATOR_MAX_PAGES else 0
+        totals["chars"] += length + skipped
+
+        legacy = legacy_spans(extracted.text)
+        totals["legacy_calls"] += len(legacy)
+        for provider, sent in LEGACY_SENT_CHARS.items():
+            totals[f"legacy_covered_{provider}"] += coverage(length, legacy, sent) * length
+
+        started = time.perf_counter()
+        chunks = LegalChunker(extracted.text).chunks(chunk_tokens, GENERATOR_CHUNK_OVERLAP_TOKENS)
+        chunk_seconds += time.perf_counter() - started
+        spans = [(start, end) for start, end, _ in chunks]
+        totals["calls"] += len(spans)
+        totals["covered"] += coverage(length, spans) * length
+        totals["sent_chars"] += sum(end - start for start, end in spans)
+        totals["max_tokens"] = max(totals["max_tokens"], *(estimate_tokens(extracted.text[s:e]) for s, e in spans))
+        boundaries.update(kind for _, _, kind in chunks)
+
+    if not totals["chars"]:
+        print("No text to chunk")
+        sys.exit(1)
+
+    pages = max(1, totals["pages"])
+    new_coverage = totals["covered"] / totals["chars"] * 100
+    print("=" * 60)
+    print(f"✂️  Chunking benchmark ({totals['documents']} documents, {totals['pages']} pages, {totals['chars']:,} chars)")
+    print("=" * 60)
+    print(f"  legacy  {LEGACY_CHUNK_CHARS:,}-char chunks")
+    print(f"    calls per 100 pages   {totals['legacy_calls'] / pages * 100:8.1f}")
+    for provider in LEGACY_SENT_CHARS:
+        print(f"    coverage ({provider:<6})     {totals[f'legacy_covered_{provider}'] / totals['chars'] * 100:7.1f} %")
+    print(f"  legal   {chunk_tokens}-token chunks, {GENERATOR_CHUNK_OVERLAP_TOKENS}-token overlap"
+          + (f", first {GENERATOR_MAX_PAGES} pages ({totals['skipped_pages']} skipped)" if GENERATOR_MAX_PAGES else ""))
+    print(f"    calls per 100 pages   {totals['calls'] / pages * 100:8.1f}")
+    print(f"    coverage              {new_coverage:7.1f} %")
+    print(f"    overlap               {(totals['sent_chars'] / (totals['covered'] or 1) - 1) * 100:7.1f} % extra text sent")
+    print(f"    largest chunk         {totals['max_tokens']:8d} tokens (estimated)")
+    print(f"    chunking time         {chunk_seconds * 1000:8.1f} ms")
+    print("    chunks ending on      " + ", ".join(
+        f"{kind} {count / totals['calls']:.0%}" for kind, count in boundaries.most_common()
+    ))
+
+    if new_coverage < args.min_coverage or totals["max_tokens"] > chunk_tokens:
+        print(f"\n❌ Coverage below {args.min_coverage:.1f}% or a chunk over the {chunk_tokens}-token budget")
+        sys.exit(1)
+    print("\n✅ Every extracted character reaches a provider within budget")
+
+
+if __name__ == "__main__":
+    main()
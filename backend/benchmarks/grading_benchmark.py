@@ -0,0 +1,106 @@
+"""
+MeritSim - Simulacro Grading Benchmark
+Compares per-answer grading with the batched path for 20, 100 and 500 answers.
+
+Runs against DATABASE_URL inside transactions that are rolled back, so it
+leaves no rows behind:
+
+    python benchmarks/grading_benchmark.py --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import SessionLocal, Answer, Question, StudySession, StudyMode, User
+from grading_service import award_xp, grade_answers, load_questions_by_id, save_answers
+
+
+def _fake_answers(question_ids, n):
+    return [
+        SimpleNamespace(
+            question_id=question_ids[i % len(question_ids)],
+            selected_option=random.choice("ABCD"),
+            time_spent_seconds=random.randint(5, 90)
+        )
+        for i in range(n)
+    ]
+
+
+def _legacy(db, session, user, answers):
+    total_xp = 0
+    for ans in answers:
+        question = db.query(Question).filter(Question.id == ans.question_id).first()
+        if not question:
+            continue
+        is_correct = ans.selected_option.upper() == question.correct_answer.upper()
+        if is_correct:
+            total_xp += question.xp_reward
+        db.add(Answer(
+            session_id=session.id,
+            user_id=user.id,
+            question_id=question.id,
+            selected_option=ans.selected_option.upper(),
+            is_correct=is_correct,
+            time_spent_seconds=ans.time_spent_seconds
+        ))
+    user.xp_points += total_xp
+    db.flush()
+
+
+def _batched(db, session, user, answers):
+    questions = load_questions_by_id(db, (ans.question_id for ans in answers))
+    graded = grade_answers(answers, questions)
+    save_answers(db, session.id, user.id, graded.answers)
+    award_xp(db, user.id, graded.total_xp)
+    db.flush()
+
+
+def _time(grader, user_id, answers) -> float:
+    db = SessionLocal()
+    try:
+        user = db.get(User, user_id)
+        session = StudySession(user_id=user.id, mode=StudyMode.SIMULACRO)
+        db.add(session)
+        db.flush()
+        started = time.perf_counter()
+        grader(db, session, user, answers)
+        return time.perf_counter() - started
+    finally:
+        db.rollback()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="20,100,500")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).first()
+        question_ids = [qid for (qid,) in db.query(Question.id).filter(Question.is_active == True)]
+    finally:
+        db.close()
+    if not user or not question_ids:
+        print("⚠️ Seed the database first (python seed_init.py)")
+        return
+
+    print("=" * 60)
+    print(f"📝 Grading benchmark ({len(question_ids)} questions in bank, best of {args.repeat})")
+    print("=" * 60)
+    print(f"  {'answers':>8} {'per-answer':>12} {'batched':>12} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        answers = _fake_answers(question_ids, size)
+        legacy = min(_time(_legacy, user.id, answers) for _ in range(args.repeat))
+        batched = min(_time(_batched, user.id, answers) for _ in range(args.repeat))
+        print(f"  {size:>8} {legacy * 1000:>9.1f} ms {batched * 1000:>9.1f} ms {legacy / batched:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
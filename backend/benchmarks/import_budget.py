@@ -0,0 +1,81 @@
+"""
+MeritSim - Import-Time Budget
+Cold-start import cost of the API and the question generator, via python -X importtime.
+
+Each module is imported in a fresh interpreter (best of --repeat runs, so
+bytecode compilation is excluded) and must stay under its budget without
+loading the modules it is not supposed to load: LLM SDKs and pypdf are
+imported on first use, and the generator never imports the web app.
+
+    python benchmarks/import_budget.py --scale 1.5   # slower machine / CI
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SDKS = ["openai", "google.generativeai", "pypdf"]
+
+# module, budget in ms, modules it must not import
+TARGETS = [
+    ("main", 2500, SDKS),
+    ("question_generator", 1200, SDKS + ["fastapi", "main"]),
+]
+
+
+def import_profile(module: str) -> Tuple[float, Dict[str, float]]:
+    """Cumulative ms to import a module, and self ms of everything it imported"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    self_ms: Dict[str, float] = {}
+    total_ms = 0.0
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        self_ms[name.strip()] = int(own) / 1000
+        if name.strip() == module:
+            total_ms = int(cumulative) / 1000
+    return total_ms, self_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget")
+    parser.add_argument("--top", type=int, default=8, help="Slowest modules to list per target")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️ Import-time budget")
+    print("=" * 60)
+    failures: List[str] = []
+    for module, budget_ms, forbidden in TARGETS:
+        budget_ms *= args.scale
+        runs = [import_profile(module) for _ in range(args.repeat)]
+        total_ms, self_ms = min(runs, key=lambda run: run[0])
+        loaded = [name for name in forbidden if name in self_ms]
+        ok = total_ms <= budget_ms and not loaded
+        print(f"\n{'✅' if ok else '❌'} import {module}: {total_ms:.0f} ms (budget {budget_ms:.0f} ms)")
+        for name, ms in sorted(self_ms.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"   {ms:>8.1f} ms  {name}")
+        if total_ms > budget_ms:
+            failures.append(f"{module} took {total_ms:.0f} ms")
+        if loaded:
+            print(f"   ⚠️ loaded eagerly: {', '.join(loaded)}")
+            failures.append(f"{module} imports {', '.join(loaded)}")
+
+    print()
+    if failures:
+        print("❌ " + "; ".join(failures))
+        sys.exit(1)
+    print("✅ All imports within budget")
+
+
+if __name__ == "__main__":
+    main()
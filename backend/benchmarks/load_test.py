@@ -0,0 +1,97 @@
+"""
+MeritSim - Login + Simulacro Load Test
+Measures concurrent throughput of the auth and exam-start endpoints.
+
+Run it against a live API before and after a change and compare the summaries:
+
+    python benchmarks/load_test.py --base-url http://localhost:9011 \
+        --email admin@admin.com --password admin_password --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+
+async def _login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await client.post(
+        "/api/auth/login-json", json={"email": email, "password": password}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def _start_simulacro(client: httpx.AsyncClient, token: str, num_questions: int):
+    response = await client.post(
+        "/api/study/simulacro/start",
+        json={"num_questions": num_questions},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    response.raise_for_status()
+
+
+async def _worker(
+    client: httpx.AsyncClient, args, latencies: Dict[str, List[float]], errors: List[str]
+):
+    for _ in range(args.iterations):
+        try:
+            started = time.perf_counter()
+            token = await _login(client, args.email, args.password)
+            latencies["login"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await _start_simulacro(client, token, args.num_questions)
+            latencies["simulacro_start"].append(time.perf_counter() - started)
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+
+
+def _summary(name: str, samples: List[float], elapsed: float) -> str:
+    if not samples:
+        return f"  {name:<16} no successful requests"
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (
+        f"  {name:<16} {len(samples) / elapsed:8.1f} req/s   "
+        f"p50 {statistics.median(ordered) * 1000:7.1f} ms   "
+        f"p95 {p95 * 1000:7.1f} ms   max {ordered[-1] * 1000:7.1f} ms"
+    )
+
+
+async def run(args):
+    latencies: Dict[str, List[float]] = {"login": [], "simulacro_start": []}
+    errors: List[str] = []
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            _worker(client, args, latencies, errors) for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    print("=" * 60)
+    print(f"📈 Load test: {args.concurrency} clients x {args.iterations} iterations")
+    print("=" * 60)
+    for name, samples in latencies.items():
+        print(_summary(name, samples, elapsed))
+    print(f"  Total time: {elapsed:.2f}s   Errors: {len(errors)}")
+    if errors:
+        print(f"  First error: {errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:9011")
+    parser.add_argument("--email", default="admin@admin.com")
+    parser.add_argument("--password", default="admin_password")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--num-questions", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+MeritSim - Mock OpenAI-compatible LLM Server
+Answers /v1/chat/completions after a configurable delay, for load tests.
+With "stream": true the delay is spread across SSE chunks, and /stats
+reports how many streams the caller abandoned before the end.
+
+    python benchmarks/mock_llm_server.py --port 9099 --delay 3
+    OPENAI_API_KEY=mock OPENAI_BASE_URL=http://localhost:9099/v1 uvicorn main:app --port 9011
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="Mock LLM")
+app.state.delay = 3.0
+app.state.error_rate = 0.0
+app.state.streams = {"completed": 0, "aborted": 0}
+
+STREAM_TOKENS = 120
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason=None, usage=None) -> str:
+    return "data: " + json.dumps({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+        "usage": usage
+    }) + "\n\n"
+
+
+async def _stream(body: dict):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    model = body.get("model", "mock")
+    finished = False
+    try:
+        yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+        for i in range(STREAM_TOKENS):
+            await asyncio.sleep(app.state.delay / STREAM_TOKENS)
+            yield _chunk(completion_id, model, {"content": "Respuesta " if i % 2 == 0 else "simulada. "})
+        yield _chunk(completion_id, model, {}, finish_reason="stop")
+        if body.get("stream_options", {}).get("include_usage"):
+            yield _chunk(completion_id, model, None, usage={
+                "prompt_tokens": 100, "completion_tokens": STREAM_TOKENS, "total_tokens": 100 + STREAM_TOKENS
+            })
+        yield "data: [DONE]\n\n"
+        finished = True
+    finally:
+        app.state.streams["completed" if finished else "aborted"] += 1
+
+
+@app.get("/stats")
+async def stats():
+    return app.state.streams
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if body.get("stream"):
+        return StreamingResponse(_stream(body), media_type="text/event-stream")
+    await asyncio.sleep(app.state.delay)
+    content = "Respuesta simulada del tutor. " * 20
+    if body.get("response_format", {}).get("type") == "json_object":
+        content = '{"questions": []}'
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 120, "total_tokens": 220}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=9099)
+    parser.add_argument("--delay", type=float, default=3.0, help="Seconds per completion")
+    args = parser.parse_args()
+    app.state.delay = args.delay
+    uvicorn.run(app, host="0.0.0.0", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+MeritSim - Tutor Concurrency Benchmark
+Samples latency of a non-AI endpoint while N tutor chats are in flight.
+
+Start benchmarks/mock_llm_server.py and point the API at it (see that file),
+then raise LLM_USER_RATE_PER_MINUTE / LLM_USER_BURST so one test user is not
+throttled, and run:
+
+    python benchmarks/tutor_concurrency.py --chats 50 --email admin@admin.com --password admin_password
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+import httpx
+
+
+def _percentiles(samples: List[float]) -> str:
+    if not samples:
+        return "no samples"
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+    return f"n={len(ordered):<5} p50 {pick(0.50):7.1f} ms   p99 {pick(0.99):7.1f} ms   max {ordered[-1] * 1000:7.1f} ms"
+
+
+async def _probe(client: httpx.AsyncClient, path: str, headers: dict, stop: asyncio.Event, samples: List[float]):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(path, headers=headers)
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.02)
+
+
+async def _chat(client: httpx.AsyncClient, headers: dict, results: List[float]):
+    started = time.perf_counter()
+    response = await client.post("/api/chat", json={"message": "¿Qué es el IVA?"}, headers=headers)
+    if response.status_code == 200:
+        results.append(time.perf_counter() - started)
+
+
+async def run(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120,
+                                 limits=httpx.Limits(max_connections=args.chats + 10)) as client:
+        login = await client.post("/api/auth/login-json", json={"email": args.email, "password": args.password})
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        baseline: List[float] = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe(client, args.probe_path, headers, stop, baseline))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        await probe
+
+        under_load: List[float] = []
+        chats: List[float] = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe(client, args.probe_path, headers, stop, under_load))
+        await asyncio.gather(*[_chat(client, headers, chats) for _ in range(args.chats)])
+        stop.set()
+        await probe
+
+    print("=" * 60)
+    print(f"🤖 {args.chats} concurrent tutor chats vs GET {args.probe_path}")
+    print("=" * 60)
+    print(f"  idle        {_percentiles(baseline)}")
+    print(f"  under load  {_percentiles(under_load)}")
+    print(f"  chats       {_percentiles(chats)}   ({len(chats)}/{args.chats} succeeded)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:9011")
+    parser.add_argument("--email", default="admin@admin.com")
+    parser.add_argument("--password", default="admin_password")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--probe-path", default="/api/health")
+    parser.add_argument("--baseline-seconds", type=float, default=3.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+MeritSim - Catalog Service
+Cached entity/topic listings with question counts for the selection screens
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from models import Entity, Question, Topic
+
+# Fallback for writers in other processes (question_generator, seed_init)
+# that cannot call invalidate() on this cache.
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", "60"))
+# topic_totals keys come from request parameters, so the cache is bounded
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "512"))
+
+
+class CachedPayload:
+    def __init__(self, data: List[Dict], previous: Optional["CachedPayload"] = None):
+        self.data = data
+        body = json.dumps(data, sort_keys=True, default=str).encode()
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if previous is not None and previous.etag == self.etag:
+            # Rebuilt but unchanged: keep the validator stable
+            self.last_modified = previous.last_modified
+        else:
+            self.last_modified = datetime.utcnow().replace(microsecond=0)
+        self.built_at = time.monotonic()
+
+
+class CatalogCache:
+    """Entity and topic listings, each computed with a single GROUP BY"""
+
+    def __init__(self, ttl_seconds: int = CATALOG_CACHE_TTL_SECONDS,
+                 max_entries: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, CachedPayload] = {}
+        self._stale = False
+
+    def invalidate(self):
+        """Force a rebuild (questions seeded, generated or deactivated)"""
+        self._stale = True
+
+    def _fresh(self, entry: Optional[CachedPayload]) -> bool:
+        return entry is not None and time.monotonic() - entry.built_at < self.ttl_seconds
+
+    def _get(self, key: str, db: Session, build) -> CachedPayload:
+        if self._stale:
+            with self._lock:
+                for cached in self._entries.values():
+                    cached.built_at = 0.0
+                self._stale = False
+        entry = self._entries.get(key)
+        if self._fresh(entry):
+            return entry
+        with self._lock:
+            entry = self._entries.get(key)
+            if not self._fresh(entry):
+                entry = CachedPayload(build(db), previous=entry)
+                # Re-inserted so the dict stays ordered by build time; the
+                # least recently rebuilt entries are evicted first
+                self._entries.pop(key, None)
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            return entry
+
+    @staticmethod
+    def _question_counts(db: Session, column) -> Dict[Optional[int], int]:
+        rows = db.query(column, func.count(Question.id)).filter(
+            Question.is_active == True
+        ).group_by(column).all()
+        return dict(rows)
+
+    def _build_entities(self, db: Session) -> List[Dict]:
+        counts = self._question_counts(db, Question.entity_id)
+        return [
+            {
+                "id": e.id,
+                "name": e.name,
+                "description": e.description,
+                "icon": e.icon,
+                "color": e.color,
+                "question_count": counts.get(e.id, 0)
+            }
+            for e in db.query(Entity).order_by(Entity.id).all()
+        ]
+
+    def _build_topics(self, db: Session) -> List[Dict]:
+        counts = self._question_counts(db, Question.topic_id)
+        return [
+            {
+                "id": t.id,
+                "name": t.name,
+                "description": t.description,
+                "question_count": counts.get(t.id, 0)
+            }
+            for t in db.query(Topic).order_by(Topic.id).all()
+        ]
+
+    @staticmethod
+    def _build_topic_totals(db: Session, entity_id: Optional[int], profile_id: Optional[int]) -> List[Dict]:
+        query = db.query(
+            Question.topic_id, Topic.name, func.count(Question.id)
+        ).outerjoin(Topic, Question.topic_id == Topic.id).filter(Question.is_active == True)
+        if entity_id:
+            query = query.filter(Question.entity_id == entity_id)
+        if profile_id:
+            query = query.filter(Question.profile_id == profile_id)
+        return [
+            {"topic_id": topic_id, "topic": name, "total_questions": total}
+            for topic_id, name, total in query.group_by(Question.topic_id, Topic.name).all()
+        ]
+
+    def topic_totals(self, db: Session, entity_id: Optional[int] = None,
+                     profile_id: Optional[int] = None) -> List[Dict]:
+        """Active question count per topic for one (entity, profile) selection"""
+        return self._get(
+            f"topic_totals:{entity_id}:{profile_id}", db,
+            lambda session: self._build_topic_totals(session, entity_id, profile_id)
+        ).data
+
+    def entities(self, db: Session) -> CachedPayload:
+        return self._get("entities", db, self._build_entities)
+
+    def topics(self, db: Session) -> CachedPayload:
+        return self._get("topics", db, self._build_topics)
+
+
+catalog = CatalogCache()
+
+
+def _on_catalog_change(mapper, connection, target):
+    catalog.invalidate()
+
+
+for _model in (Question, Entity, Topic):
+    event.listen(_model, "after_insert", _on_catalog_change)
+    event.listen(_model, "after_update", _on_catalog_change)
+    event.listen(_model, "after_delete", _on_catalog_change)
+
+
+def _not_modified(request: Request, payload: CachedPayload) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return payload.etag in [tag.strip() for tag in if_none_match.split(",")] \
+            or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return False
+        return payload.last_modified <= since
+    return False
+
+
+def conditional_response(request: Request, payload: CachedPayload) -> Response:
+    """JSON response with ETag/Last-Modified, or 304 if the client copy is current"""
+    headers = {
+        "ETag": payload.etag,
+        "Last-Modified": format_datetime(
+            payload.last_modified.replace(tzinfo=timezone.utc), usegmt=True
+        ),
+        # Always revalidate; the 304 path makes that cheap.
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(request, payload):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=payload.data, headers=headers)
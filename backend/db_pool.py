@@ -0,0 +1,173 @@
+"""
+MeritSim - Database Pool Settings & Instrumentation
+Environment-driven pool configuration and checkout metrics for the engines
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 disables
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_SLOW_CHECKOUT_MS = float(os.getenv("DB_SLOW_CHECKOUT_MS", "100"))
+
+
+class PoolMetrics:
+    """Rolling checkout statistics for one engine's pool"""
+
+    def __init__(self, name: str, window: int = 1000):
+        self.name = name
+        self.engine = None
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self._slow = deque(maxlen=20)
+        self._checkout_started: Dict[int, float] = {}
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.max_hold_ms = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        wait_ms = seconds * 1000
+        with self._lock:
+            self._waits.append(wait_ms)
+            if timed_out:
+                self.timeouts += 1
+            if wait_ms >= DB_SLOW_CHECKOUT_MS:
+                self.slow_checkouts += 1
+                self._slow.append({
+                    "at": datetime.utcnow().isoformat(),
+                    "wait_ms": round(wait_ms, 1),
+                    "timed_out": timed_out,
+                    "checked_out": self.pool.checkedout() if self.pool else None,
+                    "overflow": self.pool.overflow() if self.pool else None
+                })
+        if wait_ms >= DB_SLOW_CHECKOUT_MS:
+            logger.warning(
+                f"Slow DB pool checkout on {self.name}: {wait_ms:.1f} ms "
+                f"(checked out {self.pool.checkedout() if self.pool else '?'})"
+            )
+
+    @property
+    def pool(self):
+        return self.engine.pool if self.engine is not None else None
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self._checkout_started[id(connection_record)] = time.perf_counter()
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        started = self._checkout_started.pop(id(connection_record), None)
+        if started is not None:
+            held_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.max_hold_ms = max(self.max_hold_ms, held_ms)
+
+    def on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            slow = list(self._slow)
+        pool = self.pool
+        return {
+            "pool_size": pool.size() if pool else None,
+            "checked_out": pool.checkedout() if pool else None,
+            "checked_in": pool.checkedin() if pool else None,
+            "overflow": pool.overflow() if pool else None,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits), 2) if waits else 0,
+                "p95": round(waits[int(len(waits) * 0.95)] if waits else 0, 2),
+                "max": round(waits[-1], 2) if waits else 0
+            },
+            "max_hold_ms": round(self.max_hold_ms, 1),
+            "slow_checkout_threshold_ms": DB_SLOW_CHECKOUT_MS,
+            "slow_checkouts": self.slow_checkouts,
+            "recent_slow_checkouts": slow
+        }
+
+
+def _timed(base):
+    """Pool subclass that measures how long callers wait for a connection"""
+
+    class TimedPool(base):
+        metrics: Optional[PoolMetrics] = None
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except Exception as e:
+                if self.metrics:
+                    self.metrics.record_wait(
+                        time.perf_counter() - started, timed_out=isinstance(e, exc.TimeoutError)
+                    )
+                raise
+            if self.metrics:
+                self.metrics.record_wait(time.perf_counter() - started)
+            return conn
+
+        def recreate(self):
+            pool = super().recreate()
+            pool.metrics = self.metrics
+            return pool
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+TimedQueuePool = _timed(QueuePool)
+TimedAsyncAdaptedQueuePool = _timed(AsyncAdaptedQueuePool)
+
+
+def pool_options(async_driver: bool = False) -> Dict:
+    """Keyword arguments for create_engine / create_async_engine"""
+    return {
+        "poolclass": TimedAsyncAdaptedQueuePool if async_driver else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def instrument(name: str, engine) -> PoolMetrics:
+    """Attach pool event listeners to a (sync) engine and register its metrics"""
+    metrics = PoolMetrics(name)
+    metrics.engine = engine
+    engine.pool.metrics = metrics
+    event.listen(engine, "checkout", metrics.on_checkout)
+    event.listen(engine, "checkin", metrics.on_checkin)
+    event.listen(engine, "connect", metrics.on_connect)
+    event.listen(engine, "invalidate", metrics.on_invalidate)
+    pool_metrics[name] = metrics
+    return metrics
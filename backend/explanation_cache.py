@@ -0,0 +1,154 @@
+"""
+MeritSim - Explanation Cache
+Two-tier cache (in-process LRU + ai_explanations table) for AI explanations,
+with concurrent identical misses coalesced into one completion
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import AIExplanation, AsyncSessionLocal
+from openai_service import (
+    EXPLANATION_FAILED, EXPLANATION_NOT_CONFIGURED, EXPLANATION_PROMPT_VERSION,
+    generate_explanation_openai
+)
+
+EXPLANATION_LRU_SIZE = int(os.getenv("EXPLANATION_LRU_SIZE", "5000"))
+# Explanations generated at once by the admin precompute, which shares the
+# async connection pool and the OpenAI slots with logins and students
+EXPLANATION_PRECOMPUTE_CONCURRENCY = int(os.getenv("EXPLANATION_PRECOMPUTE_CONCURRENCY", "4"))
+
+# (question_id, selected_option, is_correct, prompt_version)
+ExplanationKey = Tuple[int, str, bool, str]
+
+
+class ExplanationCache:
+    def __init__(self, maxsize: int = EXPLANATION_LRU_SIZE):
+        self.maxsize = maxsize
+        self._lru: "OrderedDict[ExplanationKey, str]" = OrderedDict()
+        self._inflight: Dict[ExplanationKey, asyncio.Future] = {}
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _remember(self, key: ExplanationKey, explanation: str):
+        self._lru[key] = explanation
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    async def _load(self, db: AsyncSession, key: ExplanationKey) -> Optional[str]:
+        question_id, selected, is_correct, version = key
+        return (await db.execute(select(AIExplanation.explanation).where(
+            AIExplanation.question_id == question_id,
+            AIExplanation.selected_option == selected,
+            AIExplanation.is_correct == is_correct,
+            AIExplanation.prompt_version == version
+        ))).scalar()
+
+    async def _generate(self, db: AsyncSession, key: ExplanationKey, question,
+                        topic: Optional[str]) -> str:
+        question_id, selected, is_correct, version = key
+        self.misses += 1
+        question_text, correct_answer = question.text, question.correct_answer
+        # End the read transaction: the connection goes back to the pool
+        # instead of idling through the LLM call
+        await db.commit()
+        explanation = await generate_explanation_openai(
+            question_text=question_text,
+            correct_answer=correct_answer,
+            user_answer=selected,
+            topic=topic,
+            is_correct=is_correct
+        )
+        if explanation in (EXPLANATION_FAILED, EXPLANATION_NOT_CONFIGURED):
+            # Not cached: the next request should try the provider again
+            return explanation
+
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(AIExplanation).values(
+                question_id=question_id,
+                selected_option=selected,
+                is_correct=is_correct,
+                prompt_version=version,
+                explanation=explanation
+            ).on_conflict_do_nothing())
+            await session.commit()
+        self._remember(key, explanation)
+        return explanation
+
+    async def get(self, db: AsyncSession, question, selected_option: str,
+                  is_correct: bool, topic: Optional[str] = None,
+                  charge: Optional[Callable[[], None]] = None) -> str:
+        """
+        Explanation for a (question, option) pair, generating it at most once.
+        charge() runs only when this request is about to call the LLM (e.g.
+        a per-user rate limit that raises); cache hits and requests that
+        join an in-flight generation are free.
+        """
+        key = (question.id, selected_option.upper(), is_correct, EXPLANATION_PROMPT_VERSION)
+        cached = self._lru.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._lru.move_to_end(key)
+            return cached
+
+        while True:
+            pending = self._inflight.get(key)
+            if pending is not None:
+                self.coalesced += 1
+                try:
+                    return await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if not pending.cancelled():
+                        raise  # this request was cancelled, not the one generating
+                    # The generating request went away; take over (or join a newer one)
+                    continue
+            stored = await self._load(db, key)
+            if stored is not None:
+                self.db_hits += 1
+                self._remember(key, stored)
+                return stored
+            if key not in self._inflight:
+                break
+            # Another request started generating during the lookup: join it
+
+        # Charged before registering, so a refusal never reaches other waiters
+        if charge is not None:
+            charge()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            explanation = await self._generate(db, key, question, topic)
+            future.set_result(explanation)
+            return explanation
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the exception; avoid "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {
+            "lru_entries": len(self._lru),
+            "lru_hits": self.hits,
+            "db_hits": self.db_hits,
+            "generated": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "prompt_version": EXPLANATION_PROMPT_VERSION
+        }
+
+
+explanation_cache = ExplanationCache()
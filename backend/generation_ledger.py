@@ -0,0 +1,244 @@
+"""
+MeritSim - Question Generation Ledger
+Job and per-chunk bookkeeping that makes question_generator.py resumable
+
+A chunk is recorded in generation_chunks in the same transaction that inserts
+its questions, so after a crash every chunk is either fully saved and recorded
+or absent and regenerated on the next run.
+"""
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, GenerationChunk, GenerationJob, Question
+from question_dedup import screen, store_signatures
+
+
+@dataclass
+class ChunkResult:
+    job_id: int
+    content_hash: str
+    chunk_index: int
+    provider: str
+    rows: List[Dict]
+
+
+def file_hash(filepath: str) -> str:
+    """sha256 of the file bytes: renamed or moved PDFs keep their ledger"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_completed(content_hash: str, prompt_version: str) -> bool:
+    db = SessionLocal()
+    try:
+        status = db.execute(select(GenerationJob.status).where(
+            GenerationJob.content_hash == content_hash,
+            GenerationJob.prompt_version == prompt_version
+        )).scalar()
+        return status == "completed"
+    finally:
+        db.close()
+
+
+def start_job(content_hash: str, prompt_version: str, filepath: str,
+              material_id: Optional[int], total_chunks: int) -> Tuple[int, Set[int]]:
+    """Create or resume the job for a material; returns its id and the chunk indexes already done"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        stmt = pg_insert(GenerationJob).values(
+            content_hash=content_hash,
+            prompt_version=prompt_version,
+            filepath=filepath,
+            material_id=material_id,
+            status="running",
+            total_chunks=total_chunks,
+            completed_chunks=0,
+            questions_created=0,
+            started_at=now,
+            updated_at=now
+        )
+        job_id = db.execute(stmt.on_conflict_do_update(
+            index_elements=["content_hash", "prompt_version"],
+            set_={
+                "filepath": stmt.excluded.filepath,
+                "material_id": stmt.excluded.material_id,
+                "status": "running",
+                "total_chunks": stmt.excluded.total_chunks,
+                "updated_at": now,
+                "finished_at": None
+            }
+        ).returning(GenerationJob.id)).scalar()
+        done = set(db.execute(select(GenerationChunk.chunk_index).where(
+            GenerationChunk.content_hash == content_hash,
+            GenerationChunk.prompt_version == prompt_version
+        )).scalars())
+        db.commit()
+        return job_id, done
+    finally:
+        db.close()
+
+
+def commit_chunks(results: List[ChunkResult], prompt_version: str) -> int:
+    """
+    Record chunks and insert their questions atomically; returns questions inserted.
+
+    A chunk already recorded (by any provider, e.g. a concurrent run) is
+    dropped along with its questions instead of being inserted twice.
+    Questions that near-duplicate the active bank or each other are dropped
+    too (see question_dedup.screen), as are exact repeats of any question's
+    text, and counted as duplicates_skipped.
+    """
+    # The same chunk twice in one batch would both match the single claimed row
+    results = list({(r.content_hash, r.chunk_index): r for r in reversed(results)}.values())
+    db = SessionLocal()
+    try:
+        claimed = set(db.execute(
+            pg_insert(GenerationChunk).values([
+                {
+                    "content_hash": r.content_hash,
+                    "chunk_index": r.chunk_index,
+                    "provider": r.provider,
+                    "prompt_version": prompt_version,
+                    "job_id": r.job_id,
+                    "questions_created": len(r.rows),
+                    "completed_at": datetime.utcnow()
+                }
+                for r in results
+            ]).on_conflict_do_nothing().returning(
+                GenerationChunk.content_hash, GenerationChunk.chunk_index
+            )
+        ).all())
+        accepted = [r for r in results if (r.content_hash, r.chunk_index) in claimed]
+        signatures = iter(screen(db, [row for r in accepted for row in r.rows]))
+
+        # Near-duplicates are screened out; exact repeats of a question's text
+        # (in the batch, or in the bank by ux_questions_content_hash) skipped
+        rows, kept_signatures, owners = [], [], []
+        batch_hashes = set()
+        for i, r in enumerate(accepted):
+            for row in r.rows:
+                sig = next(signatures)
+                if sig is not None and row["content_hash"] not in batch_hashes:
+                    batch_hashes.add(row["content_hash"])
+                    rows.append(row)
+                    kept_signatures.append(sig)
+                    owners.append(i)
+
+        inserted_hashes = set()
+        if rows:
+            inserted = db.execute(
+                pg_insert(Question).values(rows)
+                .on_conflict_do_nothing(index_elements=["content_hash"])
+                .returning(Question.id, Question.content_hash)
+            ).all()
+            signature_by_hash = {row["content_hash"]: sig for row, sig in zip(rows, kept_signatures)}
+            store_signatures(
+                db, [question_id for question_id, _ in inserted],
+                [signature_by_hash[content_hash] for _, content_hash in inserted]
+            )
+            inserted_hashes = {content_hash for _, content_hash in inserted}
+
+        kept_per_chunk = [0] * len(accepted)
+        for row, i in zip(rows, owners):
+            if row["content_hash"] in inserted_hashes:
+                kept_per_chunk[i] += 1
+        trimmed = []
+        per_job: Dict[int, List[int]] = {}
+        for r, kept in zip(accepted, kept_per_chunk):
+            if kept < len(r.rows):
+                trimmed.append({
+                    "content_hash": r.content_hash,
+                    "chunk_index": r.chunk_index,
+                    "provider": r.provider,
+                    "prompt_version": prompt_version,
+                    "questions_created": kept
+                })
+            counts = per_job.setdefault(r.job_id, [0, 0, 0])
+            counts[0] += 1
+            counts[1] += kept
+            counts[2] += len(r.rows) - kept
+
+        if trimmed:
+            db.execute(update(GenerationChunk), trimmed)
+        for job_id, (chunks, questions, duplicates) in per_job.items():
+            db.execute(update(GenerationJob).where(GenerationJob.id == job_id).values(
+                completed_chunks=GenerationJob.completed_chunks + chunks,
+                questions_created=GenerationJob.questions_created + questions,
+                duplicates_skipped=GenerationJob.duplicates_skipped + duplicates,
+                updated_at=datetime.utcnow()
+            ))
+        db.commit()
+        return len(inserted_hashes)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def finish_jobs(job_ids: List[int]):
+    """Close out a run: jobs with every chunk recorded are completed, the rest incomplete"""
+    if not job_ids:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(update(GenerationJob).where(GenerationJob.id.in_(job_ids)).values(
+            status=case(
+                (GenerationJob.completed_chunks >= GenerationJob.total_chunks, "completed"),
+                else_="incomplete"
+            ),
+            finished_at=datetime.utcnow()
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def job_progress(db: Session, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    """Most recently active jobs with their chunk progress, for the admin view"""
+    query = select(GenerationJob).order_by(GenerationJob.updated_at.desc()).limit(limit)
+    if status:
+        query = query.where(GenerationJob.status == status)
+    return [
+        {
+            "id": job.id,
+            "filepath": job.filepath,
+            "material_id": job.material_id,
+            "content_hash": job.content_hash,
+            "prompt_version": job.prompt_version,
+            "status": job.status,
+            "completed_chunks": job.completed_chunks,
+            "total_chunks": job.total_chunks,
+            "progress": round(job.completed_chunks / job.total_chunks * 100, 1) if job.total_chunks else 0,
+            "questions_created": job.questions_created,
+            "duplicates_skipped": job.duplicates_skipped,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None
+        }
+        for job in db.execute(query).scalars()
+    ]
+
+
+def provider_totals(db: Session) -> Dict[str, Dict]:
+    """Chunks and questions committed per provider across all generation runs"""
+    return {
+        provider: {"chunks": chunks, "questions_created": int(questions or 0)}
+        for provider, chunks, questions in db.execute(
+            select(
+                GenerationChunk.provider,
+                func.count(),
+                func.sum(GenerationChunk.questions_created)
+            ).group_by(GenerationChunk.provider)
+        )
+    }
@@ -0,0 +1,221 @@
+"""
+MeritSim - Grading Service
+Batched grading of simulacro submissions: one IN query, one bulk insert
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from models import Answer, ExamSessionQuestion, Question, StudyMode, StudySession, User
+
+
+class GradedAnswer:
+    __slots__ = ("question_id", "selected", "is_correct", "time_spent_seconds")
+
+    def __init__(self, question_id: int, selected: str, is_correct: bool,
+                 time_spent_seconds: Optional[int]):
+        self.question_id = question_id
+        self.selected = selected
+        self.is_correct = is_correct
+        self.time_spent_seconds = time_spent_seconds
+
+
+class GradingResult:
+    def __init__(self):
+        self.answers: List[GradedAnswer] = []
+        self.results: List[Dict] = []
+        self.correct_count = 0
+        self.total_xp = 0
+        # entity_id -> (answered, correct), for progress_service
+        self.entity_counts: Dict[Optional[int], Tuple[int, int]] = {}
+
+
+def grade_answers(answers: Iterable, questions: Dict[int, Question]) -> GradingResult:
+    """
+    Grade submitted answers in memory against the loaded questions (or exam
+    paper rows). Unknown ids are ignored and only the first answer to each
+    question counts.
+    """
+    graded = GradingResult()
+    seen = set()
+    for ans in answers:
+        question = questions.get(ans.question_id)
+        if not question or ans.question_id in seen:
+            continue
+        seen.add(ans.question_id)
+
+        selected = ans.selected_option.upper()
+        is_correct = selected == question.correct_answer.upper()
+        if is_correct:
+            graded.correct_count += 1
+            graded.total_xp += question.xp_reward
+
+        graded.answers.append(GradedAnswer(
+            ans.question_id, selected, is_correct, ans.time_spent_seconds
+        ))
+        answered, correct = graded.entity_counts.get(question.entity_id, (0, 0))
+        graded.entity_counts[question.entity_id] = (answered + 1, correct + int(is_correct))
+        graded.results.append({
+            "question_id": ans.question_id,
+            "selected": selected,
+            "correct_answer": question.correct_answer,
+            "is_correct": is_correct,
+            "explanation": question.explanation,
+            "page_reference": question.page_reference
+        })
+    return graded
+
+
+def load_questions_by_id(db: Session, question_ids: Iterable[int]) -> Dict[int, Question]:
+    """Fetch every referenced question in a single IN query"""
+    ids = set(question_ids)
+    if not ids:
+        return {}
+    return {q.id: q for q in db.query(Question).filter(Question.id.in_(ids)).all()}
+
+
+def save_exam_paper(db: Session, session_id: int, questions: List[Question]):
+    """Snapshot the issued questions so grading never re-reads the bank"""
+    if not questions:
+        return
+    db.execute(insert(ExamSessionQuestion).values([
+        {
+            "session_id": session_id,
+            "question_id": q.id,
+            "position": position,
+            "entity_id": q.entity_id,
+            "correct_answer": q.correct_answer,
+            "xp_reward": q.xp_reward
+        }
+        for position, q in enumerate(questions)
+    ]))
+
+
+def load_exam_paper(db: Session, session_id: int) -> Dict:
+    """
+    The issued paper for a session, keyed by question id (empty if none).
+    Grading uses the snapshot; explanation and page reference come from the
+    question for the feedback.
+    """
+    rows = db.execute(
+        select(
+            ExamSessionQuestion.question_id, ExamSessionQuestion.entity_id,
+            ExamSessionQuestion.correct_answer, ExamSessionQuestion.xp_reward,
+            Question.explanation, Question.page_reference
+        )
+        .join(Question, Question.id == ExamSessionQuestion.question_id)
+        .where(ExamSessionQuestion.session_id == session_id)
+    ).all()
+    return {row.question_id: row for row in rows}
+
+
+# Id of the first session with a recorded paper; fixed once papers exist
+_first_paper_session_id: Optional[int] = None
+
+
+def predates_exam_papers(db: Session, session: StudySession) -> bool:
+    """
+    Whether a simulacro was started before papers were recorded. Every
+    simulacro started since has a paper, so only these may be graded
+    against the bank.
+    """
+    global _first_paper_session_id
+    if session.mode != StudyMode.SIMULACRO:
+        return False
+    if _first_paper_session_id is None:
+        _first_paper_session_id = db.execute(select(func.min(ExamSessionQuestion.session_id))).scalar()
+    return _first_paper_session_id is None or session.id < _first_paper_session_id
+
+
+def save_answers(db: Session, session_id: int, user_id: int, answers: List[GradedAnswer]):
+    """Write all graded answers with one multi-row INSERT"""
+    if not answers:
+        return
+    answered_at = datetime.utcnow()
+    db.execute(insert(Answer).values([
+        {
+            "session_id": session_id,
+            "user_id": user_id,
+            "question_id": a.question_id,
+            "selected_option": a.selected,
+            "is_correct": a.is_correct,
+            "time_spent_seconds": a.time_spent_seconds,
+            "answered_at": answered_at
+        }
+        for a in answers
+    ]))
+
+
+def award_xp(db: Session, user_id: int, xp: int) -> Tuple[int, int]:
+    """
+    Add XP and recompute the level (every 1000 XP = 1 level) in one UPDATE.
+    Returns the new (xp_points, level).
+    """
+    new_xp = User.xp_points + xp
+    return db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(xp_points=new_xp, level=new_xp // 1000 + 1)
+        .returning(User.xp_points, User.level)
+        .execution_options(synchronize_session=False)
+    ).one()
+
+
+def record_advanced_answer(
+    db: Session,
+    session_id: int,
+    user_id: int,
+    question_id: int,
+    selected: str,
+    is_correct: bool,
+    xp: int,
+    time_spent_seconds: Optional[int]
+) -> Optional[int]:
+    """
+    Record one advanced-mode answer with a single UPDATE ... RETURNING that
+    bumps the session counters and the user's XP together, plus the answer
+    insert. Counters are incremented in SQL, so concurrent answers from
+    several tabs cannot lose updates.
+
+    Returns the user's new level, or None if the session does not belong to
+    the user (nothing is written in that case).
+    """
+    session_update = (
+        update(StudySession)
+        .where(
+            StudySession.id == session_id,
+            StudySession.user_id == user_id,
+            StudySession.mode == StudyMode.ADVANCED
+        )
+        .values(
+            total_questions=func.coalesce(StudySession.total_questions, 0) + 1,
+            correct_answers=func.coalesce(StudySession.correct_answers, 0) + int(is_correct),
+            xp_earned=func.coalesce(StudySession.xp_earned, 0) + xp
+        )
+        .returning(StudySession.id)
+        .cte("session_update")
+    )
+    new_xp = User.xp_points + xp
+    level = db.execute(
+        update(User)
+        .where(User.id == user_id, select(session_update.c.id).exists())
+        .values(xp_points=new_xp, level=new_xp // 1000 + 1)
+        .returning(User.level)
+        .add_cte(session_update)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if level is None:
+        return None
+
+    db.execute(insert(Answer).values(
+        session_id=session_id,
+        user_id=user_id,
+        question_id=question_id,
+        selected_option=selected,
+        is_correct=is_correct,
+        time_spent_seconds=time_spent_seconds,
+        answered_at=datetime.utcnow()
+    ))
+    return level
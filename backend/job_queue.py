@@ -0,0 +1,317 @@
+"""
+MeritSim - Background Job Queue
+Postgres-backed jobs with progress and cancellation, run by in-process worker threads
+
+Jobs live in the jobs table. A worker claims the oldest queued job with
+UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED), so any number of
+API processes (or `python job_queue.py` as a separate worker) can poll the
+same table and each job still runs exactly once. A partial unique index on
+lock_key allows one queued-or-running job per key: a second ingestion of the
+same materials root is refused instead of racing the first.
+
+Handlers report progress through JobContext.update(), which also raises
+JobCancelled once an admin has asked to cancel, so cancellation is
+cooperative. A running job whose heartbeat goes stale (its worker died) is
+queued again, up to JOB_MAX_ATTEMPTS.
+
+Every write a worker makes to its job is fenced on (worker, attempts) as
+claimed, so a worker that was presumed dead but is still running cannot
+overwrite the attempt that replaced it: its next update() raises JobLost
+and the handler stops.
+"""
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, Job
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))  # per process; 0 disables the in-process worker
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "900"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# kind -> handler(payload, context) returning a JSON-serializable result
+HANDLERS: Dict[str, Callable[[Dict, "JobContext"], Optional[Dict]]] = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobLost(JobCancelled):
+    """The job was requeued and claimed again: this attempt must stop without writing"""
+
+
+def job_handler(kind: str):
+    """Register the function that runs jobs of this kind"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def serialize_job(job: Job) -> Dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "payload": job.payload,
+        "status": job.status,
+        "progress": round(job.progress or 0, 1),
+        "message": job.message,
+        "result": job.result,
+        "error": job.error,
+        "cancel_requested": job.cancel_requested,
+        "attempts": job.attempts,
+        "worker": job.worker,
+        "created_by": job.created_by,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+def enqueue(db: Session, kind: str, payload: Dict, lock_key: Optional[str] = None,
+            created_by: Optional[int] = None) -> Tuple[Job, bool]:
+    """
+    Queue a job; returns (job, created).
+    If another job holds lock_key, nothing is queued and that job is returned.
+    """
+    job_id = db.execute(
+        pg_insert(Job).values(
+            kind=kind,
+            payload=payload,
+            lock_key=lock_key,
+            status="queued",
+            progress=0,
+            cancel_requested=False,
+            attempts=0,
+            created_by=created_by,
+            created_at=datetime.utcnow()
+        ).on_conflict_do_nothing(
+            index_elements=["lock_key"],
+            index_where=text("status IN ('queued', 'running')")  # ux_jobs_active_lock
+        ).returning(Job.id)
+    ).scalar()
+    db.commit()
+    if job_id is not None:
+        return db.get(Job, job_id), True
+    active = db.execute(
+        select(Job).where(Job.lock_key == lock_key, Job.status.in_(ACTIVE_STATUSES))
+    ).scalar()
+    if active is None:
+        # The holder finished between the insert and the lookup
+        return enqueue(db, kind, payload, lock_key, created_by)
+    return active, False
+
+
+def list_jobs(db: Session, status: Optional[str] = None, kind: Optional[str] = None,
+              limit: int = 50) -> List[Dict]:
+    query = select(Job).order_by(Job.id.desc()).limit(limit)
+    if status:
+        query = query.where(Job.status == status)
+    if kind:
+        query = query.where(Job.kind == kind)
+    return [serialize_job(job) for job in db.execute(query).scalars()]
+
+
+def request_cancel(db: Session, job_id: int) -> Optional[Job]:
+    """A queued job is cancelled outright; a running one is flagged and stops at its next update()"""
+    now = datetime.utcnow()
+    db.execute(update(Job).where(Job.id == job_id, Job.status == "queued").values(
+        status="cancelled", finished_at=now, message="Cancelado antes de iniciar"
+    ))
+    db.execute(update(Job).where(Job.id == job_id, Job.status == "running").values(cancel_requested=True))
+    db.commit()
+    return db.get(Job, job_id)
+
+
+def claim(worker: str) -> Optional[Tuple[int, str, Dict, int]]:
+    """Atomically take the oldest queued job; concurrent workers skip rows another one has locked"""
+    db = SessionLocal()
+    try:
+        next_job = (
+            select(Job.id)
+            .where(Job.status == "queued")
+            .order_by(Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        now = datetime.utcnow()
+        row = db.execute(
+            update(Job).where(Job.id == next_job).values(
+                status="running",
+                attempts=Job.attempts + 1,
+                worker=worker,
+                started_at=now,
+                heartbeat_at=now
+            ).returning(Job.id, Job.kind, Job.payload, Job.attempts)
+        ).first()
+        db.commit()
+        return tuple(row) if row else None
+    finally:
+        db.close()
+
+
+def requeue_stale() -> int:
+    """Running jobs whose worker stopped heartbeating go back to the queue (or fail after JOB_MAX_ATTEMPTS)"""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    db = SessionLocal()
+    try:
+        stale = (Job.status == "running", Job.heartbeat_at < cutoff)
+        failed = db.execute(update(Job).where(*stale, Job.attempts >= JOB_MAX_ATTEMPTS).values(
+            status="failed", error="Worker stopped responding", finished_at=datetime.utcnow()
+        )).rowcount
+        requeued = db.execute(update(Job).where(*stale).values(status="queued", worker=None)).rowcount
+        db.commit()
+        if failed or requeued:
+            logger.warning(f"Stale jobs: {requeued} requeued, {failed} failed")
+        return requeued
+    finally:
+        db.close()
+
+
+def _owned(job_id: int, worker: str, attempt: int):
+    """WHERE clause matching the job only while this attempt still owns it"""
+    return (Job.id == job_id, Job.status == "running", Job.worker == worker, Job.attempts == attempt)
+
+
+def _finish(job_id: int, worker: str, attempt: int, status: str, message: Optional[str] = None,
+            result: Optional[Dict] = None, error: Optional[str] = None) -> bool:
+    """Record the outcome; False if the attempt no longer owns the job"""
+    db = SessionLocal()
+    try:
+        values = {"status": status, "finished_at": datetime.utcnow(), "result": result, "error": error}
+        if message:
+            values["message"] = message
+        if status == "succeeded":
+            values["progress"] = 100
+        finished = db.execute(update(Job).where(*_owned(job_id, worker, attempt)).values(**values)).rowcount
+        db.commit()
+        return bool(finished)
+    finally:
+        db.close()
+
+
+class JobContext:
+    """Handed to a handler: progress reporting, heartbeat and cancellation checks"""
+
+    def __init__(self, job_id: int, worker: str, attempt: int):
+        self.job_id = job_id
+        self.worker = worker
+        self.attempt = attempt
+
+    def update(self, progress: Optional[float] = None, message: Optional[str] = None):
+        """
+        Record progress (0-100) and refresh the heartbeat. Raises JobCancelled
+        if cancel was requested, JobLost if another attempt owns the job now.
+        """
+        values = {"heartbeat_at": datetime.utcnow()}
+        if progress is not None:
+            values["progress"] = max(0.0, min(100.0, progress))
+        if message is not None:
+            values["message"] = message[:500]
+        db = SessionLocal()
+        try:
+            row = db.execute(
+                update(Job).where(*_owned(self.job_id, self.worker, self.attempt))
+                .values(**values).returning(Job.cancel_requested)
+            ).first()
+            db.commit()
+        finally:
+            db.close()
+        if row is None:
+            raise JobLost()
+        if row.cancel_requested:
+            raise JobCancelled()
+
+
+class JobWorker(threading.Thread):
+    """Polls the queue and runs one job at a time"""
+
+    def __init__(self, name: str, on_finish: Optional[Callable[[str, str], None]] = None):
+        super().__init__(name=name, daemon=True)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{name}"
+        self.on_finish = on_finish  # (kind, status), e.g. to invalidate caches
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        last_sweep = 0.0
+        while not self._stop_event.is_set():
+            try:
+                if time.monotonic() - last_sweep > JOB_POLL_SECONDS * 30:
+                    requeue_stale()
+                    last_sweep = time.monotonic()
+                claimed = claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"Job queue unavailable: {e}")
+                claimed = None
+            if claimed is None:
+                self._stop_event.wait(JOB_POLL_SECONDS)
+                continue
+            self._run(*claimed)
+
+    def _run(self, job_id: int, kind: str, payload: Dict, attempt: int):
+        handler = HANDLERS.get(kind)
+        logger.info(f"Job {job_id} ({kind}) attempt {attempt} started on {self.worker_id}")
+        status = "failed"
+        finish = functools.partial(_finish, job_id, self.worker_id, attempt)
+        try:
+            if handler is None:
+                finish("failed", error=f"No handler for job kind '{kind}'")
+                return
+            result = handler(payload, JobContext(job_id, self.worker_id, attempt))
+            status = "succeeded"
+            if not finish(status, message="Completado", result=result):
+                status = "lost"
+        except JobLost:
+            status = "lost"
+        except JobCancelled:
+            status = "cancelled"
+            finish(status, message="Cancelado")
+        except Exception as e:
+            logger.error(f"Job {job_id} ({kind}) failed: {e}")
+            finish(status, message="Error", error=traceback.format_exc()[-4000:])
+        finally:
+            if status == "lost":
+                logger.warning(f"Job {job_id} attempt {attempt} was requeued while running; its outcome is discarded")
+            logger.info(f"Job {job_id} ({kind}) {status}")
+            if self.on_finish:
+                try:
+                    self.on_finish(kind, status)
+                except Exception as e:
+                    logger.error(f"Job {job_id} finish hook failed: {e}")
+
+
+def start_workers(count: int = JOB_WORKERS, on_finish: Optional[Callable[[str, str], None]] = None) -> List[JobWorker]:
+    workers = [JobWorker(f"job-worker-{i}", on_finish=on_finish) for i in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+if __name__ == "__main__":
+    # Standalone worker process: python job_queue.py
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    import material_indexer  # noqa: F401  (registers the ingest handler)
+
+    for worker in start_workers(max(1, JOB_WORKERS)):
+        worker.join()
@@ -0,0 +1,85 @@
+"""
+MeritSim - LLM Call Limits
+Per-user token buckets and retry-with-jitter helpers for AI provider calls
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+LLM_USER_RATE_PER_MINUTE = float(os.getenv("LLM_USER_RATE_PER_MINUTE", "10"))
+LLM_USER_BURST = int(os.getenv("LLM_USER_BURST", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume a token; returns 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class UserRateLimiter:
+    """Bounded map of per-user token buckets (least recently seen users are dropped)"""
+
+    def __init__(self, per_minute: float = LLM_USER_RATE_PER_MINUTE,
+                 burst: int = LLM_USER_BURST, max_users: int = 50000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+
+    def check(self, user_id: int) -> float:
+        """0 if the user may call the LLM now, else the Retry-After in seconds"""
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[user_id] = bucket
+                if len(self._buckets) > self.max_users:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(user_id)
+            return bucket.take()
+
+
+llm_rate_limiter = UserRateLimiter()
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * (2 ** attempt)))
+
+
+async def with_retries(
+    call: Callable[[], Awaitable[T]],
+    retry_on: Tuple[Type[BaseException], ...],
+    max_retries: int = LLM_MAX_RETRIES
+) -> T:
+    """Await call(), retrying transient failures with jittered exponential backoff"""
+    for attempt in range(max_retries + 1):
+        try:
+            return await call()
+        except retry_on:
+            if attempt >= max_retries:
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
@@ -0,0 +1,75 @@
+"""
+MeritSim - LLM Streaming Metrics
+Time-to-first-token and token counts for streamed tutor completions
+"""
+import threading
+from collections import deque
+from typing import Dict
+
+
+def percentiles(values) -> Dict:
+    values = sorted(values)
+    if not values:
+        return {"avg": 0, "p50": 0, "p95": 0, "max": 0}
+    return {
+        "avg": round(sum(values) / len(values), 1),
+        "p50": round(values[len(values) // 2], 1),
+        "p95": round(values[int(len(values) * 0.95)], 1),
+        "max": round(values[-1], 1)
+    }
+
+
+class StreamMetrics:
+    """Rolling statistics for streamed completions in this worker"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._ttft_ms = deque(maxlen=window)
+        self._duration_ms = deque(maxlen=window)
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record_start(self):
+        with self._lock:
+            self.started += 1
+
+    def record_first_token(self, seconds: float):
+        with self._lock:
+            self._ttft_ms.append(seconds * 1000)
+
+    def record_end(self, outcome: str, seconds: float, prompt_tokens: int, completion_tokens: int):
+        """outcome is one of completed / cancelled / failed"""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self._duration_ms.append(seconds * 1000)
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            ttft = list(self._ttft_ms)
+            duration = list(self._duration_ms)
+            finished = self.completed + self.cancelled + self.failed
+            return {
+                "streams": {
+                    "started": self.started,
+                    "in_flight": self.started - finished,
+                    "completed": self.completed,
+                    "cancelled": self.cancelled,
+                    "failed": self.failed
+                },
+                "time_to_first_token_ms": percentiles(ttft),
+                "stream_duration_ms": percentiles(duration),
+                "tokens": {
+                    "prompt": self.prompt_tokens,
+                    "completion": self.completion_tokens,
+                    "avg_completion_per_stream": round(self.completion_tokens / finished, 1) if finished else 0
+                }
+            }
+
+
+chat_stream_metrics = StreamMetrics()
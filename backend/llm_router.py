@@ -0,0 +1,275 @@
+"""
+MeritSim - LLM Provider Router
+Health-aware routing and failover across OpenAI and Gemini
+
+Every call to a provider goes through ProviderRouter.call(), which tries the
+candidates best-first and fails over to the next one when a call raises or
+returns nothing usable. Each provider keeps a rolling window of outcomes
+and latencies (ranking prefers low latency and low error rates) and a
+circuit breaker: after LLM_BREAKER_FAILURES consecutive failures, or a
+failure rate above LLM_BREAKER_ERROR_RATE, the provider is skipped for a
+cooldown that doubles each time it trips again, then probed with a single
+call before taking traffic again.
+
+Statistics are per process: the API and question_generator.py each have
+their own llm_router.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from llm_metrics import percentiles
+
+T = TypeVar("T")
+
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+LLM_BREAKER_MAX_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_MAX_COOLDOWN_SECONDS", "300"))
+
+# USD per million tokens (input, output), for cost per valid question
+PROVIDER_PRICES = {
+    "openai": (
+        float(os.getenv("LLM_PRICE_OPENAI_INPUT", "0.15")),
+        float(os.getenv("LLM_PRICE_OPENAI_OUTPUT", "0.60")),
+    ),
+    "gemini": (
+        float(os.getenv("LLM_PRICE_GEMINI_INPUT", "0.50")),
+        float(os.getenv("LLM_PRICE_GEMINI_OUTPUT", "1.50")),
+    ),
+}
+
+
+class NoProviderAvailable(Exception):
+    """Every candidate failed or has its circuit open; wraps the last error, if any"""
+
+    def __init__(self, last_error: Optional[BaseException] = None):
+        super().__init__(f"No LLM provider available: {last_error!r}" if last_error else "No LLM provider available")
+        self.last_error = last_error
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """429s from either SDK (openai.RateLimitError, google's ResourceExhausted)"""
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ in ("RateLimitError", "ResourceExhausted")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) when a provider reports no usage"""
+    return max(1, len(text or "") // 4)
+
+
+class CircuitBreaker:
+    """closed -> open (skip the provider) -> half-open (one probe) -> closed or open again"""
+
+    def __init__(self):
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.cooldown = LLM_BREAKER_COOLDOWN_SECONDS
+        self.consecutive_failures = 0
+        self.trips = 0
+        self._probing = False
+
+    def retry_in(self) -> float:
+        """Seconds until the provider may be called again (0 if it may be called now)"""
+        if self.state == "open":
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+        if self.state == "half_open" and self._probing:
+            return self.cooldown
+        return 0.0
+
+    def acquire(self) -> bool:
+        """Whether a call may go out now; in half-open state only one probe at a time"""
+        if self.state == "open":
+            if time.monotonic() < self.opened_at + self.cooldown:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def release(self):
+        self._probing = False
+
+    def success(self):
+        self.consecutive_failures = 0
+        if self.state == "half_open":
+            self.cooldown = LLM_BREAKER_COOLDOWN_SECONDS
+        self.state = "closed"
+        self._probing = False
+
+    def failure(self, window_error_rate: float, window_calls: int):
+        self.consecutive_failures += 1
+        if self.state == "half_open":
+            # The probe failed: back off for longer
+            self._trip(min(self.cooldown * 2, LLM_BREAKER_MAX_COOLDOWN_SECONDS))
+        elif self.consecutive_failures >= LLM_BREAKER_FAILURES or (
+            window_calls >= LLM_BREAKER_MIN_CALLS and window_error_rate >= LLM_BREAKER_ERROR_RATE
+        ):
+            self._trip(self.cooldown)
+
+    def _trip(self, cooldown: float):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.cooldown = cooldown
+        self.trips += 1
+        self._probing = False
+
+
+class ProviderStats:
+    def __init__(self, name: str, window: int = LLM_ROUTER_WINDOW):
+        self.name = name
+        self.breaker = CircuitBreaker()
+        self._outcomes = deque(maxlen=window)  # True for success
+        self._latency_ms = deque(maxlen=window)  # successful calls only
+        self.calls = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.failovers = 0  # calls this provider took over from a failed one
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.valid_questions = 0
+
+    def error_rate(self) -> float:
+        return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    def score(self) -> float:
+        """Lower is better: median latency, penalized by the recent error rate"""
+        if not self._latency_ms:
+            return 0.0  # untried providers get traffic so they can be measured
+        latency = sorted(self._latency_ms)[len(self._latency_ms) // 2]
+        return latency * (1 + 4 * self.error_rate())
+
+    def cost_usd(self) -> float:
+        input_price, output_price = PROVIDER_PRICES.get(self.name, (0.0, 0.0))
+        return (self.prompt_tokens * input_price + self.completion_tokens * output_price) / 1_000_000
+
+    def snapshot(self) -> Dict:
+        cost = self.cost_usd()
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "failovers_received": self.failovers,
+            "error_rate": round(self.error_rate(), 3),
+            "latency_ms": percentiles(self._latency_ms),
+            "breaker": {
+                "state": self.breaker.state,
+                "retry_in_seconds": round(self.breaker.retry_in(), 1),
+                "trips": self.breaker.trips
+            },
+            "tokens": {"prompt": self.prompt_tokens, "completion": self.completion_tokens},
+            "estimated_cost_usd": round(cost, 6),
+            "valid_questions": self.valid_questions,
+            "cost_per_valid_question_usd": round(cost / self.valid_questions, 6) if self.valid_questions else None
+        }
+
+
+class ProviderRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._providers: Dict[str, ProviderStats] = {}
+
+    def _stats(self, provider: str) -> ProviderStats:
+        stats = self._providers.get(provider)
+        if stats is None:
+            stats = self._providers[provider] = ProviderStats(provider)
+        return stats
+
+    def rank(self, candidates: Sequence[str]) -> List[str]:
+        """Candidates whose circuit is not open, best first"""
+        with self._lock:
+            return sorted(
+                (p for p in candidates if self._stats(p).breaker.retry_in() == 0),
+                key=lambda p: self._stats(p).score()
+            )
+
+    def retry_in(self, provider: str) -> float:
+        with self._lock:
+            return self._stats(provider).breaker.retry_in()
+
+    def record_usage(self, provider: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            stats = self._stats(provider)
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+
+    def record_valid(self, provider: str, questions: int):
+        with self._lock:
+            self._stats(provider).valid_questions += questions
+
+    def acquire(self, provider: str) -> bool:
+        with self._lock:
+            return self._stats(provider).breaker.acquire()
+
+    def release(self, provider: str):
+        """Give back acquire() without an outcome (the call was abandoned)"""
+        with self._lock:
+            self._stats(provider).breaker.release()
+
+    def record(self, provider: str, ok: bool, seconds: float, error: Optional[BaseException] = None):
+        """Outcome of one call made after acquire()"""
+        with self._lock:
+            stats = self._stats(provider)
+            stats.calls += 1
+            stats._outcomes.append(ok)
+            if ok:
+                stats._latency_ms.append(seconds * 1000)
+                stats.breaker.success()
+            else:
+                stats.failures += 1
+                if error is not None and is_rate_limited(error):
+                    stats.rate_limited += 1
+                stats.breaker.failure(stats.error_rate(), len(stats._outcomes))
+
+    async def call(
+        self,
+        attempts: Dict[str, Callable[[], Awaitable[T]]],
+        order: Optional[Sequence[str]] = None,
+        is_valid: Optional[Callable[[T], bool]] = None
+    ) -> Tuple[str, T]:
+        """
+        Run the first attempt that succeeds, trying providers in `order`
+        (default: ranked by health and latency) and skipping open circuits.
+        A result failing is_valid counts as a failure and fails over too.
+        Returns (provider, result); raises NoProviderAvailable.
+        """
+        last_error: Optional[BaseException] = None
+        failed_over = False
+        for provider in (order if order is not None else self.rank(list(attempts))):
+            if provider not in attempts or not self.acquire(provider):
+                continue
+            if failed_over:
+                with self._lock:
+                    self._stats(provider).failovers += 1
+            started = time.perf_counter()
+            try:
+                result = await attempts[provider]()
+            except Exception as e:
+                self.record(provider, False, time.perf_counter() - started, e)
+                last_error = e
+                failed_over = True
+                continue
+            except BaseException:
+                # A cancelled caller (client gone) says nothing about the provider
+                self.release(provider)
+                raise
+            ok = is_valid is None or is_valid(result)
+            self.record(provider, ok, time.perf_counter() - started)
+            if ok:
+                return provider, result
+            last_error = ValueError(f"{provider} returned no usable output")
+            failed_over = True
+        raise NoProviderAvailable(last_error)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {name: stats.snapshot() for name, stats in sorted(self._providers.items())}
+
+
+llm_router = ProviderRouter()
@@ -3,30 +3,54 @@ MeritSim - FastAPI Main Application
 Educational platform for Colombian state exam preparation
 """
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
-from fastapi import FastAPI, Depends, HTTPException, status, Query, Body, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Body, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-import subprocess
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, func, desc, select, text
 import json
 import logging
 
 from models import (
-    get_db, User, UserRole, Entity, Profile, 
-    Question, StudySession, StudyMode, Answer, Topic, Material
+    get_db, get_async_db, AsyncSessionLocal, AIExplanation, User, UserRole, Entity, Profile, 
+    Question, StudySession, StudyMode, Answer, Topic, Material, Job
+)
+from material_indexer import MATERIALS_PATH, ingest_lock_key, suggest_materials_for_user
+from question_sampler import sampler, load_questions
+from search_service import search_materials, search_questions
+from db_pool import pool_metrics
+from catalog_service import catalog, conditional_response
+from grading_service import (
+    award_xp, grade_answers, load_exam_paper, load_questions_by_id,
+    predates_exam_papers, record_advanced_answer, save_answers, save_exam_paper
+)
+from explanation_cache import EXPLANATION_PRECOMPUTE_CONCURRENCY, explanation_cache
+from generation_ledger import job_progress, provider_totals
+from job_queue import enqueue, list_jobs, request_cancel, serialize_job, start_workers
+from llm_limits import llm_rate_limiter
+from llm_metrics import chat_stream_metrics
+from llm_router import llm_router
+from principal_cache import Principal, principal_cache
+from progress_service import (
+    get_progress, get_topic_progress, record_answers, record_mastery, record_session_started
 )
-from material_indexer import index_materials, suggest_materials_for_user
 from openai_service import (
-    generate_explanation_openai, 
     generate_study_recommendation_openai, 
     chat_with_tutor,
-    generate_ai_question
+    stream_chat_with_tutor,
+    generate_ai_question,
+    EXPLANATION_FAILED,
+    EXPLANATION_NOT_CONFIGURED,
+    EXPLANATION_PROMPT_VERSION
 )
 
 # ============== Configuration ==============
@@ -35,6 +59,12 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt is CPU-bound by design; keep it off the event loop and cap how many
+# hashes run at once so a login burst cannot starve the threadpool.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 # ============== FastAPI App ==============
@@ -54,6 +84,27 @@ app.add_middleware(
 )
 
 
+# Background job workers (see job_queue.py); JOB_WORKERS=0 leaves the queue
+# to a separate `python job_queue.py` process
+job_workers = []
+
+
+@app.on_event("startup")
+def start_job_workers():
+    def _after_job(kind: str, job_status: str):
+        # Ingestion writes materials and questions outside this process's caches
+        catalog.invalidate()
+        sampler.invalidate()
+    
+    job_workers.extend(start_workers(on_finish=_after_job))
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    for worker in job_workers:
+        worker.stop()
+
+
 # ============== Pydantic Schemas ==============
 class Token(BaseModel):
     access_token: str
@@ -159,6 +210,18 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_executor, verify_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
@@ -166,30 +229,56 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _token_subject(token: str) -> str:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    
+        raise _credentials_exception()
+    return email
+
+
+def _ensure_active(is_active: Optional[bool]):
+    if is_active is False:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+
+
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> User:
+    """Full ORM user, for endpoints that read or write more than id/role"""
+    email = _token_subject(token)
     user = db.query(User).filter(User.email == email).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    _ensure_active(user.is_active)
     return user
 
 
-async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """Cached user snapshot; skips the users lookup on a cache hit"""
+    principal = principal_cache.load(db, _token_subject(token))
+    if principal is None:
+        raise _credentials_exception()
+    _ensure_active(principal.is_active)
+    return principal
+
+
+async def get_admin_user(current_user: Principal = Depends(get_current_principal)) -> Principal:
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -200,9 +289,9 @@ async def get_admin_user(current_user: User = Depends(get_current_user)) -> User
 
 # ============== Health Check ==============
 @app.get("/api/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     try:
-        db.execute("SELECT 1")
+        await db.execute(text("SELECT 1"))
         return {"status": "ok", "database": "connected", "timestamp": datetime.utcnow()}
     except Exception as e:
         return {"status": "error", "database": "disconnected", "error": str(e)}
@@ -210,9 +299,10 @@ async def health_check(db: Session = Depends(get_db)):
 
 # ============== Auth Endpoints ==============
 @app.post("/api/auth/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == form_data.username))
+    user = result.scalars().first()
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -227,10 +317,11 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
 
 
 @app.post("/api/auth/login-json", response_model=Token)
-async def login_json(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login_json(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """Alternative login endpoint that accepts JSON"""
-    user = db.query(User).filter(User.email == login_data.email).first()
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    result = await db.execute(select(User).where(User.email == login_data.email))
+    user = result.scalars().first()
+    if not user or not await verify_password_async(login_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -244,8 +335,9 @@ async def login_json(login_data: LoginRequest, db: Session = Depends(get_db)):
 
 
 @app.post("/api/auth/register", response_model=UserResponse)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.email == user_data.email).first()
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == user_data.email))
+    existing = result.scalars().first()
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -254,15 +346,15 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     
     user = User(
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash_async(user_data.password),
         full_name=user_data.full_name,
         role=UserRole.USER,
         xp_points=0,
         level=1
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
@@ -273,55 +365,32 @@ async def get_me(current_user: User = Depends(get_current_user)):
 
 # ============== Entities & Topics ==============
 @app.get("/api/entities")
-async def get_entities(db: Session = Depends(get_db)):
-    entities = db.query(Entity).all()
-    return [
-        {
-            "id": e.id,
-            "name": e.name,
-            "description": e.description,
-            "icon": e.icon,
-            "color": e.color,
-            "question_count": db.query(Question).filter(Question.entity_id == e.id).count()
-        }
-        for e in entities
-    ]
+def get_entities(request: Request, db: Session = Depends(get_db)):
+    return conditional_response(request, catalog.entities(db))
 
 
 @app.get("/api/topics")
-async def get_topics(db: Session = Depends(get_db)):
-    topics = db.query(Topic).all()
-    return [
-        {
-            "id": t.id,
-            "name": t.name,
-            "description": t.description,
-            "question_count": db.query(Question).filter(Question.topic_id == t.id).count()
-        }
-        for t in topics
-    ]
+def get_topics(request: Request, db: Session = Depends(get_db)):
+    return conditional_response(request, catalog.topics(db))
 
 
 # ============== Questions ==============
 @app.get("/api/questions", response_model=List[QuestionResponse])
-async def get_questions(
+def get_questions(
     entity_id: Optional[int] = None,
     topic_id: Optional[int] = None,
     difficulty: Optional[int] = None,
     limit: int = Query(default=20, le=100),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
-    query = db.query(Question).filter(Question.is_active == True)
-    
-    if entity_id:
-        query = query.filter(Question.entity_id == entity_id)
-    if topic_id:
-        query = query.filter(Question.topic_id == topic_id)
-    if difficulty:
-        query = query.filter(Question.difficulty == difficulty)
-    
-    questions = query.order_by(func.random()).limit(limit).all()
+    question_ids = sampler.sample(
+        db, limit,
+        entity_id=entity_id or None,
+        topic_id=topic_id or None,
+        difficulty=difficulty or None
+    )
+    questions = load_questions(db, question_ids)
     
     return [
         QuestionResponse(
@@ -341,21 +410,19 @@ async def get_questions(
 
 # ============== Simulacro Mode ==============
 @app.post("/api/study/simulacro/start")
-async def start_simulacro(
+def start_simulacro(
     request: SimulacroStartRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Start a timed exam simulation - no feedback until the end"""
     # Get questions
-    query = db.query(Question).filter(Question.is_active == True)
-    if request.entity_id:
-        query = query.filter(Question.entity_id == request.entity_id)
-    
-    if request.difficulty:
-        query = query.filter(Question.difficulty == request.difficulty)
-    
-    questions = query.order_by(func.random()).limit(request.num_questions).all()
+    question_ids = sampler.sample(
+        db, request.num_questions,
+        entity_id=request.entity_id or None,
+        difficulty=request.difficulty or None
+    )
+    questions = load_questions(db, question_ids)
     
     if not questions:
         raise HTTPException(status_code=404, detail="No questions available")
@@ -369,41 +436,48 @@ async def start_simulacro(
         total_questions=len(questions)
     )
     db.add(session)
+    db.flush()
+    save_exam_paper(db, session.id, questions)
+    record_session_started(db, current_user.id)
+    
+    # Serialize before commit expires the loaded questions
+    payload = [
+        {
+            "id": q.id,
+            "text": q.text,
+            "option_a": q.option_a,
+            "option_b": q.option_b,
+            "option_c": q.option_c,
+            "option_d": q.option_d,
+            "entity": q.entity.name if q.entity else None,
+            "topic": q.topic.name if q.topic else None
+        }
+        for q in questions
+    ]
+    session_id = session.id
     db.commit()
-    db.refresh(session)
     
     return {
-        "session_id": session.id,
+        "session_id": session_id,
         "mode": "SIMULACRO",
         "time_limit_minutes": request.time_limit_minutes,
         "total_questions": len(questions),
-        "questions": [
-            {
-                "id": q.id,
-                "text": q.text,
-                "option_a": q.option_a,
-                "option_b": q.option_b,
-                "option_c": q.option_c,
-                "option_d": q.option_d,
-                "entity": q.entity.name if q.entity else None,
-                "topic": q.topic.name if q.topic else None
-            }
-            for q in questions
-        ]
+        "questions": payload
     }
 
 
 @app.post("/api/study/simulacro/submit")
-async def submit_simulacro(
+def submit_simulacro(
     request: SimulacroSubmitRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Submit all answers at once and get complete feedback"""
+    # Row lock so a double submit cannot grade the same session twice
     session = db.query(StudySession).filter(
         StudySession.id == request.session_id,
         StudySession.user_id == current_user.id
-    ).first()
+    ).with_for_update().first()
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -411,87 +485,70 @@ async def submit_simulacro(
     if session.completed_at:
         raise HTTPException(status_code=400, detail="Session already completed")
     
-    correct_count = 0
-    total_xp = 0
-    results = []
-    
-    for ans in request.answers:
-        question = db.query(Question).filter(Question.id == ans.question_id).first()
-        if not question:
-            continue
-        
-        is_correct = ans.selected_option.upper() == question.correct_answer.upper()
-        if is_correct:
-            correct_count += 1
-            total_xp += question.xp_reward
-        
-        # Save answer
-        answer = Answer(
-            session_id=session.id,
-            user_id=current_user.id,
-            question_id=question.id,
-            selected_option=ans.selected_option.upper(),
-            is_correct=is_correct,
-            time_spent_seconds=ans.time_spent_seconds
-        )
-        db.add(answer)
-        
-        results.append({
-            "question_id": question.id,
-            "selected": ans.selected_option.upper(),
-            "correct_answer": question.correct_answer,
-            "is_correct": is_correct,
-            "explanation": question.explanation,
-            "page_reference": question.page_reference
-        })
+    # Grade against the paper issued at start; answers to questions that
+    # were not on it are ignored. Only simulacros started before papers
+    # were recorded fall back to reading the bank.
+    paper = load_exam_paper(db, session.id)
+    if not paper:
+        if not predates_exam_papers(db, session):
+            raise HTTPException(status_code=400, detail="Session has no issued exam paper")
+        paper = load_questions_by_id(db, (ans.question_id for ans in request.answers))
+    graded = grade_answers(request.answers, paper)
+    save_answers(db, session.id, current_user.id, graded.answers)
     
-    # Update session
-    session.correct_answers = correct_count
-    session.score = (correct_count / len(request.answers)) * 100 if request.answers else 0
-    session.xp_earned = total_xp
+    # Scored over the whole issued paper: unanswered questions count as
+    # wrong, and repeated or off-paper answers were dropped by grading
+    total_questions = session.total_questions or len(graded.answers)
+    session.correct_answers = graded.correct_count
+    session.score = (graded.correct_count / total_questions) * 100 if total_questions else 0
+    session.xp_earned = graded.total_xp
     session.completed_at = datetime.utcnow()
     
-    # Update user XP
-    current_user.xp_points += total_xp
-    # Level up logic (every 1000 XP = 1 level)
-    current_user.level = (current_user.xp_points // 1000) + 1
+    # Update user XP and level atomically
+    _, new_level = award_xp(db, current_user.id, graded.total_xp)
+    record_answers(db, current_user.id, graded.entity_counts)
+    record_mastery(db, current_user.id, [a.question_id for a in graded.answers if a.is_correct])
     
     db.commit()
+    principal_cache.update_level(current_user.id, new_level)
     
     return {
         "session_id": session.id,
-        "total_questions": len(request.answers),
-        "correct_answers": correct_count,
+        "total_questions": total_questions,
+        "correct_answers": graded.correct_count,
         "score": session.score,
-        "xp_earned": total_xp,
-        "new_level": current_user.level,
-        "results": results
+        "xp_earned": graded.total_xp,
+        "new_level": new_level,
+        "results": graded.results
     }
 
 
 # ============== Advanced Study Mode ==============
 @app.post("/api/study/advanced/start")
-async def start_advanced_study(
+def start_advanced_study(
     entity_id: Optional[int] = None,
     profile_id: Optional[int] = None,
     topic: Optional[str] = None,
     num_questions: int = 20,
     difficulty: Optional[int] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Start advanced study mode with immediate feedback"""
-    query = db.query(Question).filter(Question.is_active == True)
-    if entity_id:
-        query = query.filter(Question.entity_id == entity_id)
-    if profile_id:
-        query = query.filter(Question.profile_id == profile_id)
+    topic_id = None
     if topic:
-        query = query.filter(Question.topic == topic)
-    if difficulty:
-        query = query.filter(Question.difficulty == difficulty)
+        topic_id = db.query(Topic.id).filter(Topic.name == topic).scalar()
+        if topic_id is None:
+            raise HTTPException(status_code=404, detail="No questions available")
     
-    questions = query.order_by(func.random()).limit(num_questions).all()
+    question_ids = sampler.sample(
+        db, num_questions,
+        entity_id=entity_id or None,
+        profile_id=profile_id or None,
+        topic_id=topic_id,
+        difficulty=difficulty or None
+    )
+    questions = load_questions(db, question_ids)
     
     if not questions:
         raise HTTPException(status_code=404, detail="No questions available")
@@ -500,79 +557,71 @@ async def start_advanced_study(
         user_id=current_user.id,
         mode=StudyMode.ADVANCED,
         entity_id=entity_id,
-        total_questions=len(questions)
+        total_questions=0  # counts answers, incremented per answer
     )
     db.add(session)
+    db.flush()
+    record_session_started(db, current_user.id)
+    
+    # Serialize before commit expires the loaded questions
+    payload = [
+        {
+            "id": q.id,
+            "text": q.text,
+            "option_a": q.option_a,
+            "option_b": q.option_b,
+            "option_c": q.option_c,
+            "option_d": q.option_d,
+            "entity": q.entity.name if q.entity else None,
+            "topic": q.topic.name if q.topic else None,
+            "difficulty": q.difficulty
+        }
+        for q in questions
+    ]
+    session_id = session.id
     db.commit()
-    db.refresh(session)
     
     return {
-        "session_id": session.id,
+        "session_id": session_id,
         "mode": "ADVANCED",
         "total_questions": len(questions),
-        "questions": [
-            {
-                "id": q.id,
-                "text": q.text,
-                "option_a": q.option_a,
-                "option_b": q.option_b,
-                "option_c": q.option_c,
-                "option_d": q.option_d,
-                "entity": q.entity.name if q.entity else None,
-                "topic": q.topic.name if q.topic else None,
-                "difficulty": q.difficulty
-            }
-            for q in questions
-        ]
+        "questions": payload
     }
 
 
 @app.post("/api/study/advanced/answer", response_model=AnswerResponse)
-async def answer_advanced(
+def answer_advanced(
     session_id: int,
     answer_data: AnswerRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Answer a single question and get immediate feedback"""
-    session = db.query(StudySession).filter(
-        StudySession.id == session_id,
-        StudySession.user_id == current_user.id,
-        StudySession.mode == StudyMode.ADVANCED
-    ).first()
-    
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    question = db.query(Question).filter(Question.id == answer_data.question_id).first()
+    question = db.query(
+        Question.id, Question.entity_id, Question.correct_answer, Question.xp_reward,
+        Question.explanation, Question.page_reference
+    ).filter(Question.id == answer_data.question_id).first()
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
     
-    is_correct = answer_data.selected_option.upper() == question.correct_answer.upper()
+    selected = answer_data.selected_option.upper()
+    is_correct = selected == question.correct_answer.upper()
     xp_earned = question.xp_reward if is_correct else 0
     
-    # Save answer
-    answer = Answer(
-        session_id=session.id,
-        user_id=current_user.id,
-        question_id=question.id,
-        selected_option=answer_data.selected_option.upper(),
-        is_correct=is_correct,
-        time_spent_seconds=answer_data.time_spent_seconds
+    # Session counters, user XP and the answer row in one transaction
+    new_level = record_advanced_answer(
+        db, session_id, current_user.id, question.id,
+        selected, is_correct, xp_earned, answer_data.time_spent_seconds
     )
-    db.add(answer)
-    
-    # Update session stats
-    session.total_questions = db.query(Answer).filter(Answer.session_id == session.id).count() + 1
+    if new_level is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Session not found")
+    record_answers(db, current_user.id, {question.entity_id: (1, int(is_correct))})
     if is_correct:
-        session.correct_answers = (session.correct_answers or 0) + 1
-    session.xp_earned = (session.xp_earned or 0) + xp_earned
-    
-    # Update user XP
-    current_user.xp_points += xp_earned
-    current_user.level = (current_user.xp_points // 1000) + 1
+        record_mastery(db, current_user.id, [question.id])
     
     db.commit()
+    principal_cache.update_level(current_user.id, new_level)
     
     return AnswerResponse(
         is_correct=is_correct,
@@ -585,55 +634,16 @@ async def answer_advanced(
 
 # ============== Progress & Stats ==============
 @app.get("/api/users/me/progress", response_model=ProgressResponse)
-async def get_my_progress(
+def get_my_progress(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get user's learning progress and stats"""
-    total_sessions = db.query(StudySession).filter(
-        StudySession.user_id == current_user.id
-    ).count()
-    
-    total_answers = db.query(Answer).filter(Answer.user_id == current_user.id).count()
-    correct_answers = db.query(Answer).filter(
-        Answer.user_id == current_user.id,
-        Answer.is_correct == True
-    ).count()
-    
-    correct_percentage = (correct_answers / total_answers * 100) if total_answers > 0 else 0
-    
-    # Progress by entity
-    entities = db.query(Entity).all()
-    entity_progress = []
-    for entity in entities:
-        entity_answers = db.query(Answer).join(Question).filter(
-            Answer.user_id == current_user.id,
-            Question.entity_id == entity.id
-        ).count()
-        
-        entity_correct = db.query(Answer).join(Question).filter(
-            Answer.user_id == current_user.id,
-            Question.entity_id == entity.id,
-            Answer.is_correct == True
-        ).count()
-        
-        entity_progress.append({
-            "entity_id": entity.id,
-            "entity_name": entity.name,
-            "color": entity.color,
-            "total_answers": entity_answers,
-            "correct_answers": entity_correct,
-            "percentage": (entity_correct / entity_answers * 100) if entity_answers > 0 else 0
-        })
-    
+    progress = get_progress(db, current_user.id)
     return ProgressResponse(
-        total_sessions=total_sessions,
-        total_questions_answered=total_answers,
-        correct_percentage=round(correct_percentage, 1),
-        current_streak=current_user.current_streak,
         level=current_user.level,
         xp_points=current_user.xp_points,
-        entity_progress=entity_progress
+        **progress
     )
 
 @app.get("/api/study/adventure/map")
@@ -641,44 +651,28 @@ def get_adventure_map(
     entity_id: Optional[int] = None,
     profile_id: Optional[int] = None,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: Principal = Depends(get_current_principal)
 ):
-    # Determine Entity (use user's default if not provided)
-    if not entity_id and user.entity_id:
-        entity_id = user.entity_id
-
-    # Get grouping of questions by topic
-    query = db.query(Question.topic, func.count(Question.id), func.min(Question.id)).filter(Question.is_active == True)
+    # Active question totals per topic, cached per (entity, profile)
+    topic_stats = catalog.topic_totals(db, entity_id, profile_id)
     
-    if entity_id:
-        query = query.filter(Question.entity_id == entity_id)
-    if profile_id:
-        query = query.filter(Question.profile_id == profile_id)
-        
-    topic_stats = query.group_by(Question.topic).all()
-    
-    # Get user progress per topic
-    # This is a bit complex in SQL, so we'll do simple counts
-    # Get total answers by user per topic
-    user_answers = db.query(Question.topic, func.count(func.distinct(Answer.question_id)))\
-        .join(Answer, Answer.question_id == Question.id)\
-        .filter(Answer.user_id == user.id)\
-        .filter(Answer.is_correct == True)\
-        .group_by(Question.topic).all()
-        
-    progress_map = {t: c for t, c in user_answers}
+    # Distinct correctly answered questions per topic, maintained incrementally
+    progress_map = get_topic_progress(db, user.id)
     
     nodes = []
     # If no topics found (fresh DB), return empty or synthetic
     if not topic_stats:
         return {"nodes": []}
 
-    # Sort topics (alphabetical or by synthetic ID)
-    sorted_topics = sorted(topic_stats, key=lambda x: x[0] or "")
+    # Sort topics alphabetically
+    sorted_topics = sorted(topic_stats, key=lambda x: x["topic"] or "")
     
-    for i, (topic, total, first_id) in enumerate(sorted_topics):
+    for i, stats in enumerate(sorted_topics):
+        topic = stats["topic"]
+        total = stats["total_questions"]
         topic_name = topic or f"Módulo General {i+1}"
-        completed = progress_map.get(topic, 0)
+        # Mastery is tracked per topic across entities; cap it at this selection's total
+        completed = min(progress_map.get(stats["topic_id"], 0), total)
         
         status = "locked"
         if i == 0 or (nodes and nodes[i-1]["progress"] >= 60): # Unlock if previous is 60% done
@@ -690,6 +684,7 @@ def get_adventure_map(
         
         nodes.append({
             "id": f"node_{i}",
+            "topic_id": stats["topic_id"],
             "topic": topic,
             "label": topic_name,
             "status": status,
@@ -702,60 +697,107 @@ def get_adventure_map(
         
     return {"nodes": nodes}
 
+def _enqueue_ingestion(db: Session, generate: str, current_user: Principal) -> Dict:
+    """One ingestion per materials root: a second request gets the job already in progress"""
+    job, created = enqueue(
+        db, "ingest", {"root": MATERIALS_PATH, "generate": generate},
+        lock_key=ingest_lock_key(MATERIALS_PATH), created_by=current_user.id
+    )
+    if not created:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Ya hay una ingestión en curso para esta carpeta", "job": serialize_job(job)}
+        )
+    return {"status": "Ingestion queued", "job": serialize_job(job)}
+
+
 @app.post("/api/admin/ingest-materials")
-def run_ingestion(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    def _run_scripts():
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        logging.info("Starting background ingestion...")
-        try:
-            # Install dependencies if missing (inside container)
-            # This is risky if it fails, but better than nothing
-            subprocess.run(["pip", "install", "pypdf"], cwd=base_dir)
-            
-            # Run Indexer
-            res1 = subprocess.run(["python", "material_indexer.py"], cwd=base_dir, capture_output=True, text=True)
-            logging.info(f"Indexer Output: {res1.stdout}")
-            
-            # Run Generator
-            res2 = subprocess.run(["python", "question_generator.py"], cwd=base_dir, capture_output=True, text=True)
-            logging.info(f"Generator Output: {res2.stdout}")
-            
-        except Exception as e:
-            logging.error(f"Ingestion failed: {e}")
+def run_ingestion(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_admin_user)
+):
+    """Queue indexing plus question generation for every material (Admin only)"""
+    return _enqueue_ingestion(db, "all", current_user)
+
 
-    background_tasks.add_task(_run_scripts)
-    return {"status": "Ingestion started in background"}
+@app.get("/api/admin/jobs")
+def get_jobs(
+    status: Optional[str] = Query(None, pattern="^(queued|running|succeeded|failed|cancelled)$"),
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_admin_user)
+):
+    """Background jobs, newest first (Admin only)"""
+    return {"jobs": list_jobs(db, status=status, kind=kind, limit=limit)}
+
+
+@app.get("/api/admin/jobs/{job_id}")
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_admin_user)
+):
+    """One background job with its progress (Admin only)"""
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialize_job(job)
+
+
+@app.post("/api/admin/jobs/{job_id}/cancel")
+def cancel_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_admin_user)
+):
+    """Cancel a queued job, or ask a running one to stop (Admin only)"""
+    job = request_cancel(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialize_job(job)
+
+
+@app.get("/api/admin/generation-jobs")
+def get_generation_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(100, le=500),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_admin_user)
+):
+    """Question generation jobs and their chunk progress (Admin only)"""
+    return {"jobs": job_progress(db, status=status, limit=limit)}
 
 
 # ============== Materials ==============
 @app.post("/api/materials/index")
-async def reindex_materials(
-    current_user: User = Depends(get_admin_user)
+def reindex_materials(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_admin_user)
 ):
-    """Reindex all materials from the mounted folder (Admin only)"""
-    result = index_materials()
-    return result
+    """Queue a reindex of the mounted folder; new or changed PDFs go to the question generator (Admin only)"""
+    return _enqueue_ingestion(db, "changed", current_user)
 
 
 @app.get("/api/materials/suggestions")
-async def get_material_suggestions(
+def get_material_suggestions(
     limit: int = 5,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get personalized material suggestions based on user's weak areas"""
-    suggestions = suggest_materials_for_user(current_user.id, limit)
+    suggestions = suggest_materials_for_user(current_user.id, limit, db=db)
     return {"suggestions": suggestions}
 
 
 @app.get("/api/materials")
-async def get_all_materials(
+def get_all_materials(
     entity_id: Optional[int] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get all indexed materials"""
-    query = db.query(Material)
+    query = db.query(Material).filter(Material.is_active == True)
     if entity_id:
         query = query.filter(Material.entity_id == entity_id)
     
@@ -775,11 +817,32 @@ async def get_all_materials(
     ]
 
 
+# ============== Search ==============
+@app.get("/api/search")
+def search(
+    q: str = Query(..., min_length=2, max_length=200),
+    type: str = Query("all", pattern="^(all|questions|materials)$"),
+    entity_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Ranked full-text search (Spanish) over the question bank and material pages.
+    Snippets mark matches with <mark>...</mark> and must be rendered as text.
+    """
+    return {
+        "query": q,
+        "questions": search_questions(db, q, entity_id, limit) if type in ("all", "questions") else [],
+        "materials": search_materials(db, q, entity_id, limit) if type in ("all", "materials") else []
+    }
+
+
 # ============== Admin Stats ==============
 @app.get("/api/admin/stats")
-async def get_admin_stats(
+def get_admin_stats(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    current_user: Principal = Depends(get_admin_user)
 ):
     """Get platform-wide statistics (Admin only)"""
     return {
@@ -793,42 +856,117 @@ async def get_admin_stats(
     }
 
 
+@app.get("/api/admin/db-pool")
+async def get_db_pool_stats(current_user: Principal = Depends(get_admin_user)):
+    """Connection pool usage, checkout wait times and slow checkouts (Admin only)"""
+    return {name: metrics.snapshot() for name, metrics in pool_metrics.items()}
+
+
 # ============== AI Tutor Chat ==============
 class ChatRequest(BaseModel):
     message: str
     context: Optional[str] = None
 
 
+def enforce_llm_rate_limit(user_id: int):
+    """Per-user token bucket in front of every paid LLM call"""
+    retry_after = llm_rate_limiter.check(user_id)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiadas solicitudes a la IA. Intenta de nuevo en unos segundos.",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+        )
+
+
 @app.post("/api/chat")
 async def chat_with_ai_tutor(
     request: ChatRequest,
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Chat with MeritBot AI tutor powered by OpenAI"""
+    enforce_llm_rate_limit(current_user.id)
     response = await chat_with_tutor(request.message, request.context)
     return {"response": response}
 
 
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n" if event else f"data: {payload}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def stream_chat_with_ai_tutor(
+    request: ChatRequest,
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Chat with MeritBot, streamed as Server-Sent Events.
+
+    Each `data:` event carries a {"delta": "..."} text fragment; the stream
+    ends with an `event: done`. If the client goes away the upstream
+    completion is closed so no further tokens are generated.
+    """
+    enforce_llm_rate_limit(current_user.id)
+
+    async def events():
+        tutor = stream_chat_with_tutor(request.message, request.context)
+        try:
+            async for delta in tutor:
+                yield _sse({"delta": delta})
+            yield _sse({}, event="done")
+        finally:
+            await asyncio.shield(tutor.aclose())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/admin/chat-metrics")
+async def get_chat_metrics(current_user: Principal = Depends(get_admin_user)):
+    """Streaming tutor time-to-first-token and token usage (Admin only)"""
+    return chat_stream_metrics.snapshot()
+
+
+@app.get("/api/admin/llm-providers")
+def get_llm_providers(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_admin_user)
+):
+    """
+    Health, breaker state, latency and cost per LLM provider in this process,
+    plus the questions each provider has generated (Admin only)
+    """
+    return {"providers": llm_router.snapshot(), "generation": provider_totals(db)}
+
+
 @app.post("/api/study/ai-explanation")
 async def get_ai_explanation(
     question_id: int,
     selected_option: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get AI-powered explanation for a question using OpenAI"""
-    question = db.query(Question).filter(Question.id == question_id).first()
+    result = await db.execute(
+        select(Question).options(selectinload(Question.topic)).where(Question.id == question_id)
+    )
+    question = result.scalars().first()
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
+    if selected_option.upper() not in ("A", "B", "C", "D"):
+        raise HTTPException(status_code=400, detail="selected_option must be A, B, C or D")
     
     is_correct = selected_option.upper() == question.correct_answer.upper()
     topic_name = question.topic.name if question.topic else None
     
-    explanation = await generate_explanation_openai(
-        question_text=question.text,
-        correct_answer=question.correct_answer,
-        user_answer=selected_option,
-        topic=topic_name,
-        is_correct=is_correct
+    # The per-user LLM budget is only spent when the explanation is not cached
+    explanation = await explanation_cache.get(
+        db, question, selected_option, is_correct, topic=topic_name,
+        charge=lambda: enforce_llm_rate_limit(current_user.id)
     )
     
     return {
@@ -838,14 +976,86 @@ async def get_ai_explanation(
     }
 
 
+@app.post("/api/admin/explanations/precompute")
+async def precompute_explanations(
+    background_tasks: BackgroundTasks,
+    limit: int = Query(default=50, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_admin_user)
+):
+    """Generate explanations for the most-missed (question, option) pairs not yet cached (Admin only)"""
+    misses = (
+        select(Answer.question_id, Answer.selected_option, func.count().label("misses"))
+        .where(Answer.is_correct == False)
+        .group_by(Answer.question_id, Answer.selected_option)
+        .subquery()
+    )
+    rows = (await db.execute(
+        select(misses.c.question_id, misses.c.selected_option, misses.c.misses)
+        .outerjoin(AIExplanation, and_(
+            AIExplanation.question_id == misses.c.question_id,
+            AIExplanation.selected_option == misses.c.selected_option,
+            AIExplanation.is_correct == False,
+            AIExplanation.prompt_version == EXPLANATION_PROMPT_VERSION
+        ))
+        .where(AIExplanation.question_id.is_(None))
+        .order_by(misses.c.misses.desc())
+        .limit(limit)
+    )).all()
+    pairs = [(question_id, option) for question_id, option, _ in rows]
+    
+    # Capped so a large precompute never holds more than a few pooled
+    # connections or OpenAI slots that logins and students need
+    slots = asyncio.Semaphore(EXPLANATION_PRECOMPUTE_CONCURRENCY)
+    
+    async def _explain(question: Question, option: str):
+        async with slots:
+            # One session per task: an AsyncSession must not be shared concurrently.
+            # The cache releases its connection before calling the LLM.
+            async with AsyncSessionLocal() as session:
+                return await explanation_cache.get(
+                    session, question, option, False,
+                    topic=question.topic.name if question.topic else None
+                )
+    
+    async def _precompute():
+        async with AsyncSessionLocal() as session:
+            questions = (await session.execute(
+                select(Question).options(selectinload(Question.topic))
+                .where(Question.id.in_({qid for qid, _ in pairs}))
+            )).scalars().all()
+        by_id = {q.id: q for q in questions}
+        results = await asyncio.gather(*[
+            _explain(by_id[qid], option) for qid, option in pairs if qid in by_id
+        ], return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        failed = sum(1 for r in results if r in (EXPLANATION_FAILED, EXPLANATION_NOT_CONFIGURED))
+        if errors:
+            logging.error(f"Explanation precompute: {len(errors)} errors, first: {errors[0]!r}")
+        logging.info(
+            f"Precomputed explanations for {len(results) - len(errors) - failed} of "
+            f"{len(pairs)} most-missed options ({failed} not generated)"
+        )
+    
+    background_tasks.add_task(_precompute)
+    return {"status": "Precompute started in background", "queued": len(pairs)}
+
+
+@app.get("/api/admin/explanations/cache")
+async def get_explanation_cache_stats(current_user: Principal = Depends(get_admin_user)):
+    """Explanation cache hit/miss counters (Admin only)"""
+    return explanation_cache.stats()
+
+
 @app.post("/api/study/ai-question-generate")
 async def generate_question_ai(
     entity: str = "General",
     topic: Optional[str] = None,
     profile: Optional[str] = None,
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Generate a random new question using AI"""
+    enforce_llm_rate_limit(current_user.id)
     question_data = await generate_ai_question(entity, topic, profile)
     return question_data
 
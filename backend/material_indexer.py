@@ -3,10 +3,16 @@ MeritSim - Material Indexer Service
 Scans and catalogs PDFs from the study materials folder
 """
 import os
+import subprocess
+import sys
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Dict
-from models import SessionLocal, Material, Entity, Profile
+from typing import Callable, Optional, List, Dict, Tuple
+from sqlalchemy import func, insert, select, update
+from models import SessionLocal, Material, Entity, Profile, GenerationJob, Question
+from generation_ledger import file_hash
+from job_queue import JobCancelled, JobContext, enqueue, job_handler
 
 # Determine path based on environment
 if os.path.exists("/app/materials"):
@@ -15,6 +21,16 @@ else:
     MATERIALS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MATERIAL DE ESTUDIO 2026")
 
 
+# How often a scan reports progress, which for an ingest job is also its
+# heartbeat: the first hash pass of a large root can outlast JOB_STALE_SECONDS
+INDEX_PROGRESS_SECONDS = float(os.getenv("INDEX_PROGRESS_SECONDS", "10"))
+
+
+def ingest_lock_key(materials_path: str) -> str:
+    """Job lock key allowing one queued-or-running ingestion per materials root"""
+    return f"ingest:{os.path.realpath(materials_path)}"
+
+
 def get_entity_by_folder_name(db, folder_name: str) -> Optional[Entity]:
     """Find entity by folder name (case-insensitive)"""
     return db.query(Entity).filter(
@@ -36,8 +52,7 @@ def get_or_create_profile(db, entity_id: int, profile_name: str) -> Profile:
             description=f"Perfil {profile_name} creado automáticamente"
         )
         db.add(profile)
-        db.commit()
-        db.refresh(profile)
+        db.flush()  # assigns the id inside the scan's transaction
         print(f"  📁 Created new profile: {profile_name}")
     
     return profile
@@ -48,13 +63,45 @@ def get_file_info(filepath: str) -> Dict:
     stat = os.stat(filepath)
     return {
         "size": stat.st_size,
+        "mtime": stat.st_mtime,
         "modified": datetime.fromtimestamp(stat.st_mtime)
     }
 
 
-def index_materials(materials_path: str = MATERIALS_PATH) -> Dict:
+def scan_pdfs(materials_path: str) -> Dict[str, Dict]:
+    """Relative filepath -> file info for every PDF under the materials folder"""
+    found = {}
+    for root, dirs, files in os.walk(materials_path):
+        for filename in files:
+            if filename.lower().endswith('.pdf'):
+                filepath = os.path.join(root, filename)
+                found[os.path.relpath(filepath, materials_path)] = get_file_info(filepath)
+    return found
+
+
+def classify(known, relative_filepath: str, info: Dict, materials_path: str) -> Tuple[str, Optional[str]]:
     """
-    Scan the materials folder and index all PDFs.
+    Compare a file on disk with its indexed row.
+
+    A file whose size and mtime both match (and whose row has a hash) is
+    unchanged without being read. Any other file is hashed: the same hash
+    means only its metadata changed (touched), a different one that its
+    content did (changed). Rows indexed before hashes existed adopt the
+    current hash. Returns the status and the hash if computed.
+    """
+    if known.file_size == info["size"] and known.file_mtime == info["mtime"] and known.content_hash:
+        return "unchanged", None
+    content_hash = file_hash(os.path.join(materials_path, relative_filepath))
+    if known.content_hash is None:
+        # Indexed before fingerprints existed: adopt the current version
+        return ("touched" if known.file_size == info["size"] else "changed"), content_hash
+    return ("touched" if content_hash == known.content_hash else "changed"), content_hash
+
+
+def index_materials(materials_path: str = MATERIALS_PATH, regenerate: bool = False,
+                    progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+    """
+    Scan the materials folder and index new, changed and deleted PDFs.
     
     Folder structure expected:
     MATERIAL DE ESTUDIO 2026/
@@ -64,6 +111,14 @@ def index_materials(materials_path: str = MATERIALS_PATH) -> Dict:
     └── CAR/
         └── Profesional/
             └── normativa.pdf
+    
+    Known materials are loaded once, new ones are bulk inserted and the whole
+    scan is committed in one transaction. Changed files get a new content
+    hash, so the generator's ledger treats them as new work, and the
+    questions generated from their old content are deactivated. With
+    regenerate=True an ingest job is queued to generate questions for them.
+    progress(files_done, total_files) is called every INDEX_PROGRESS_SECONDS
+    during the scan; exceptions it raises abort the scan.
     """
     print("=" * 60)
     print("📚 MeritSim - Material Indexer")
@@ -77,105 +132,138 @@ def index_materials(materials_path: str = MATERIALS_PATH) -> Dict:
     stats = {
         "total_files": 0,
         "indexed": 0,
-        "skipped": 0,
+        "changed": 0,
+        "unchanged": 0,
+        "deleted": 0,
         "errors": 0,
         "entities_found": set(),
         "profiles_created": 0
     }
+    to_regenerate = []
     
     try:
-        # Walk through the materials directory
-        for root, dirs, files in os.walk(materials_path):
-            # Calculate relative path from materials root
-            rel_path = os.path.relpath(root, materials_path)
-            path_parts = rel_path.split(os.sep) if rel_path != "." else []
-            
-            # Process PDF files
-            pdf_files = [f for f in files if f.lower().endswith('.pdf')]
-            
-            for filename in pdf_files:
-                stats["total_files"] += 1
-                filepath = os.path.join(root, filename)
-                relative_filepath = os.path.relpath(filepath, materials_path)
-                
-                print(f"\n📄 Processing: {relative_filepath}")
-                
-                # Check if already indexed
-                existing = db.query(Material).filter(
-                    Material.filepath == relative_filepath
-                ).first()
+        known = {m.filepath: m for m in db.query(
+            Material.id, Material.filepath, Material.file_size, Material.file_mtime,
+            Material.content_hash, Material.is_active
+        )}
+        on_disk = scan_pdfs(materials_path)
+        stats["total_files"] = len(on_disk)
+        
+        new_rows = []
+        changed = []
+        touched = []  # same content, new mtime or reappeared on disk
+        folder_cache: Dict[Tuple[str, ...], Tuple[Optional[int], Optional[int]]] = {}
+        
+        last_report = time.monotonic()
+        for done, (relative_filepath, info) in enumerate(on_disk.items()):
+            if progress and time.monotonic() - last_report >= INDEX_PROGRESS_SECONDS:
+                progress(done, len(on_disk))
+                last_report = time.monotonic()
+            existing = known.get(relative_filepath)
+            try:
+                if existing is None:
+                    print(f"\n📄 New: {relative_filepath}")
+                    entity_id, profile_id = _resolve_folder(
+                        db, Path(relative_filepath).parts[:-1], folder_cache, stats
+                    )
+                    filename = os.path.basename(relative_filepath)
+                    new_rows.append({
+                        "entity_id": entity_id,
+                        "profile_id": profile_id,
+                        "filename": filename,
+                        "filepath": relative_filepath,
+                        "title": os.path.splitext(filename)[0],  # Use filename as title
+                        "file_size": info["size"],
+                        "file_mtime": info["mtime"],
+                        "content_hash": file_hash(os.path.join(materials_path, relative_filepath)),
+                        "is_active": True,
+                        "indexed_at": datetime.utcnow()
+                    })
+                    to_regenerate.append(relative_filepath)
+                    continue
                 
-                if existing:
-                    print(f"  ⏭️ Already indexed, skipping")
-                    stats["skipped"] += 1
+                status, content_hash = classify(existing, relative_filepath, info, materials_path)
+                if status == "unchanged" and existing.is_active:
+                    stats["unchanged"] += 1
                     continue
                 
-                try:
-                    # Determine entity and profile from folder structure
-                    entity_id = None
-                    profile_id = None
-                    
-                    if len(path_parts) >= 1:
-                        # Level 1: Entity
-                        entity_folder = path_parts[0]
-                        entity = get_entity_by_folder_name(db, entity_folder)
-                        
-                        if entity:
-                            entity_id = entity.id
-                            stats["entities_found"].add(entity.name)
-                            print(f"  🏛️ Entity: {entity.name}")
-                            
-                            if len(path_parts) >= 2:
-                                # Level 2: Profile
-                                profile_name = path_parts[1]
-                                profile = get_or_create_profile(db, entity.id, profile_name)
-                                profile_id = profile.id
-                                print(f"  👤 Profile: {profile.name}")
-                    
-                    # Get file info
-                    file_info = get_file_info(filepath)
-                    
-                    # Create material record
-                    material = Material(
-                        entity_id=entity_id,
-                        profile_id=profile_id,
-                        filename=filename,
-                        filepath=relative_filepath,
-                        title=os.path.splitext(filename)[0],  # Use filename as title
-                        file_size=file_info["size"],
-                        indexed_at=datetime.utcnow()
-                    )
-                    
-                    db.add(material)
-                    db.commit()
-                    
-                    stats["indexed"] += 1
-                    print(f"  ✅ Indexed successfully ({file_info['size']} bytes)")
-                    
-                except Exception as e:
-                    print(f"  ❌ Error indexing: {e}")
-                    stats["errors"] += 1
-                    db.rollback()
+                row = {
+                    "id": existing.id,
+                    "file_size": info["size"],
+                    "file_mtime": info["mtime"],
+                    "content_hash": content_hash or existing.content_hash,
+                    "is_active": True
+                }
+                if status == "changed":
+                    print(f"\n🔄 Changed: {relative_filepath}")
+                    stats["changed"] += 1
+                    changed.append({**row, "indexed_at": datetime.utcnow()})
+                    to_regenerate.append(relative_filepath)
+                else:
+                    stats["unchanged"] += 1
+                    touched.append(row)
+            except Exception as e:
+                print(f"  ❌ Error indexing {relative_filepath}: {e}")
+                stats["errors"] += 1
+        
+        # Rows keep their questions; the file is only hidden from listings.
+        # An empty scan is more likely an unmounted volume than a wiped library.
+        deleted = []
+        if not on_disk and known:
+            print("⚠️ No PDFs found; leaving existing materials active")
+        for path, m in known.items() if on_disk else ():
+            if path not in on_disk and m.is_active:
+                print(f"\n🗑️ Missing: {path}")
+                deleted.append({"id": m.id, "is_active": False})
+        stats["deleted"] = len(deleted)
+        
+        if new_rows:
+            db.execute(insert(Material), new_rows)
+        # Bulk UPDATE by primary key, one executemany per column set
+        for rows in (changed, touched, deleted):
+            if rows:
+                db.execute(update(Material), rows)
+        if changed:
+            # Generated from content that is no longer in the file
+            retired = db.execute(
+                update(Question)
+                .where(Question.material_id.in_([row["id"] for row in changed]), Question.is_active == True)
+                .values(is_active=False)
+            ).rowcount
+            print(f"  🧹 Deactivated {retired} question(s) from changed files")
+        db.commit()
+        stats["indexed"] = len(new_rows)
         
         print("\n" + "=" * 60)
         print("📊 Indexing Summary")
         print("=" * 60)
         print(f"  Total PDFs found: {stats['total_files']}")
         print(f"  Newly indexed: {stats['indexed']}")
-        print(f"  Already indexed (skipped): {stats['skipped']}")
+        print(f"  Changed: {stats['changed']}")
+        print(f"  Unchanged (skipped): {stats['unchanged']}")
+        print(f"  Missing from disk: {stats['deleted']}")
         print(f"  Errors: {stats['errors']}")
         print(f"  Entities detected: {', '.join(stats['entities_found']) or 'None'}")
         print("=" * 60)
         
+        if regenerate and to_regenerate:
+            hand_off_for_regeneration(materials_path, to_regenerate)
+        
         return {
             "status": "success",
             "total_files": stats["total_files"],
             "indexed": stats["indexed"],
-            "skipped": stats["skipped"],
+            "changed": stats["changed"],
+            "skipped": stats["unchanged"],
+            "deleted": stats["deleted"],
             "errors": stats["errors"],
-            "entities": list(stats["entities_found"])
+            "entities": list(stats["entities_found"]),
+            "to_regenerate": to_regenerate
         }
         
+    except JobCancelled:
+        db.rollback()
+        raise
     except Exception as e:
         print(f"❌ Fatal error during indexing: {e}")
         db.rollback()
@@ -185,6 +273,127 @@ def index_materials(materials_path: str = MATERIALS_PATH) -> Dict:
         db.close()
 
 
+def _resolve_folder(db, path_parts, cache: Dict, stats: Dict) -> Tuple[Optional[int], Optional[int]]:
+    """Entity and profile ids for a folder, looked up once per folder per scan"""
+    key = tuple(path_parts[:2])
+    if key in cache:
+        return cache[key]
+    entity_id = None
+    profile_id = None
+    if len(path_parts) >= 1:
+        # Level 1: Entity
+        entity = get_entity_by_folder_name(db, path_parts[0])
+        if entity:
+            entity_id = entity.id
+            stats["entities_found"].add(entity.name)
+            print(f"  🏛️ Entity: {entity.name}")
+            if len(path_parts) >= 2:
+                # Level 2: Profile
+                profile = get_or_create_profile(db, entity.id, path_parts[1])
+                profile_id = profile.id
+                print(f"  👤 Profile: {profile.name}")
+    cache[key] = (entity_id, profile_id)
+    return cache[key]
+
+
+def hand_off_for_regeneration(materials_path: str, relative_filepaths: List[str]):
+    """
+    Queue an ingest job that generates questions for new/changed files.
+    It holds the root's ingest lock, so it never races another ingestion;
+    the API's job workers run it.
+    """
+    db = SessionLocal()
+    try:
+        job, created = enqueue(
+            db, "ingest",
+            {"root": materials_path, "generate": "changed", "paths": relative_filepaths},
+            lock_key=ingest_lock_key(materials_path)
+        )
+    finally:
+        db.close()
+    if created:
+        print(f"🤖 Queued ingest job {job.id} for {len(relative_filepaths)} file(s)")
+    else:
+        print(f"⚠️ Ingest job {job.id} is already queued or running for this folder; "
+              f"run again once it finishes to generate for these files")
+
+
+def _generation_progress(since: datetime, materials_path: str, targets: List[str]) -> Tuple[int, int]:
+    """
+    (completed, total) chunks of the generator jobs an ingest started: those
+    touched since it launched the generator, for the files it handed over
+    (targets relative to materials_path; none means every file under it)
+    """
+    if targets:
+        ours = GenerationJob.filepath.in_([os.path.join(materials_path, t) for t in targets])
+    else:
+        ours = GenerationJob.filepath.startswith(os.path.join(materials_path, ""), autoescape=True)
+    db = SessionLocal()
+    try:
+        completed, total = db.execute(
+            select(func.coalesce(func.sum(GenerationJob.completed_chunks), 0),
+                   func.coalesce(func.sum(GenerationJob.total_chunks), 0))
+            .where(GenerationJob.updated_at >= since, ours)
+        ).one()
+        return completed, total
+    finally:
+        db.close()
+
+
+@job_handler("ingest")
+def run_ingest_job(payload: Dict, context: JobContext) -> Dict:
+    """
+    Index a materials root, then generate questions: for every file
+    (generate="all") or only new/changed ones (generate="changed"), plus
+    any listed in payload["paths"] by an indexer run that queued the job.
+    The generator runs as a child process; cancelling stops it, and its
+    ledger lets the next run pick up where it left off.
+    """
+    materials_path = payload.get("root", MATERIALS_PATH)
+    context.update(0, "Indexando materiales")
+    result = index_materials(
+        materials_path,
+        progress=lambda done, total: context.update(
+            10 * done / total, f"Indexando materiales: {done}/{total} archivos"
+        )
+    )
+    if result.get("status") != "success":
+        raise RuntimeError(result.get("message", "Indexing failed"))
+    
+    if payload.get("generate") == "all":
+        targets = []
+    else:
+        targets = sorted(set(result["to_regenerate"]) | set(payload.get("paths", [])))
+        if not targets:
+            return {"index": result, "generator_exit_code": None}
+    context.update(10, "Generando preguntas")
+    
+    started = datetime.utcnow()
+    generator = subprocess.Popen(
+        [sys.executable, "question_generator.py", "--root", materials_path, *targets],
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    try:
+        while generator.poll() is None:
+            time.sleep(5)
+            completed, total = _generation_progress(started, materials_path, targets)
+            progress = 10 + 90 * completed / total if total else 10
+            context.update(progress, f"Generando preguntas: {completed}/{total} fragmentos")
+    except JobCancelled:
+        generator.terminate()
+        try:
+            generator.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            generator.kill()
+        raise
+    
+    if generator.returncode != 0:
+        raise RuntimeError(f"question_generator.py exited with code {generator.returncode}")
+    completed, total = _generation_progress(started, materials_path, targets)
+    return {"index": result, "generator_exit_code": generator.returncode,
+            "chunks_completed": completed, "chunks_total": total}
+
+
 def get_materials_by_entity(entity_name: str) -> List[Dict]:
     """Get all materials for a specific entity"""
     db = SessionLocal()
@@ -194,7 +403,8 @@ def get_materials_by_entity(entity_name: str) -> List[Dict]:
             return []
         
         materials = db.query(Material).filter(
-            Material.entity_id == entity.id
+            Material.entity_id == entity.id,
+            Material.is_active == True
         ).all()
         
         return [
@@ -213,14 +423,17 @@ def get_materials_by_entity(entity_name: str) -> List[Dict]:
         db.close()
 
 
-def suggest_materials_for_user(user_id: int, limit: int = 5) -> List[Dict]:
+def suggest_materials_for_user(user_id: int, limit: int = 5, db=None) -> List[Dict]:
     """
     Suggest materials based on user's recent wrong answers.
     Returns materials related to topics where user struggles.
+    Pass the request's session as db to avoid holding a second connection.
     """
-    from models import Answer, Question
+    from models import Answer
     
-    db = SessionLocal()
+    owns_session = db is None
+    if owns_session:
+        db = SessionLocal()
     try:
         # Get user's recent wrong answers
         wrong_answers = db.query(Answer).filter(
@@ -230,7 +443,7 @@ def suggest_materials_for_user(user_id: int, limit: int = 5) -> List[Dict]:
         
         if not wrong_answers:
             # Return random materials if no wrong answers
-            materials = db.query(Material).limit(limit).all()
+            materials = db.query(Material).filter(Material.is_active == True).limit(limit).all()
         else:
             # Get entity IDs from wrong answers
             entity_ids = set()
@@ -240,7 +453,8 @@ def suggest_materials_for_user(user_id: int, limit: int = 5) -> List[Dict]:
             
             # Get materials from those entities
             materials = db.query(Material).filter(
-                Material.entity_id.in_(entity_ids)
+                Material.entity_id.in_(entity_ids),
+                Material.is_active == True
             ).limit(limit).all()
         
         return [
@@ -256,10 +470,11 @@ def suggest_materials_for_user(user_id: int, limit: int = 5) -> List[Dict]:
             for m in materials
         ]
     finally:
-        db.close()
+        if owns_session:
+            db.close()
 
 
 if __name__ == "__main__":
-    # Run indexer directly
-    result = index_materials()
+    # Run indexer directly; --regenerate also queues an ingest job that generates for new/changed files
+    result = index_materials(regenerate="--regenerate" in sys.argv)
     print(f"\nResult: {result}")
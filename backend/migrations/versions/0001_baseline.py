@@ -0,0 +1,197 @@
+"""Baseline schema
+
+The schema as it stood when migrations were introduced. Databases created
+before then were built with Base.metadata.create_all(), so tables that
+already exist are skipped; everything added since lives in later revisions.
+
+Keep this revision frozen: it must not import the models, which describe the
+schema at head.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-16
+"""
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+USER_ROLE = postgresql.ENUM("ADMIN", "USER", name="userrole", create_type=False)
+STUDY_MODE = postgresql.ENUM("SIMULACRO", "ADVANCED", name="studymode", create_type=False)
+
+# In dependency order
+TABLES = [
+    "entities", "topics", "users", "profiles", "study_sessions", "user_entity_progress",
+    "user_progress", "materials", "questions", "answers", "exam_session_questions",
+]
+
+
+def _create(name, *columns, indexes=()):
+    op.create_table(name, *columns)
+    for index_name, index_columns, unique in indexes:
+        op.create_index(index_name, name, index_columns, unique=unique)
+
+
+def upgrade():
+    if context.is_offline_mode():
+        # No database to inspect: render the full schema for an empty one
+        existing = set()
+        USER_ROLE.create(op.get_bind())
+        STUDY_MODE.create(op.get_bind())
+    else:
+        bind = op.get_bind()
+        existing = set(sa.inspect(bind).get_table_names())
+        USER_ROLE.create(bind, checkfirst=True)
+        STUDY_MODE.create(bind, checkfirst=True)
+
+    if "entities" not in existing:
+        _create(
+            "entities",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("name", sa.String(100), nullable=False, unique=True),
+            sa.Column("description", sa.Text),
+            sa.Column("icon", sa.String(50)),
+            sa.Column("color", sa.String(20)),
+            sa.Column("created_at", sa.DateTime),
+            indexes=[("ix_entities_id", ["id"], False)],
+        )
+    if "topics" not in existing:
+        _create(
+            "topics",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("description", sa.Text),
+            sa.Column("parent_id", sa.Integer, sa.ForeignKey("topics.id")),
+            indexes=[("ix_topics_id", ["id"], False)],
+        )
+    if "users" not in existing:
+        _create(
+            "users",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("email", sa.String(255), nullable=False),
+            sa.Column("hashed_password", sa.String(255), nullable=False),
+            sa.Column("full_name", sa.String(255)),
+            sa.Column("role", USER_ROLE),
+            sa.Column("is_active", sa.Boolean),
+            sa.Column("xp_points", sa.Integer),
+            sa.Column("level", sa.Integer),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("updated_at", sa.DateTime),
+            indexes=[("ix_users_id", ["id"], False), ("ix_users_email", ["email"], True)],
+        )
+    if "profiles" not in existing:
+        _create(
+            "profiles",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("entity_id", sa.Integer, sa.ForeignKey("entities.id"), nullable=False),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("description", sa.Text),
+            sa.Column("created_at", sa.DateTime),
+            indexes=[("ix_profiles_id", ["id"], False)],
+        )
+    if "study_sessions" not in existing:
+        _create(
+            "study_sessions",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("mode", STUDY_MODE, nullable=False),
+            sa.Column("entity_id", sa.Integer, sa.ForeignKey("entities.id")),
+            sa.Column("started_at", sa.DateTime),
+            sa.Column("completed_at", sa.DateTime),
+            sa.Column("time_limit_minutes", sa.Integer),
+            sa.Column("total_questions", sa.Integer),
+            sa.Column("correct_answers", sa.Integer),
+            sa.Column("score", sa.Float),
+            sa.Column("xp_earned", sa.Integer),
+            indexes=[("ix_study_sessions_id", ["id"], False)],
+        )
+    if "user_entity_progress" not in existing:
+        _create(
+            "user_entity_progress",
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("entity_id", sa.Integer, sa.ForeignKey("entities.id"), primary_key=True),
+            sa.Column("total_answers", sa.Integer, nullable=False),
+            sa.Column("correct_answers", sa.Integer, nullable=False),
+        )
+    if "user_progress" not in existing:
+        _create(
+            "user_progress",
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("total_sessions", sa.Integer, nullable=False),
+            sa.Column("total_answers", sa.Integer, nullable=False),
+            sa.Column("correct_answers", sa.Integer, nullable=False),
+            sa.Column("current_streak", sa.Integer, nullable=False),
+            sa.Column("last_answer_date", sa.Date),
+            sa.Column("updated_at", sa.DateTime),
+        )
+    if "materials" not in existing:
+        _create(
+            "materials",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("entity_id", sa.Integer, sa.ForeignKey("entities.id")),
+            sa.Column("profile_id", sa.Integer, sa.ForeignKey("profiles.id")),
+            sa.Column("filename", sa.String(255), nullable=False),
+            sa.Column("filepath", sa.String(500), nullable=False),
+            sa.Column("title", sa.String(255)),
+            sa.Column("description", sa.Text),
+            sa.Column("file_size", sa.Integer),
+            sa.Column("page_count", sa.Integer),
+            sa.Column("indexed_at", sa.DateTime),
+            indexes=[("ix_materials_id", ["id"], False)],
+        )
+    if "questions" not in existing:
+        _create(
+            "questions",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("entity_id", sa.Integer, sa.ForeignKey("entities.id")),
+            sa.Column("profile_id", sa.Integer, sa.ForeignKey("profiles.id")),
+            sa.Column("topic_id", sa.Integer, sa.ForeignKey("topics.id")),
+            sa.Column("material_id", sa.Integer, sa.ForeignKey("materials.id")),
+            sa.Column("text", sa.Text, nullable=False),
+            sa.Column("option_a", sa.String(500), nullable=False),
+            sa.Column("option_b", sa.String(500), nullable=False),
+            sa.Column("option_c", sa.String(500), nullable=False),
+            sa.Column("option_d", sa.String(500), nullable=False),
+            sa.Column("correct_answer", sa.String(1), nullable=False),
+            sa.Column("explanation", sa.Text),
+            sa.Column("page_reference", sa.String(50)),
+            sa.Column("difficulty", sa.Integer),
+            sa.Column("xp_reward", sa.Integer),
+            sa.Column("is_active", sa.Boolean),
+            sa.Column("created_at", sa.DateTime),
+            indexes=[("ix_questions_id", ["id"], False)],
+        )
+    if "answers" not in existing:
+        _create(
+            "answers",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("session_id", sa.Integer, sa.ForeignKey("study_sessions.id"), nullable=False),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("question_id", sa.Integer, sa.ForeignKey("questions.id"), nullable=False),
+            sa.Column("selected_option", sa.String(1), nullable=False),
+            sa.Column("is_correct", sa.Boolean, nullable=False),
+            sa.Column("time_spent_seconds", sa.Integer),
+            sa.Column("answered_at", sa.DateTime),
+            indexes=[("ix_answers_id", ["id"], False)],
+        )
+    if "exam_session_questions" not in existing:
+        _create(
+            "exam_session_questions",
+            sa.Column("session_id", sa.Integer, sa.ForeignKey("study_sessions.id"), primary_key=True),
+            sa.Column("question_id", sa.Integer, sa.ForeignKey("questions.id"), primary_key=True),
+            sa.Column("position", sa.Integer, nullable=False),
+            sa.Column("entity_id", sa.Integer),
+            sa.Column("correct_answer", sa.String(1), nullable=False),
+            sa.Column("xp_reward", sa.Integer, nullable=False),
+        )
+
+
+def downgrade():
+    for name in reversed(TABLES):
+        op.drop_table(name)
+    STUDY_MODE.drop(op.get_bind(), checkfirst=True)
+    USER_ROLE.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,43 @@
+"""Composite and partial indexes for the hot query shapes
+
+- questions: sampler/catalog filters over active questions
+- answers: per-user history (progress, streak, suggestions) and per-session lookups
+- study_sessions: per-user session counts
+- materials: indexer lookups by filepath
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_hot_path_indexes"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_questions_active_filters", "questions",
+     ["entity_id", "profile_id", "topic_id", "difficulty"], "is_active"),
+    ("ix_questions_active_topic", "questions", ["topic_id"], "is_active"),
+    ("ix_answers_user_correct_answered", "answers", ["user_id", "is_correct", "answered_at"], None),
+    ("ix_answers_session_id", "answers", ["session_id"], None),
+    ("ix_answers_question_id", "answers", ["question_id"], None),
+    ("ix_study_sessions_user_id", "study_sessions", ["user_id"], None),
+    ("ix_materials_filepath", "materials", ["filepath"], None),
+]
+
+
+def upgrade():
+    for name, table, columns, where in INDEXES:
+        op.create_index(
+            name, table, columns,
+            postgresql_where=sa.text(where) if where else None,
+            if_not_exists=True
+        )
+
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,34 @@
+"""Materialized per-user topic progress for the adventure map
+
+Revision ID: 0003_user_topic_progress
+Revises: 0002_hot_path_indexes
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_user_topic_progress"
+down_revision = "0002_hot_path_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_mastered_questions",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("question_id", sa.Integer, sa.ForeignKey("questions.id"), primary_key=True),
+        sa.Column("topic_id", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("mastered_at", sa.DateTime),
+    )
+    op.create_table(
+        "user_topic_progress",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("topic_id", sa.Integer, primary_key=True),
+        sa.Column("correct_questions", sa.Integer, nullable=False, server_default="0"),
+    )
+
+
+def downgrade():
+    op.drop_table("user_topic_progress")
+    op.drop_table("user_mastered_questions")
@@ -0,0 +1,29 @@
+"""Persistent cache of AI-generated explanations
+
+Revision ID: 0004_ai_explanations
+Revises: 0003_user_topic_progress
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_ai_explanations"
+down_revision = "0003_user_topic_progress"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ai_explanations",
+        sa.Column("question_id", sa.Integer, sa.ForeignKey("questions.id"), primary_key=True),
+        sa.Column("selected_option", sa.String(1), primary_key=True),
+        sa.Column("is_correct", sa.Boolean, primary_key=True),
+        sa.Column("prompt_version", sa.String(20), primary_key=True),
+        sa.Column("explanation", sa.Text, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+    )
+
+
+def downgrade():
+    op.drop_table("ai_explanations")
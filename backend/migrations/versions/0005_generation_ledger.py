@@ -0,0 +1,56 @@
+"""Question generation job ledger
+
+Revision ID: 0005_generation_ledger
+Revises: 0004_ai_explanations
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_generation_ledger"
+down_revision = "0004_ai_explanations"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "generation_jobs",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("content_hash", sa.String(64), nullable=False),
+        sa.Column("prompt_version", sa.String(64), nullable=False),
+        sa.Column("filepath", sa.String(500), nullable=False),
+        sa.Column("material_id", sa.Integer, sa.ForeignKey("materials.id"), nullable=True),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("total_chunks", sa.Integer, nullable=False),
+        sa.Column("completed_chunks", sa.Integer, nullable=False),
+        sa.Column("questions_created", sa.Integer, nullable=False),
+        sa.Column("started_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+    )
+    op.create_index(
+        "ux_generation_jobs_hash_version", "generation_jobs",
+        ["content_hash", "prompt_version"], unique=True
+    )
+    op.create_table(
+        "generation_chunks",
+        sa.Column("content_hash", sa.String(64), primary_key=True),
+        sa.Column("chunk_index", sa.Integer, primary_key=True),
+        sa.Column("provider", sa.String(20), primary_key=True),
+        sa.Column("prompt_version", sa.String(64), primary_key=True),
+        sa.Column("job_id", sa.Integer, sa.ForeignKey("generation_jobs.id"), nullable=False),
+        sa.Column("questions_created", sa.Integer, nullable=False),
+        sa.Column("completed_at", sa.DateTime),
+    )
+    op.create_index(
+        "ux_generation_chunks_chunk", "generation_chunks",
+        ["content_hash", "prompt_version", "chunk_index"], unique=True
+    )
+
+
+def downgrade():
+    op.drop_index("ux_generation_chunks_chunk", table_name="generation_chunks")
+    op.drop_table("generation_chunks")
+    op.drop_index("ux_generation_jobs_hash_version", table_name="generation_jobs")
+    op.drop_table("generation_jobs")
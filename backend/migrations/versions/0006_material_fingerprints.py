@@ -0,0 +1,25 @@
+"""File fingerprints for incremental material indexing
+
+Revision ID: 0006_material_fingerprints
+Revises: 0005_generation_ledger
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_material_fingerprints"
+down_revision = "0005_generation_ledger"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("materials", sa.Column("file_mtime", sa.Float, nullable=True))
+    op.add_column("materials", sa.Column("content_hash", sa.String(64), nullable=True))
+    op.add_column("materials", sa.Column("is_active", sa.Boolean, nullable=False, server_default=sa.true()))
+
+
+def downgrade():
+    op.drop_column("materials", "is_active")
+    op.drop_column("materials", "content_hash")
+    op.drop_column("materials", "file_mtime")
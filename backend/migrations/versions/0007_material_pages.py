@@ -0,0 +1,26 @@
+"""Per-page extracted text store
+
+Revision ID: 0007_material_pages
+Revises: 0006_material_fingerprints
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007_material_pages"
+down_revision = "0006_material_fingerprints"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "material_pages",
+        sa.Column("content_hash", sa.String(64), primary_key=True),
+        sa.Column("page_number", sa.Integer, primary_key=True),
+        sa.Column("text", sa.Text, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("material_pages")
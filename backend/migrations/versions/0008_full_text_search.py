@@ -0,0 +1,44 @@
+"""Spanish full-text search over questions and extracted material pages
+
+Adds stored generated tsvector columns with GIN indexes. Adding a stored
+generated column rewrites the table once.
+
+Revision ID: 0008_full_text_search
+Revises: 0007_material_pages
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0008_full_text_search"
+down_revision = "0007_material_pages"
+branch_labels = None
+depends_on = None
+
+QUESTION_DOCUMENT = (
+    "setweight(to_tsvector('spanish'::regconfig, coalesce(text, '')), 'A') || "
+    "setweight(to_tsvector('spanish'::regconfig, coalesce(option_a, '') || ' ' || "
+    "coalesce(option_b, '') || ' ' || coalesce(option_c, '') || ' ' || coalesce(option_d, '')), 'B') || "
+    "setweight(to_tsvector('spanish'::regconfig, coalesce(explanation, '')), 'C')"
+)
+PAGE_DOCUMENT = "to_tsvector('spanish'::regconfig, text)"
+
+COLUMNS = [
+    ("questions", QUESTION_DOCUMENT, "ix_questions_search"),
+    ("material_pages", PAGE_DOCUMENT, "ix_material_pages_search"),
+]
+
+
+def upgrade():
+    for table, document, index in COLUMNS:
+        op.add_column(table, sa.Column(
+            "search_vector", postgresql.TSVECTOR, sa.Computed(document, persisted=True)
+        ))
+        op.create_index(index, table, ["search_vector"], postgresql_using="gin")
+
+
+def downgrade():
+    for table, _, index in reversed(COLUMNS):
+        op.drop_index(index, table_name=table)
+        op.drop_column(table, "search_vector")
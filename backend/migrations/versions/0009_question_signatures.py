@@ -0,0 +1,38 @@
+"""Near-duplicate question index
+
+Revision ID: 0009_question_signatures
+Revises: 0008_full_text_search
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009_question_signatures"
+down_revision = "0008_full_text_search"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "question_signatures",
+        sa.Column("question_id", sa.Integer, sa.ForeignKey("questions.id"), primary_key=True),
+        sa.Column("signature", sa.LargeBinary, nullable=False),
+    )
+    op.create_table(
+        "question_lsh_buckets",
+        sa.Column("bucket_key", sa.BigInteger, primary_key=True),
+        sa.Column("question_id", sa.Integer, sa.ForeignKey("questions.id"), primary_key=True),
+    )
+    op.create_index("ix_question_lsh_buckets_question_id", "question_lsh_buckets", ["question_id"])
+    op.add_column(
+        "generation_jobs",
+        sa.Column("duplicates_skipped", sa.Integer, nullable=False, server_default="0")
+    )
+
+
+def downgrade():
+    op.drop_column("generation_jobs", "duplicates_skipped")
+    op.drop_index("ix_question_lsh_buckets_question_id", table_name="question_lsh_buckets")
+    op.drop_table("question_lsh_buckets")
+    op.drop_table("question_signatures")
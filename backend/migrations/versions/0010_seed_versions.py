@@ -0,0 +1,37 @@
+"""Idempotent bulk seeding: question content hashes and the seed version marker
+
+Existing questions are keyed by the sha256 of their text, the first of each
+identical text only, matching the exact-text check seeding used before.
+
+Revision ID: 0010_seed_versions
+Revises: 0009_question_signatures
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010_seed_versions"
+down_revision = "0009_question_signatures"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("questions", sa.Column("content_hash", sa.String(64), nullable=True))
+    op.execute(
+        "UPDATE questions SET content_hash = encode(sha256(convert_to(text, 'UTF8')), 'hex') "
+        "WHERE id IN (SELECT min(id) FROM questions GROUP BY text)"
+    )
+    op.create_index("ux_questions_content_hash", "questions", ["content_hash"], unique=True)
+    op.create_table(
+        "seed_versions",
+        sa.Column("name", sa.String(50), primary_key=True),
+        sa.Column("version", sa.String(64), nullable=False),
+        sa.Column("applied_at", sa.DateTime),
+    )
+
+
+def downgrade():
+    op.drop_table("seed_versions")
+    op.drop_index("ux_questions_content_hash", table_name="questions")
+    op.drop_column("questions", "content_hash")
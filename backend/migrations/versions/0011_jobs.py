@@ -0,0 +1,48 @@
+"""Background job queue
+
+Revision ID: 0011_jobs
+Revises: 0010_seed_versions
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0011_jobs"
+down_revision = "0010_seed_versions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("kind", sa.String(30), nullable=False),
+        sa.Column("payload", postgresql.JSONB, nullable=False),
+        sa.Column("lock_key", sa.String(500), nullable=True),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("progress", sa.Float, nullable=False),
+        sa.Column("message", sa.String(500), nullable=True),
+        sa.Column("result", postgresql.JSONB, nullable=True),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("cancel_requested", sa.Boolean, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("worker", sa.String(100), nullable=True),
+        sa.Column("created_by", sa.Integer, sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("started_at", sa.DateTime, nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime, nullable=True),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+    )
+    op.create_index("ix_jobs_queued", "jobs", ["id"], postgresql_where=sa.text("status = 'queued'"))
+    op.create_index(
+        "ux_jobs_active_lock", "jobs", ["lock_key"], unique=True,
+        postgresql_where=sa.text("status IN ('queued', 'running')")
+    )
+
+
+def downgrade():
+    op.drop_index("ux_jobs_active_lock", table_name="jobs")
+    op.drop_index("ix_jobs_queued", table_name="jobs")
+    op.drop_table("jobs")
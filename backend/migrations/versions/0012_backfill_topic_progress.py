@@ -0,0 +1,36 @@
+"""Build topic progress for answers recorded before 0003
+
+record_mastery() only counts questions mastered after its tables exist;
+this rebuilds every user's rows from the answer history once, so earlier
+mastery is kept whichever request a user makes first after the upgrade.
+
+Revision ID: 0012_backfill_topic_progress
+Revises: 0011_jobs
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = "0012_backfill_topic_progress"
+down_revision = "0011_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "INSERT INTO user_mastered_questions (user_id, question_id, topic_id, mastered_at) "
+        "SELECT a.user_id, a.question_id, coalesce(q.topic_id, 0), min(a.answered_at) "
+        "FROM answers a JOIN questions q ON q.id = a.question_id "
+        "WHERE a.is_correct "
+        "GROUP BY a.user_id, a.question_id, q.topic_id "
+        "ON CONFLICT DO NOTHING"
+    )
+    op.execute(
+        "INSERT INTO user_topic_progress (user_id, topic_id, correct_questions) "
+        "SELECT user_id, topic_id, count(*) FROM user_mastered_questions GROUP BY user_id, topic_id "
+        "ON CONFLICT (user_id, topic_id) DO UPDATE SET correct_questions = EXCLUDED.correct_questions"
+    )
+
+
+def downgrade():
+    pass
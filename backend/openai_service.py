@@ -4,22 +4,113 @@ Integration with OpenAI GPT for pedagogical explanations
 """
 import os
 import json
-from typing import Optional, Dict, Any
-from openai import OpenAI
+import time
+import asyncio
+from typing import AsyncIterator, Callable, List, Optional, Dict, Any, Sequence, Tuple, Type
+
+import gemini_service
+from llm_limits import with_retries
+from llm_metrics import chat_stream_metrics
+from llm_router import llm_router
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "your-openai-api-key")
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "20"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30"))
+
+# Bump when the explanation prompt changes so cached explanations are regenerated
+EXPLANATION_PROMPT_VERSION = "v1"
+EXPLANATION_NOT_CONFIGURED = "Explicación no disponible. Configure la API de OpenAI."
+EXPLANATION_FAILED = "No se pudo generar la explicación en este momento."
+
+OPENAI_CONFIGURED = bool(OPENAI_API_KEY) and OPENAI_API_KEY != "your-openai-api-key"
+# Gemini takes over when OpenAI fails or its circuit is open (see llm_router)
+LLM_CONFIGURED = OPENAI_CONFIGURED or gemini_service.GEMINI_CONFIGURED
 
-# Initialize OpenAI client
-client = None
-if OPENAI_API_KEY and OPENAI_API_KEY != "your-openai-api-key":
-    # Let OpenAI pick up the key from environment or handle it internally
-    # Removing explicit api_key= to avoid TypeError in some httpx/openai version combinations
-    client = OpenAI()
+# Built on first use: importing the SDK costs more than the rest of the API's
+# startup, and processes that never call OpenAI should not pay for it.
+_client = None
+_retryable_errors: Tuple[Type[BaseException], ...] = ()
+
+# Caps in-flight completions per worker so a burst of tutor chats queues
+# here instead of exhausting connections or provider quota.
+_completion_slots = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
 
 
 def get_openai_client():
-    """Get the OpenAI client instance"""
-    return client
+    """
+    Get the OpenAI client instance (None if not configured).
+    The SDK is imported here the first time; _retryable_errors is set with it.
+    """
+    global _client, _retryable_errors
+    if _client is None and OPENAI_CONFIGURED:
+        import httpx
+        from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+        # One pooled HTTP client for every request in this worker; retries are
+        # handled by with_retries (jittered backoff) instead of the SDK.
+        _client = AsyncOpenAI(
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS
+                ),
+                timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=5.0)
+            ),
+            max_retries=0,
+            timeout=OPENAI_TIMEOUT_SECONDS
+        )
+        _retryable_errors = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+    return _client
+
+
+async def _create_completion(**kwargs):
+    client = get_openai_client()
+    async with _completion_slots:
+        return await with_retries(
+            lambda: client.chat.completions.create(**kwargs),
+            retry_on=_retryable_errors
+        )
+
+
+def _gemini_prompt(messages: List[Dict[str, str]]) -> str:
+    """A chat transcript as a single prompt, for failing over to Gemini"""
+    return "\n\n".join(m["content"] for m in messages)
+
+
+async def _complete(
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    json_output: bool = False,
+    order: Optional[Sequence[str]] = None,
+    is_valid: Callable[[str], bool] = bool
+) -> str:
+    """
+    Text of a chat completion from the best configured provider, failing over
+    to the other one when a call fails. Raises NoProviderAvailable.
+    """
+    attempts = {}
+    if OPENAI_CONFIGURED:
+        async def _openai() -> str:
+            extra = {"response_format": {"type": "json_object"}} if json_output else {}
+            response = await _create_completion(
+                model="gpt-4o-mini",
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                **extra
+            )
+            if response.usage:
+                llm_router.record_usage("openai", response.usage.prompt_tokens, response.usage.completion_tokens)
+            return response.choices[0].message.content
+        attempts["openai"] = _openai
+    if gemini_service.GEMINI_CONFIGURED:
+        attempts["gemini"] = lambda: gemini_service.complete(
+            _gemini_prompt(messages), max_output_tokens=max_tokens, temperature=temperature
+        )
+    _, text = await llm_router.call(attempts, order=order, is_valid=is_valid)
+    return text
 
 
 async def generate_explanation_openai(
@@ -29,9 +120,9 @@ async def generate_explanation_openai(
     topic: Optional[str] = None,
     is_correct: bool = False
 ) -> str:
-    """Generate a pedagogical explanation using OpenAI GPT."""
-    if not client:
-        return "Explicación no disponible. Configure la API de OpenAI."
+    """Generate a pedagogical explanation using OpenAI GPT (Gemini as fallback)."""
+    if not LLM_CONFIGURED:
+        return EXPLANATION_NOT_CONFIGURED
     
     system_prompt = """Eres un tutor educativo amigable y motivador para estudiantes que preparan exámenes de estado en Colombia.
 Tu rol es explicar conceptos de forma clara, usar un tono positivo y motivador, e incluir emojis de forma moderada.
@@ -50,27 +141,25 @@ Genera una explicación educativa breve (máximo 3 párrafos) que:
 3. {"Sugiera cómo aplicar este conocimiento" if is_correct else "Ofrezca consejos para recordar este concepto"}"""
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        return await _complete(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             max_tokens=500,
             temperature=0.7
         )
-        return response.choices[0].message.content
     except Exception as e:
         print(f"Error generating OpenAI explanation: {e}")
-        return "No se pudo generar la explicación en este momento."
+        return EXPLANATION_FAILED
 
 
 async def generate_study_recommendation_openai(
     weak_topics: list,
     recent_errors: list
 ) -> str:
-    """Generate personalized study recommendations using OpenAI GPT."""
-    if not client:
+    """Generate personalized study recommendations using OpenAI GPT (Gemini as fallback)."""
+    if not LLM_CONFIGURED:
         return "Configure la API de OpenAI para recomendaciones personalizadas."
     
     system_prompt = """Eres un asesor de estudio experto para exámenes de estado en Colombia.
@@ -90,29 +179,25 @@ Genera una recomendación de estudio personalizada que:
 Responde de forma concisa (máximo 4 puntos)."""
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        return await _complete(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             max_tokens=400,
             temperature=0.7
         )
-        return response.choices[0].message.content
     except Exception as e:
         print(f"Error generating OpenAI recommendation: {e}")
         return "No se pudieron generar recomendaciones en este momento."
 
 
-async def chat_with_tutor(
-    user_message: str,
-    context: Optional[str] = None
-) -> str:
-    """Have a conversation with the AI tutor about study topics."""
-    if not client:
-        return "Configure la API de OpenAI para usar el tutor."
-    
+TUTOR_NOT_CONFIGURED = "Configure la API de OpenAI para usar el tutor."
+TUTOR_FAILED = "Lo siento, hubo un error. ¿Puedes intentar de nuevo?"
+TUTOR_MAX_TOKENS = 600
+
+
+def _tutor_messages(user_message: str, context: Optional[str] = None) -> list:
     system_prompt = """Eres MeritBot, un tutor virtual amigable especializado en preparación para exámenes de estado colombianos (DIAN, CAR, Acueducto).
 
 Tus características:
@@ -131,18 +216,138 @@ Siempre responde en español colombiano."""
         messages.append({"role": "assistant", "content": "Entendido, tengo ese contexto en cuenta."})
     
     messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def _chunk_usage(chunk) -> Optional[Dict[str, int]]:
+    """Usage from the final stream chunk (a plain dict on SDKs without stream_options)"""
+    usage = getattr(chunk, "usage", None)
+    if usage is None or isinstance(usage, dict):
+        return usage
+    return usage.model_dump()
+
+
+async def chat_with_tutor(
+    user_message: str,
+    context: Optional[str] = None
+) -> str:
+    """Have a conversation with the AI tutor about study topics."""
+    if not LLM_CONFIGURED:
+        return TUTOR_NOT_CONFIGURED
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            max_tokens=600,
+        return await _complete(
+            _tutor_messages(user_message, context),
+            max_tokens=TUTOR_MAX_TOKENS,
             temperature=0.8
         )
-        return response.choices[0].message.content
     except Exception as e:
         print(f"Error in chat with tutor: {e}")
-        return "Lo siento, hubo un error. ¿Puedes intentar de nuevo?"
+        return TUTOR_FAILED
+
+
+async def stream_chat_with_tutor(
+    user_message: str,
+    context: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Stream the tutor's reply as text deltas.
+
+    Holds a completion slot for the life of the stream. Closing the generator
+    (e.g. the client disconnected) closes the upstream HTTP response, which
+    stops generation and billing for the remaining tokens.
+
+    When OpenAI is unavailable (not configured, or its circuit is open) or
+    fails before the first token, the reply comes from Gemini in one piece.
+    """
+    if not LLM_CONFIGURED:
+        yield TUTOR_NOT_CONFIGURED
+        return
+    if not OPENAI_CONFIGURED or not llm_router.acquire("openai"):
+        yield await chat_with_tutor(user_message, context)
+        return
+
+    started = time.perf_counter()
+    opened = False
+    outcome = "failed"
+    prompt_tokens = completion_tokens = 0
+    first_token = True
+    stream = None
+    client = get_openai_client()
+    chat_stream_metrics.record_start()
+    try:
+        async with _completion_slots:
+            # Only opening the stream is retried; once tokens flow a retry
+            # would repeat text the client already has.
+            stream = await with_retries(
+                lambda: client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=_tutor_messages(user_message, context),
+                    max_tokens=TUTOR_MAX_TOKENS,
+                    temperature=0.8,
+                    stream=True,
+                    extra_body={"stream_options": {"include_usage": True}}
+                ),
+                retry_on=_retryable_errors
+            )
+            opened = True
+            llm_router.record("openai", True, time.perf_counter() - started)
+            async for chunk in stream:
+                usage = _chunk_usage(chunk)
+                if usage:
+                    prompt_tokens = usage.get("prompt_tokens", 0)
+                    completion_tokens = usage.get("completion_tokens", 0)
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                if first_token:
+                    chat_stream_metrics.record_first_token(time.perf_counter() - started)
+                    first_token = False
+                # Roughly one token per delta; the final usage chunk, when the
+                # provider sends it, replaces this estimate
+                completion_tokens += 1
+                yield chunk.choices[0].delta.content
+        outcome = "completed"
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "cancelled"
+        if not opened:
+            llm_router.release("openai")
+        raise
+    except Exception as e:
+        print(f"Error in streaming chat with tutor: {e}")
+        if not opened:
+            llm_router.record("openai", False, time.perf_counter() - started, e)
+        if first_token and gemini_service.GEMINI_CONFIGURED:
+            # Nothing was streamed yet, so a failover cannot repeat text
+            try:
+                yield await _complete(
+                    _tutor_messages(user_message, context),
+                    max_tokens=TUTOR_MAX_TOKENS, temperature=0.8, order=["gemini"]
+                )
+            except Exception as fallback_error:
+                print(f"Error in tutor fallback: {fallback_error}")
+                yield TUTOR_FAILED
+        else:
+            yield TUTOR_FAILED
+    finally:
+        chat_stream_metrics.record_end(
+            outcome, time.perf_counter() - started, prompt_tokens, completion_tokens
+        )
+        if stream is not None:
+            # Shielded: a cancelled task would otherwise abort the close itself
+            await asyncio.shield(stream.close())
+
+
+def _parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """A JSON object from a completion (Gemini may wrap it in a code fence), or None"""
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
 
 
 async def generate_ai_question(
@@ -150,8 +355,8 @@ async def generate_ai_question(
     topic: Optional[str] = None,
     profile_name: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Generate a random exam question using OpenAI."""
-    if not client:
+    """Generate a random exam question using OpenAI (Gemini as fallback)."""
+    if not LLM_CONFIGURED:
         return {"error": "OpenAI API not configured"}
     
     system_prompt = """Eres un experto generador de preguntas para exámenes de estado en Colombia (DIAN, CAR, Acueducto, CNSC).
@@ -177,18 +382,17 @@ Asegúrate de que la pregunta sea técnica y específica del contexto colombiano
 NO inventes leyes inexistentes. Usa normativa real."""
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        content = await _complete(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            response_format={"type": "json_object"},
             max_tokens=600,
-            temperature=0.8
+            temperature=0.8,
+            json_output=True,
+            is_valid=lambda text: _parse_json_object(text) is not None
         )
-        content = response.choices[0].message.content
-        return json.loads(content)
+        return _parse_json_object(content)
     except Exception as e:
         print(f"Error generating AI question: {e}")
         return {
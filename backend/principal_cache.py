@@ -0,0 +1,102 @@
+"""
+MeritSim - Principal Cache
+LRU + TTL cache of authenticated user snapshots keyed by the JWT subject
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import User, UserRole
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+
+class Principal(NamedTuple):
+    """Immutable snapshot of the fields most endpoints need from the user"""
+    id: int
+    email: str
+    role: UserRole
+    is_active: bool
+    level: int
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl_seconds: int = PRINCIPAL_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._email_by_id = {}
+
+    def get(self, email: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if time.monotonic() >= expires_at:
+                self._drop(email)
+                return None
+            self._entries.move_to_end(email)
+            return principal
+
+    def put(self, principal: Principal):
+        with self._lock:
+            self._entries[principal.email] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(principal.email)
+            self._email_by_id[principal.id] = principal.email
+            while len(self._entries) > self.maxsize:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._email_by_id.pop(evicted.id, None)
+
+    def _drop(self, email: str):
+        entry = self._entries.pop(email, None)
+        if entry is not None:
+            self._email_by_id.pop(entry[1].id, None)
+
+    def invalidate_user(self, user_id: int):
+        """Forget a user (role or active status changed)"""
+        with self._lock:
+            email = self._email_by_id.get(user_id)
+            if email is not None:
+                self._drop(email)
+
+    def update_level(self, user_id: int, level: int):
+        """Write-through after an XP update so the answer path stays warm"""
+        with self._lock:
+            email = self._email_by_id.get(user_id)
+            entry = self._entries.get(email) if email is not None else None
+            if entry is not None:
+                expires_at, principal = entry
+                self._entries[email] = (expires_at, principal._replace(level=level))
+
+    def load(self, db: Session, email: str) -> Optional[Principal]:
+        """Cached principal for a token subject, loading it on a miss"""
+        principal = self.get(email)
+        if principal is not None:
+            return principal
+        row = db.query(
+            User.id, User.email, User.role, User.is_active, User.level
+        ).filter(User.email == email).first()
+        if row is None:
+            return None
+        principal = Principal(*row)
+        self.put(principal)
+        return principal
+
+
+principal_cache = PrincipalCache()
+
+
+def _on_user_change(mapper, connection, target):
+    principal_cache.invalidate_user(target.id)
+
+
+event.listen(User, "after_update", _on_user_change)
+event.listen(User, "after_delete", _on_user_change)
@@ -0,0 +1,272 @@
+"""
+MeritSim - Progress Service
+Dashboard statistics from one grouped aggregation, with an optional
+materialized per-user progress table kept up to date as answers arrive
+"""
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, cast, Date, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import (
+    Answer, Entity, Question, StudySession,
+    UserProgress, UserEntityProgress, UserMasteredQuestion, UserTopicProgress
+)
+
+# When enabled the dashboard reads user_progress / user_entity_progress
+# instead of aggregating the answer history. Rows are backfilled lazily on
+# the first dashboard load; delete a user's rows to force a rebuild.
+PROGRESS_MATERIALIZED = os.getenv("PROGRESS_MATERIALIZED", "false").lower() == "true"
+
+# pg_advisory_xact_lock(PROGRESS_LOCK_CLASS, user_id) serializes a user's
+# backfill with answers recorded while it runs
+PROGRESS_LOCK_CLASS = 3001
+
+# entity_id -> (answered, correct)
+EntityCounts = Dict[Optional[int], Tuple[int, int]]
+
+
+def _percentage(correct: int, total: int) -> float:
+    return (correct / total * 100) if total > 0 else 0
+
+
+def _streak_from_dates(days: List[date], today: date) -> int:
+    """Consecutive answering days ending today or yesterday"""
+    streak = 0
+    expected = today
+    for day in days:
+        if day == expected or (streak == 0 and day == today - timedelta(days=1)):
+            streak += 1
+            expected = day - timedelta(days=1)
+        elif day < expected:
+            break
+    return streak
+
+
+def _build_progress(
+    total_sessions: int,
+    counts: EntityCounts,
+    streak: int,
+    entities: List[Entity]
+) -> Dict:
+    total_answers = sum(total for total, _ in counts.values())
+    correct_answers = sum(correct for _, correct in counts.values())
+    entity_progress = []
+    for entity in entities:
+        total, correct = counts.get(entity.id, (0, 0))
+        entity_progress.append({
+            "entity_id": entity.id,
+            "entity_name": entity.name,
+            "color": entity.color,
+            "total_answers": total,
+            "correct_answers": correct,
+            "percentage": _percentage(correct, total)
+        })
+    return {
+        "total_sessions": total_sessions,
+        "total_questions_answered": total_answers,
+        "correct_percentage": round(_percentage(correct_answers, total_answers), 1),
+        "current_streak": streak,
+        "entity_progress": entity_progress
+    }
+
+
+def _aggregate(db: Session, user_id: int) -> Tuple[int, EntityCounts, List[date]]:
+    rows = db.query(
+        Question.entity_id,
+        func.count(Answer.id),
+        func.count(case((Answer.is_correct == True, 1)))
+    ).join(Question, Answer.question_id == Question.id).filter(
+        Answer.user_id == user_id
+    ).group_by(Question.entity_id).all()
+    counts = {entity_id: (total, correct) for entity_id, total, correct in rows}
+
+    total_sessions = db.query(func.count(StudySession.id)).filter(
+        StudySession.user_id == user_id
+    ).scalar()
+
+    answer_day = cast(Answer.answered_at, Date)
+    days = [d for (d,) in db.query(answer_day).filter(
+        Answer.user_id == user_id
+    ).distinct().order_by(answer_day.desc()).limit(400).all()]
+    return total_sessions, counts, days
+
+
+def aggregate_progress(db: Session, user_id: int) -> Dict:
+    """Compute progress from the answer history in a constant number of queries"""
+    total_sessions, counts, days = _aggregate(db, user_id)
+    streak = _streak_from_dates(days, datetime.utcnow().date())
+    return _build_progress(total_sessions, counts, streak, db.query(Entity).all())
+
+
+def _lock_progress(db: Session, user_id: int):
+    """Held until the transaction ends"""
+    db.execute(select(func.pg_advisory_xact_lock(PROGRESS_LOCK_CLASS, user_id)))
+
+
+def _update_materialized(db: Session, user_id: int, stmt) -> bool:
+    """
+    Run an UPDATE of the user's progress row; False if the user is not materialized.
+
+    A backfill in progress holds the lock and has not committed its row, so
+    the update sees nothing: wait for it and retry, or else keep the lock so
+    a backfill that starts now waits for this transaction and counts it.
+    """
+    if db.execute(stmt).rowcount:
+        return True
+    _lock_progress(db, user_id)
+    return bool(db.execute(stmt).rowcount)
+
+
+def _backfill(db: Session, user_id: int) -> Dict:
+    _lock_progress(db, user_id)
+    if db.get(UserProgress, user_id) is not None:
+        # Another request backfilled while this one waited for the lock
+        db.commit()
+        return get_progress(db, user_id)
+    total_sessions, counts, days = _aggregate(db, user_id)
+    streak = _streak_from_dates(days, datetime.utcnow().date())
+    db.execute(insert(UserProgress).values(
+        user_id=user_id,
+        total_sessions=total_sessions,
+        total_answers=sum(total for total, _ in counts.values()),
+        correct_answers=sum(correct for _, correct in counts.values()),
+        current_streak=streak,
+        last_answer_date=days[0] if days else None
+    ).on_conflict_do_nothing())
+    entity_rows = [
+        {"user_id": user_id, "entity_id": entity_id,
+         "total_answers": total, "correct_answers": correct}
+        for entity_id, (total, correct) in counts.items() if entity_id is not None
+    ]
+    if entity_rows:
+        db.execute(insert(UserEntityProgress).values(entity_rows).on_conflict_do_nothing())
+    db.commit()
+    return _build_progress(total_sessions, counts, streak, db.query(Entity).all())
+
+
+def get_progress(db: Session, user_id: int) -> Dict:
+    """Dashboard progress: materialized lookup when enabled, else one aggregation"""
+    if not PROGRESS_MATERIALIZED:
+        return aggregate_progress(db, user_id)
+
+    summary = db.get(UserProgress, user_id)
+    if summary is None:
+        return _backfill(db, user_id)
+
+    counts = {
+        row.entity_id: (row.total_answers, row.correct_answers)
+        for row in db.query(UserEntityProgress).filter(UserEntityProgress.user_id == user_id)
+    }
+    # correct/total live on the summary row too; answers on questions
+    # without an entity are only counted there.
+    counts[None] = (
+        summary.total_answers - sum(t for t, _ in counts.values()),
+        summary.correct_answers - sum(c for _, c in counts.values())
+    )
+    today = datetime.utcnow().date()
+    streak = summary.current_streak
+    if summary.last_answer_date is None or summary.last_answer_date < today - timedelta(days=1):
+        streak = 0
+    return _build_progress(summary.total_sessions, counts, streak, db.query(Entity).all())
+
+
+def record_session_started(db: Session, user_id: int):
+    """Count a new study session (no-op until the user's row is materialized)"""
+    if not PROGRESS_MATERIALIZED:
+        return
+    _update_materialized(
+        db, user_id,
+        update(UserProgress)
+        .where(UserProgress.user_id == user_id)
+        .values(total_sessions=UserProgress.total_sessions + 1)
+    )
+
+
+def record_answers(db: Session, user_id: int, counts: EntityCounts):
+    """
+    Apply answer deltas to the materialized progress in the caller's transaction.
+    counts maps entity_id to (answered, correct) for the answers just recorded.
+    """
+    if not PROGRESS_MATERIALIZED or not counts:
+        return
+    today = datetime.utcnow().date()
+    answered = sum(total for total, _ in counts.values())
+    correct = sum(c for _, c in counts.values())
+
+    materialized = _update_materialized(
+        db, user_id,
+        update(UserProgress)
+        .where(UserProgress.user_id == user_id)
+        .values(
+            total_answers=UserProgress.total_answers + answered,
+            correct_answers=UserProgress.correct_answers + correct,
+            current_streak=case(
+                (UserProgress.last_answer_date == today, UserProgress.current_streak),
+                (UserProgress.last_answer_date == today - timedelta(days=1),
+                 UserProgress.current_streak + 1),
+                else_=1
+            ),
+            last_answer_date=today,
+            updated_at=datetime.utcnow()
+        )
+    )
+    if not materialized:
+        # The first dashboard load backfills it, after this transaction commits
+        return
+
+    entity_rows = [
+        {"user_id": user_id, "entity_id": entity_id,
+         "total_answers": total, "correct_answers": c}
+        for entity_id, (total, c) in counts.items() if entity_id is not None
+    ]
+    if entity_rows:
+        stmt = insert(UserEntityProgress).values(entity_rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[UserEntityProgress.user_id, UserEntityProgress.entity_id],
+            set_={
+                "total_answers": UserEntityProgress.total_answers + stmt.excluded.total_answers,
+                "correct_answers": UserEntityProgress.correct_answers + stmt.excluded.correct_answers
+            }
+        ))
+
+
+# ============== Topic mastery (adventure map) ==============
+# Rows for answers recorded before these tables existed are built once by
+# migration 0012_backfill_topic_progress, so counting only new mastery here
+# never loses history.
+def record_mastery(db: Session, user_id: int, question_ids: List[int]):
+    """
+    Count newly mastered questions (first correct answer) per topic, in the
+    caller's transaction. Repeat correct answers to the same question are
+    absorbed by the user_mastered_questions primary key.
+    """
+    if not question_ids:
+        return
+    newly_mastered = insert(UserMasteredQuestion).from_select(
+        ["user_id", "question_id", "topic_id", "mastered_at"],
+        select(
+            literal(user_id), Question.id,
+            func.coalesce(Question.topic_id, 0), literal(datetime.utcnow())
+        ).where(Question.id.in_(set(question_ids)))
+    ).on_conflict_do_nothing().returning(UserMasteredQuestion.topic_id).cte("newly_mastered")
+    counts = select(
+        literal(user_id), newly_mastered.c.topic_id, func.count()
+    ).group_by(newly_mastered.c.topic_id)
+    stmt = insert(UserTopicProgress).from_select(["user_id", "topic_id", "correct_questions"], counts)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserTopicProgress.user_id, UserTopicProgress.topic_id],
+        set_={"correct_questions": UserTopicProgress.correct_questions + stmt.excluded.correct_questions}
+    )
+    db.execute(stmt.add_cte(newly_mastered))
+
+
+def get_topic_progress(db: Session, user_id: int) -> Dict[Optional[int], int]:
+    """Distinct correctly answered questions per topic_id (None = no topic)"""
+    rows = db.query(UserTopicProgress.topic_id, UserTopicProgress.correct_questions).filter(
+        UserTopicProgress.user_id == user_id
+    ).all()
+    return {(topic_id or None): count for topic_id, count in rows}
@@ -0,0 +1,255 @@
+"""
+MeritSim - Near-Duplicate Questions
+MinHash / LSH index over normalized question text and options
+
+Every question gets a MinHash signature of the character shingles of its
+normalized text plus its options (sorted, so a reshuffled answer order is
+still a match), stored in question_signatures, and one bucket key per LSH
+band in question_lsh_buckets. Questions whose shingles are similar enough
+share at least one bucket with high probability, so new questions are
+screened with a single indexed lookup instead of a scan of the bank; the
+candidates are then confirmed by comparing signatures.
+
+Run directly to index questions that have no signature yet and report
+duplicate clusters; add --apply to deactivate every question of a cluster
+but the oldest.
+"""
+import hashlib
+import os
+import random
+import re
+import struct
+import sys
+import unicodedata
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, Question, QuestionBucket, QuestionSignature
+
+# Estimated Jaccard similarity above which two questions are the same question
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", "0.7"))
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS  # candidates from ~(1/BANDS)^(1/ROWS) = 0.5 similarity up
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20261016)  # fixed: signatures must be comparable across runs
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_SIGNATURE_FORMAT = f"<{NUM_PERM}I"
+
+OPTION_FIELDS = ("option_a", "option_b", "option_c", "option_d")
+
+
+def question_content_hash(text: str) -> str:
+    """
+    Exact-text key of a question (ux_questions_content_hash), set by seeding
+    and generation alike; migration 0010 backfills the same sha256 in SQL
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase, accents and punctuation stripped, whitespace collapsed"""
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+
+def shingles(question: Dict) -> Set[str]:
+    options = sorted(normalize(question.get(field)) for field in OPTION_FIELDS)
+    document = " | ".join([normalize(question.get("text"))] + options)
+    if len(document) <= SHINGLE_SIZE:
+        return {document}
+    return {document[i:i + SHINGLE_SIZE] for i in range(len(document) - SHINGLE_SIZE + 1)}
+
+
+def signature(question: Dict) -> Tuple[int, ...]:
+    """MinHash of the question's shingles. Pure and top-level, so it can run in a process pool."""
+    hashes = [zlib.crc32(s.encode()) for s in shingles(question)]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) & 0xFFFFFFFF for a, b in _PERMUTATIONS)
+
+
+def bucket_keys(sig: Sequence[int]) -> List[int]:
+    """One signed 64-bit key per band (the band number is hashed in, so bands never collide)"""
+    keys = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f"<H{ROWS_PER_BAND}I", band, *rows), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """Estimated Jaccard similarity: the fraction of matching MinHash values"""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def pack(sig: Sequence[int]) -> bytes:
+    return struct.pack(_SIGNATURE_FORMAT, *sig)
+
+
+def unpack(data: bytes) -> Tuple[int, ...]:
+    return struct.unpack(_SIGNATURE_FORMAT, data)
+
+
+def screen(db: Session, questions: List[Dict]) -> List[Optional[Tuple[int, ...]]]:
+    """
+    Signatures for the questions to keep, None for near-duplicates.
+
+    A question is a duplicate of an active question in the bank or of an
+    earlier question in the same list. One query fetches every candidate.
+    """
+    signatures = [signature(q) for q in questions]
+    keys = [bucket_keys(sig) for sig in signatures]
+
+    candidates: Dict[int, List[int]] = {}
+    known: Dict[int, Tuple[int, ...]] = {}
+    wanted = {key for row_keys in keys for key in row_keys}
+    if wanted:
+        for key, question_id, data in db.execute(
+            select(QuestionBucket.bucket_key, QuestionBucket.question_id, QuestionSignature.signature)
+            .join(QuestionSignature, QuestionSignature.question_id == QuestionBucket.question_id)
+            .join(Question, Question.id == QuestionBucket.question_id)
+            .where(QuestionBucket.bucket_key.in_(wanted), Question.is_active == True)
+        ):
+            candidates.setdefault(key, []).append(question_id)
+            known[question_id] = unpack(data)
+
+    kept: List[Optional[Tuple[int, ...]]] = []
+    batch_buckets: Dict[int, List[Tuple[int, ...]]] = {}
+    for sig, row_keys in zip(signatures, keys):
+        seen = {qid for key in row_keys for qid in candidates.get(key, ())}
+        duplicate = any(similarity(sig, known[qid]) >= DUPLICATE_SIMILARITY for qid in seen) or any(
+            similarity(sig, other) >= DUPLICATE_SIMILARITY
+            for key in row_keys for other in batch_buckets.get(key, ())
+        )
+        if duplicate:
+            kept.append(None)
+            continue
+        kept.append(sig)
+        for key in row_keys:
+            batch_buckets.setdefault(key, []).append(sig)
+    return kept
+
+
+def store_signatures(db: Session, question_ids: Iterable[int], signatures: Iterable[Sequence[int]]):
+    """Index questions (in the caller's transaction) so later inserts are screened against them"""
+    signature_rows, bucket_rows = [], []
+    for question_id, sig in zip(question_ids, signatures):
+        signature_rows.append({"question_id": question_id, "signature": pack(sig)})
+        # A question's bands rarely collide with each other, but the PK would reject it
+        bucket_rows += [{"bucket_key": key, "question_id": question_id} for key in set(bucket_keys(sig))]
+    if signature_rows:
+        db.execute(insert(QuestionSignature), signature_rows)
+        db.execute(insert(QuestionBucket), bucket_rows)
+
+
+def _signature_of(row: Tuple) -> Tuple[int, ...]:
+    return signature(dict(zip(("text",) + OPTION_FIELDS, row)))
+
+
+def index_missing(db: Session, batch_size: int = 2000) -> int:
+    """Compute and store signatures for every question without one; returns how many"""
+    indexed = 0
+    last_id = 0
+    with ProcessPoolExecutor() as pool:
+        while True:
+            rows = db.execute(
+                select(Question.id, Question.text, *(getattr(Question, f) for f in OPTION_FIELDS))
+                .outerjoin(QuestionSignature, QuestionSignature.question_id == Question.id)
+                .where(QuestionSignature.question_id.is_(None), Question.id > last_id)
+                .order_by(Question.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return indexed
+            signatures = list(pool.map(_signature_of, [tuple(r[1:]) for r in rows], chunksize=64))
+            store_signatures(db, [r.id for r in rows], signatures)
+            db.commit()
+            indexed += len(rows)
+            last_id = rows[-1].id
+            print(f"  indexed {indexed} questions...")
+
+
+def find_clusters(db: Session) -> List[List[int]]:
+    """Groups of active questions that are near-duplicates of each other, each sorted by id"""
+    pairs: Set[Tuple[int, int]] = set()
+    members: Dict[int, List[int]] = {}
+    for key, question_id in db.execute(
+        select(QuestionBucket.bucket_key, QuestionBucket.question_id)
+        .join(Question, Question.id == QuestionBucket.question_id)
+        .where(Question.is_active == True)
+    ):
+        members.setdefault(key, []).append(question_id)
+    for ids in members.values():
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                pairs.add((min(a, b), max(a, b)))
+    if not pairs:
+        return []
+
+    involved = {qid for pair in pairs for qid in pair}
+    signatures = {
+        question_id: unpack(data)
+        for question_id, data in db.execute(
+            select(QuestionSignature.question_id, QuestionSignature.signature)
+            .where(QuestionSignature.question_id.in_(involved))
+        )
+    }
+
+    parent = {qid: qid for qid in involved}
+
+    def root(qid: int) -> int:
+        while parent[qid] != qid:
+            parent[qid] = parent[parent[qid]]
+            qid = parent[qid]
+        return qid
+
+    for a, b in pairs:
+        if similarity(signatures[a], signatures[b]) >= DUPLICATE_SIMILARITY:
+            parent[max(root(a), root(b))] = min(root(a), root(b))
+
+    clusters: Dict[int, List[int]] = {}
+    for qid in involved:
+        clusters.setdefault(root(qid), []).append(qid)
+    return sorted((sorted(ids) for ids in clusters.values() if len(ids) > 1), key=lambda ids: ids[0])
+
+
+def deactivate_duplicates(apply: bool = False) -> Dict:
+    """Index the bank, then keep the oldest question of each duplicate cluster"""
+    db = SessionLocal()
+    try:
+        print("🔎 Indexing questions without a signature...")
+        indexed = index_missing(db)
+        clusters = find_clusters(db)
+        duplicates = [qid for ids in clusters for qid in ids[1:]]
+        print(f"🧬 {len(clusters)} duplicate clusters, {len(duplicates)} questions to deactivate")
+        for ids in clusters[:10]:
+            texts = dict(db.execute(select(Question.id, Question.text).where(Question.id.in_(ids))).all())
+            print(f"  keep #{ids[0]}: {texts[ids[0]][:80]}")
+            for qid in ids[1:]:
+                print(f"    drop #{qid}: {texts[qid][:80]}")
+
+        if apply and duplicates:
+            for i in range(0, len(duplicates), 1000):
+                db.execute(
+                    update(Question).where(Question.id.in_(duplicates[i:i + 1000])).values(is_active=False)
+                )
+            db.commit()
+            print(f"✅ Deactivated {len(duplicates)} questions")
+        elif duplicates:
+            print("Dry run: pass --apply to deactivate them")
+        return {"indexed": indexed, "clusters": len(clusters), "deactivated": len(duplicates) if apply else 0}
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    result = deactivate_duplicates(apply="--apply" in sys.argv)
+    print(f"\nResult: {result}")
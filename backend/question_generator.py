@@ -1,21 +1,41 @@
+"""
+MeritSim - Multi-LLM Question Generator
+Pipelined PDF -> chunks -> LLM questions -> batched inserts
 
+Stages are connected by bounded queues so memory stays flat however large the
+material set is:
+
+    discover files -> extract (process pool) -> generate (per-provider workers) -> insert (batched)
+
+Runs are resumable: finished chunks are recorded in the generation ledger
+(see generation_ledger.py) and skipped when the script is run again.
+"""
 import os
+import sys
 import json
+import time
 import logging
 import asyncio
-from typing import List, Dict
-import google.generativeai as genai
-from openai import OpenAI
-from pypdf import PdfReader
-from sqlalchemy.orm import Session
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
+from sqlalchemy import insert
 
-# Import models
-from models import SessionLocal, Question, Material, Entity, Profile
-from main import get_db
-
+# Before the project imports, which read their settings at import time
 load_dotenv()
 
+# Import models
+from models import SessionLocal, Material, Entity, Profile, Topic
+import gemini_service
+from generation_ledger import ChunkResult, commit_chunks, file_hash, finish_jobs, is_completed, start_job
+from llm_limits import TokenBucket, with_retries
+from llm_router import NoProviderAvailable, llm_router
+from question_dedup import question_content_hash
+from text_chunker import CHARS_PER_TOKEN, chunk_spans
+from text_store import ExtractedText, extract_pages, load_pages, save_pages
+
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -24,14 +44,61 @@ logger = logging.getLogger(__name__)
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_KEY = os.getenv("GEMINI_API_KEY")
 
-openai_client = None
-if OPENAI_KEY:
-    openai_client = OpenAI(api_key=OPENAI_KEY)
-    logger.info("OpenAI Client Configured")
+# Pipeline tuning
+GENERATOR_EXTRACT_WORKERS = int(os.getenv("GENERATOR_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+GENERATOR_QUEUE_SIZE = int(os.getenv("GENERATOR_QUEUE_SIZE", "32"))
+GENERATOR_INSERT_BATCH = int(os.getenv("GENERATOR_INSERT_BATCH", "200"))
+GENERATOR_INSERT_FLUSH_SECONDS = float(os.getenv("GENERATOR_INSERT_FLUSH_SECONDS", "5"))
+GENERATOR_REPORT_SECONDS = float(os.getenv("GENERATOR_REPORT_SECONDS", "30"))
+# Opt-in cap on the pages of each PDF sent to the LLMs; 0 sends every page,
+# so every extracted character reaches a provider
+GENERATOR_MAX_PAGES = int(os.getenv("GENERATOR_MAX_PAGES", "0")) or None
+GENERATOR_CHUNK_OVERLAP_TOKENS = int(os.getenv("GENERATOR_CHUNK_OVERLAP_TOKENS", "100"))
+
+# Bump when the prompts or the chunking code change
+GENERATION_PROMPT_VERSION = "v2"
 
-if GEMINI_KEY:
-    genai.configure(api_key=GEMINI_KEY)
-    logger.info("Gemini Client Configured")
+# Per-provider limits: concurrent requests, requests per minute and the
+# tokens of material text per prompt. Chunks are cut for the smallest budget,
+# so any provider can take (or fail over) any chunk whole, and chunk numbers
+# stay the same whichever providers a rerun has.
+PROVIDER_LIMITS = {
+    "openai": {
+        "concurrency": int(os.getenv("GENERATOR_OPENAI_CONCURRENCY", "8")),
+        "rpm": float(os.getenv("GENERATOR_OPENAI_RPM", "120")),
+        "chunk_tokens": int(os.getenv("GENERATOR_OPENAI_CHUNK_TOKENS", "2000")),
+    },
+    "gemini": {
+        "concurrency": int(os.getenv("GENERATOR_GEMINI_CONCURRENCY", "4")),
+        "rpm": float(os.getenv("GENERATOR_GEMINI_RPM", "60")),
+        "chunk_tokens": int(os.getenv("GENERATOR_GEMINI_CHUNK_TOKENS", "2500")),
+    },
+}
+CHUNK_TOKENS = min(limits["chunk_tokens"] for limits in PROVIDER_LIMITS.values())
+
+# The ledger key: chunks are only skipped on a rerun if they were generated
+# with the same prompts and cut with the same settings, since chunk numbers
+# depend on every one of them
+GENERATION_VERSION = (
+    f"{GENERATION_PROMPT_VERSION}:{CHUNK_TOKENS}:{GENERATOR_CHUNK_OVERLAP_TOKENS}"
+    f":{CHARS_PER_TOKEN:g}:{GENERATOR_MAX_PAGES or 0}"
+)
+
+# Provider SDKs are imported when a provider handles its first chunk, so a
+# run with one provider (or with nothing left to generate) never loads the other
+_openai_client = None
+_openai_retryable_errors: Tuple[type, ...] = ()
+
+
+def get_openai_client():
+    global _openai_client, _openai_retryable_errors
+    if _openai_client is None:
+        from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+        _openai_client = AsyncOpenAI(api_key=OPENAI_KEY, max_retries=0)
+        _openai_retryable_errors = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+        logger.info("OpenAI Client Configured")
+    return _openai_client
 
 # Determine path based on environment
 if os.path.exists("/app/materials"):
@@ -39,43 +106,37 @@ if os.path.exists("/app/materials"):
 else:
     MATERIALS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MATERIAL DE ESTUDIO 2026")
 
-def extract_text_from_pdf(filepath: str, max_pages: int = 100) -> str:
-    """Extract text from PDF"""
-    try:
-        reader = PdfReader(filepath)
-        text = ""
-        for i, page in enumerate(reader.pages):
-            if i >= max_pages:
-                break
-            extracted = page.extract_text()
-            if extracted:
-                text += extracted + "\n"
-        return text
-    except Exception as e:
-        logger.error(f"Error reading PDF {filepath}: {e}")
-        return ""
-
-def chunk_text(text: str, chunk_size: int = 15000) -> List[str]:
-    """Split text into chunks avoiding mid-sentence breaks if possible"""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        if end >= len(text):
-            chunks.append(text[start:])
-            break
-        
-        # Try to find newline or space to break
-        breakpoint = text.rfind('\n', start, end)
-        if breakpoint == -1 or breakpoint < start + (chunk_size // 2):
-            breakpoint = text.rfind(' ', start, end)
-        
-        if breakpoint == -1:
-            breakpoint = end
-            
-        chunks.append(text[start:breakpoint])
-        start = breakpoint + 1
-    return chunks
+
+@dataclass
+class SourceFile:
+    filepath: str
+    relative_path: str
+    entity_id: int
+    profile_id: Optional[int]
+    entity_name: str
+    material_id: Optional[int]
+    topic_id: Optional[int] = None
+
+    @property
+    def topic(self) -> str:
+        return topic_name(self.filepath)
+
+
+def topic_name(filepath: str) -> str:
+    """Generated questions are filed under a topic named after their PDF"""
+    return os.path.splitext(os.path.basename(filepath))[0][:100]
+
+
+@dataclass
+class ChunkJob:
+    source: SourceFile
+    job_id: int
+    content_hash: str
+    index: int
+    total: int
+    text: str
+    page_reference: str
+
 
 def clean_json_string(s: str) -> str:
     """Clean markdown code blocks from JSON string"""
@@ -88,176 +149,444 @@ def clean_json_string(s: str) -> str:
         s = s[:-3]
     return s.strip()
 
-def generate_with_openai(chunk: str, entity_name: str, topic: str) -> List[Dict]:
-    if not openai_client: return []
-    try:
-        prompt = f"""
-        Generate 5 multiple-choice questions (Spanish) based on this text about '{topic}' for '{entity_name}'.
-        Focus on creating challenging, scenario-based questions suitable for a professional exam.
-        
-        Format: JSON Array
-        Items: {{ "question": str, "options": [str, str, str, str], "correct_answer": str, "explanation": str, "difficulty": int (1-3) }}
-        
-        Text: {chunk[:8000]}...
-        """
-        response = openai_client.chat.completions.create(
+async def generate_with_openai(chunk: str, entity_name: str, topic: str) -> List[Dict]:
+    """Raises on errors, so the router can fail the chunk over to another provider"""
+    client = get_openai_client()
+    prompt = f"""
+    Generate 5 multiple-choice questions (Spanish) based on this text about '{topic}' for '{entity_name}'.
+    Focus on creating challenging, scenario-based questions suitable for a professional exam.
+
+    Format: JSON Array
+    Items: {{ "question": str, "options": [str, str, str, str], "correct_answer": str, "explanation": str, "difficulty": int (1-3) }}
+
+    Text: {chunk}
+    """
+    response = await with_retries(
+        lambda: client.chat.completions.create(
             model="gpt-3.5-turbo-1106", # Faster/Cheaper for bulk
             messages=[
                 {"role": "system", "content": "You are an expert exam creator for Colombian public service exams. Output JSON only."},
                 {"role": "user", "content": prompt}
             ],
             response_format={"type": "json_object"}
-        )
-        data = json.loads(response.choices[0].message.content)
-        return data.get("questions", data) if isinstance(data, dict) else data
-    except Exception as e:
-        logger.error(f"OpenAI error: {e}")
-        return []
-
-def generate_with_gemini(chunk: str, entity_name: str, topic: str) -> List[Dict]:
-    if not GEMINI_KEY: return []
+        ),
+        retry_on=_openai_retryable_errors
+    )
+    if response.usage:
+        llm_router.record_usage("openai", response.usage.prompt_tokens, response.usage.completion_tokens)
+    data = json.loads(response.choices[0].message.content)
+    return data.get("questions", data) if isinstance(data, dict) else data
+
+async def generate_with_gemini(chunk: str, entity_name: str, topic: str) -> List[Dict]:
+    """Raises on errors, so the router can fail the chunk over to another provider"""
+    prompt = f"""
+    Act as an expert exam creator for {entity_name}.
+    Generate 5 multiple-choice questions in Spanish based on the following text.
+    Topic: {topic}
+
+    Requirements:
+    1. Questions must be relevant to the text.
+    2. Provide 4 options.
+    3. Indicate correct answer (must match one option exactly).
+    4. Detailed explanation.
+    5. Difficulty 1 (Basic) to 3 (Hard).
+
+    Output strictly valid JSON array.
+    Structure: [{{ "question": "...", "options": ["A","B","C","D"], "correct_answer": "A", "explanation": "...", "difficulty": 2 }}]
+
+    Text:
+    {chunk}
+    """
+    return json.loads(clean_json_string(await gemini_service.complete(prompt)))
+
+GENERATORS = {
+    "openai": generate_with_openai,
+    "gemini": generate_with_gemini,
+}
+
+
+def to_question_row(q: Dict, source: SourceFile, page_reference: Optional[str] = None) -> Optional[Dict]:
+    """Validate one generated question and map it onto the questions table"""
+    if not isinstance(q, dict) or not q.get("question") or not isinstance(q.get("options"), list) or len(q["options"]) != 4:
+        return None
+    options = [str(o) for o in q["options"]]
+    answer = str(q.get("correct_answer", "")).strip()
+    if answer.upper() in ("A", "B", "C", "D"):
+        letter = answer.upper()
+    elif answer in options:
+        # Providers often return the option text instead of the letter
+        letter = "ABCD"[options.index(answer)]
+    else:
+        return None
     try:
-        model = genai.GenerativeModel('gemini-pro')
-        prompt = f"""
-        Act as an expert exam creator for {entity_name}.
-        Generate 5 multiple-choice questions in Spanish based on the following text.
-        Topic: {topic}
-        
-        Requirements:
-        1. Questions must be relevant to the text.
-        2. Provide 4 options.
-        3. Indicate correct answer (must match one option exactly).
-        4. Detailed explanation.
-        5. Difficulty 1 (Basic) to 3 (Hard).
-        
-        Output strictly valid JSON array.
-        Structure: [{{ "question": "...", "options": ["A","B","C","D"], "correct_answer": "A", "explanation": "...", "difficulty": 2 }}]
-
-        Text:
-        {chunk[:10000]}
-        """
-        response = model.generate_content(prompt)
-        text_resp = clean_json_string(response.text)
-        return json.loads(text_resp)
-    except Exception as e:
-        logger.error(f"Gemini error: {e}")
-        return []
-
-def process_file(db: Session, filepath: str, entity_id: int, profile_id: int):
-    filename = os.path.basename(filepath)
-    topic = os.path.splitext(filename)[0]
-    
-    logger.info(f"Analyzing {filename}...")
-    text = extract_text_from_pdf(filepath)
-    if not text:
-        logger.warning(f"No text extracted from {filename}")
-        return
+        difficulty = int(q.get("difficulty", 2))
+    except (TypeError, ValueError):
+        difficulty = 2
+    return {
+        "entity_id": source.entity_id,
+        "profile_id": source.profile_id,
+        "topic_id": source.topic_id,
+        "material_id": source.material_id,
+        "content_hash": question_content_hash(q["question"]),
+        "text": q["question"],
+        "option_a": options[0][:500],
+        "option_b": options[1][:500],
+        "option_c": options[2][:500],
+        "option_d": options[3][:500],
+        "correct_answer": letter,
+        "explanation": q.get("explanation", ""),
+        "page_reference": page_reference,
+        "difficulty": min(max(difficulty, 1), 3),
+        "is_active": True,
+    }
 
-    chunks = chunk_text(text)
-    logger.info(f"Split {filename} into {len(chunks)} chunks.")
-    
-    # Get Entity Name
-    entity = db.query(Entity).get(entity_id)
-    entity_name = entity.name if entity else "General"
-    
-    total_saved = 0
-    
-    # Determine providers
-    providers = []
-    if openai_client: providers.append("openai")
-    if GEMINI_KEY: providers.append("gemini")
-    
-    if not providers:
-        logger.error("No AI providers configured (OPENAI_API_KEY or GEMINI_API_KEY needed).")
-        return
 
-    for i, chunk in enumerate(chunks):
-        provider = providers[i % len(providers)] # Alternate
-        logger.info(f"Processing chunk {i+1}/{len(chunks)} with {provider}...")
-        
-        questions = []
-        if provider == "openai":
-            questions = generate_with_openai(chunk, entity_name, topic)
-        else:
-            questions = generate_with_gemini(chunk, entity_name, topic)
-            
-        if not questions:
-            continue
-            
-        # Save questions
-        saved_chunk = 0
-        for q in questions:
+class StageStats:
+    """Item counts and busy time for one pipeline stage"""
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.workers = 0
+
+    def record(self, items: int, seconds: float):
+        self.items += items
+        self.busy_seconds += seconds
+
+    def line(self, elapsed: float) -> str:
+        rate = self.items / elapsed if elapsed else 0
+        utilization = self.busy_seconds / (elapsed * self.workers) if elapsed and self.workers else 0
+        return f"{self.name:<10} {self.items:>7} {self.unit:<10} {rate:>8.2f}/s  busy {utilization:>4.0%} of {self.workers} workers"
+
+
+class RateLimiter:
+    """Async wrapper over a token bucket: waits until a request may start"""
+
+    def __init__(self, per_minute: float, burst: int = 1):
+        self._bucket = TokenBucket(per_minute / 60.0, capacity=max(1, burst))
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            wait = self._bucket.take()
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self._bucket.take()
+
+
+class GenerationPipeline:
+    def __init__(self, providers: List[str]):
+        self.providers = providers
+        self.files: asyncio.Queue = asyncio.Queue(maxsize=GENERATOR_QUEUE_SIZE)
+        self.chunks: asyncio.Queue = asyncio.Queue(maxsize=GENERATOR_QUEUE_SIZE)
+        self.results: asyncio.Queue = asyncio.Queue(maxsize=GENERATOR_QUEUE_SIZE)
+        self.job_ids: List[int] = []
+        self.seen_hashes = set()
+        self.skipped_files = 0
+        self.stats = {
+            "extract": StageStats("extract", "files"),
+            "generate": StageStats("generate", "chunks"),
+            "insert": StageStats("insert", "questions"),
+        }
+        self.per_provider = {p: StageStats(p, "chunks") for p in providers}
+        self.limiters = {
+            p: RateLimiter(PROVIDER_LIMITS[p]["rpm"], burst=PROVIDER_LIMITS[p]["concurrency"])
+            for p in providers
+        }
+        # Failover calls land on another provider's budget, so every call takes a slot there
+        self.slots = {p: asyncio.Semaphore(max(1, PROVIDER_LIMITS[p]["concurrency"])) for p in providers}
+        self.started = time.perf_counter()
+
+    def report(self, final: bool = False):
+        elapsed = time.perf_counter() - self.started
+        logger.info(
+            f"{'Final' if final else 'Progress'} after {elapsed:.0f}s "
+            f"(queued: {self.files.qsize()} files, {self.chunks.qsize()} chunks, {self.results.qsize()} results; "
+            f"{self.skipped_files} files already generated)"
+        )
+        for stats in list(self.stats.values()) + list(self.per_provider.values()):
+            logger.info("  " + stats.line(elapsed))
+        for provider, health in llm_router.snapshot().items():
+            logger.info(
+                f"  {provider:<10} breaker {health['breaker']['state']}, {health['failures']}/{health['calls']} calls failed, "
+                f"p50 {health['latency_ms']['p50']} ms, ~${health['estimated_cost_usd']:.4f}"
+            )
+
+    async def _extract_worker(self, pool: ProcessPoolExecutor):
+        loop = asyncio.get_running_loop()
+        while True:
+            source = await self.files.get()
+            if source is None:
+                return
+            filename = os.path.basename(source.filepath)
+            started = time.perf_counter()
+            content_hash = await loop.run_in_executor(pool, file_hash, source.filepath)
+            if content_hash in self.seen_hashes or await asyncio.to_thread(
+                is_completed, content_hash, GENERATION_VERSION
+            ):
+                # Same bytes as another file in this run, or finished by an earlier run
+                logger.info(f"Skipping {filename} (already generated)")
+                self.skipped_files += 1
+                continue
+            self.seen_hashes.add(content_hash)
+            # Parse the PDF only if this version was never extracted before
+            pages = await asyncio.to_thread(load_pages, content_hash)
+            if pages is None:
+                pages = await loop.run_in_executor(pool, extract_pages, source.filepath)
+                await asyncio.to_thread(save_pages, content_hash, pages)
+            extracted = ExtractedText.from_pages(pages, max_pages=GENERATOR_MAX_PAGES)
+            chunks = chunk_spans(extracted.text, CHUNK_TOKENS, GENERATOR_CHUNK_OVERLAP_TOKENS)
+            self.stats["extract"].record(1, time.perf_counter() - started)
+            if not chunks:
+                logger.warning(f"No text extracted from {filename}")
+                continue
+
+            job_id, done = await asyncio.to_thread(
+                start_job, content_hash, GENERATION_VERSION,
+                source.relative_path, source.material_id, len(chunks)
+            )
+            self.job_ids.append(job_id)
+            pending = [i for i in range(len(chunks)) if i not in done]
+            logger.info(
+                f"Split {filename} into {len(chunks)} chunks"
+                + (f"; resuming job {job_id} with {len(pending)} left." if done else ".")
+            )
+            for i in pending:
+                start, end = chunks[i]
+                # Blocks while the generators are behind: this is the backpressure
+                await self.chunks.put(ChunkJob(
+                    source, job_id, content_hash, i, len(chunks),
+                    extracted.text[start:end], extracted.page_reference(start, end)
+                ))
+
+    async def _generate_worker(self, provider: str):
+        """
+        One of PROVIDER_LIMITS[provider]["concurrency"] workers. Workers pull
+        chunks as they finish, so faster providers take more of them; a chunk
+        whose call fails fails over to the other providers, and while this
+        provider's circuit is open its workers leave the queue to the others.
+        """
+        while True:
+            wait = llm_router.retry_in(provider)
+            if wait:
+                await asyncio.sleep(min(wait, 5))
+                continue
+            job = await self.chunks.get()
+            if job is None:
+                return
+            order = [provider] + [p for p in llm_router.rank(self.providers) if p != provider]
+            started = time.perf_counter()
             try:
-                # Validation
-                if not isinstance(q, dict) or "options" not in q or len(q["options"]) != 4:
-                    continue
-                    
-                new_q = Question(
-                    entity_id=entity_id,
-                    profile_id=profile_id,
-                    question_text=q["question"],
-                    option_a=q["options"][0],
-                    option_b=q["options"][1],
-                    option_c=q["options"][2],
-                    option_d=q["options"][3],
-                    correct_answer=q["correct_answer"],
-                    explanation_text=q.get("explanation", ""),
-                    difficulty=int(q.get("difficulty", 2)),
-                    topic=topic,
-                    is_active=True
+                provider_used, rows = await llm_router.call(
+                    {p: functools.partial(self._generate_rows, p, job) for p in self.providers},
+                    order=order
+                )
+            except NoProviderAvailable as e:
+                # Chunks stay out of the ledger and are retried on the next run
+                logger.warning(
+                    f"Chunk {job.index + 1}/{job.total} of {os.path.basename(job.source.filepath)} skipped: {e}"
                 )
-                db.add(new_q)
-                saved_chunk += 1
+                continue
+            elapsed = time.perf_counter() - started
+            self.stats["generate"].record(1, elapsed)
+            self.per_provider[provider_used].record(1, elapsed)
+            llm_router.record_valid(provider_used, len(rows))
+            logger.info(
+                f"{provider_used}: {len(rows)} questions from chunk {job.index + 1}/{job.total} "
+                f"of {os.path.basename(job.source.filepath)}"
+            )
+            await self.results.put(ChunkResult(job.job_id, job.content_hash, job.index, provider_used, rows))
+
+    async def _generate_rows(self, provider: str, job: ChunkJob) -> List[Dict]:
+        """
+        One provider call for a chunk, within that provider's concurrency and
+        rate limits. An empty list is a valid answer (a chunk with nothing to
+        ask about) and is recorded with 0 questions; output that is not a
+        list of questions raises, so the chunk fails over.
+        """
+        async with self.slots[provider]:
+            await self.limiters[provider].acquire()
+            try:
+                questions = await GENERATORS[provider](job.text, job.source.entity_name, job.source.topic)
             except Exception as e:
-                logger.error(f"Save error: {e}")
-        
-        db.commit()
-        total_saved += saved_chunk
-        logger.info(f"Saved {saved_chunk} questions from chunk {i+1}")
+                logger.error(f"{provider} error on chunk {job.index + 1}/{job.total}: {e}")
+                raise
+        if not isinstance(questions, list):
+            raise ValueError(f"{provider} returned {type(questions).__name__}, not a list of questions")
+        rows = [row for row in (to_question_row(q, job.source, job.page_reference) for q in questions) if row]
+        if questions and not rows:
+            raise ValueError(f"{provider} returned {len(questions)} questions, none well-formed")
+        return rows
+
+    async def _insert_worker(self):
+        batch: List[ChunkResult] = []
+        pending_rows = 0
+        done = False
+        while not done:
+            idle = False
+            try:
+                result = await asyncio.wait_for(self.results.get(), timeout=GENERATOR_INSERT_FLUSH_SECONDS)
+                if result is None:
+                    done = True
+                else:
+                    batch.append(result)
+                    pending_rows += len(result.rows)
+            except asyncio.TimeoutError:
+                idle = True
+            # Flush full batches, or whatever is pending once the generators go quiet
+            if batch and (done or idle or pending_rows >= GENERATOR_INSERT_BATCH):
+                started = time.perf_counter()
+                try:
+                    inserted = await asyncio.to_thread(commit_chunks, batch, GENERATION_VERSION)
+                except Exception as e:
+                    # Nothing was recorded, so these chunks are regenerated on the next run
+                    logger.error(f"Save error ({len(batch)} chunks, {pending_rows} questions dropped): {e}")
+                    inserted = 0
+                self.stats["insert"].record(inserted, time.perf_counter() - started)
+                batch = []
+                pending_rows = 0
 
-    logger.info(f"Finished {filename}: {total_saved} total questions.")
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(GENERATOR_REPORT_SECONDS)
+            self.report()
 
-def main():
-    logger.info("Starting Multi-LLM Question Generator...")
-    if not os.path.exists(MATERIALS_PATH):
-        logger.error(f"Materials path not found: {MATERIALS_PATH}")
-        return
+    async def run(self, sources: List[SourceFile]):
+        extract_workers = max(1, GENERATOR_EXTRACT_WORKERS)
+        self.stats["extract"].workers = extract_workers
+        self.stats["insert"].workers = 1
+        reporter = asyncio.create_task(self._reporter())
 
+        with ProcessPoolExecutor(max_workers=extract_workers) as pool:
+            extractors = [asyncio.create_task(self._extract_worker(pool)) for _ in range(extract_workers)]
+            generators = []
+            for provider in self.providers:
+                concurrency = max(1, PROVIDER_LIMITS[provider]["concurrency"])
+                self.per_provider[provider].workers = concurrency
+                generators += [
+                    asyncio.create_task(self._generate_worker(provider)) for _ in range(concurrency)
+                ]
+            self.stats["generate"].workers = len(generators)
+            inserter = asyncio.create_task(self._insert_worker())
+
+            # Each stage is shut down with one sentinel per worker once its producers finish
+            for source in sources:
+                await self.files.put(source)
+            for _ in extractors:
+                await self.files.put(None)
+            await asyncio.gather(*extractors)
+            for _ in generators:
+                await self.chunks.put(None)
+            await asyncio.gather(*generators)
+            await self.results.put(None)
+            await inserter
+
+        await asyncio.to_thread(finish_jobs, self.job_ids)
+        reporter.cancel()
+        self.report(final=True)
+
+
+def discover_sources(materials_path: str = MATERIALS_PATH, only: Optional[List[str]] = None) -> List[SourceFile]:
+    """
+    PDFs under an identified entity folder, with entity/profile/material resolved once per folder.
+    only restricts the scan to these paths relative to materials_path.
+    """
+    wanted = {os.path.normpath(p) for p in only} if only else None
     db = SessionLocal()
-    
-    # Recursive scan
-    for root, dirs, files in os.walk(MATERIALS_PATH):
-        rel_path = os.path.relpath(root, MATERIALS_PATH)
-        parts = rel_path.split(os.sep)
-        
-        entity_id = None
-        profile_id = None
-        
-        # Infer Entity/Profile logic same as indexer
-        if len(parts) >= 1 and parts[0] != ".":
-            ent_name = parts[0]
-            entity = db.query(Entity).filter(Entity.name.ilike(f"%{ent_name}%")).first()
-            if entity:
-                entity_id = entity.id
-                if len(parts) >= 2:
+    try:
+        material_ids = dict(db.query(Material.filepath, Material.id))
+        sources = []
+        for root, dirs, files in os.walk(materials_path):
+            rel_path = os.path.relpath(root, materials_path)
+            parts = rel_path.split(os.sep)
+
+            entity = None
+            profile_id = None
+
+            # Infer Entity/Profile logic same as indexer
+            if len(parts) >= 1 and parts[0] != ".":
+                ent_name = parts[0]
+                entity = db.query(Entity).filter(Entity.name.ilike(f"%{ent_name}%")).first()
+                if entity and len(parts) >= 2:
                     prof_name = parts[1]
                     profile = db.query(Profile).filter(Profile.entity_id == entity.id, Profile.name == prof_name).first()
                     if profile:
                         profile_id = profile.id
-        
-        for file in files:
-            if file.lower().endswith(".pdf"):
+
+            for file in files:
+                if not file.lower().endswith(".pdf"):
+                    continue
                 full_path = os.path.join(root, file)
-                # Only process if we identified at least an entity, or if user wants general ingestion
-                # For now let's be permissive? Or strict? 
-                # If entity_id is None, maybe skip or assign to General?
-                if entity_id:
-                    process_file(db, full_path, entity_id, profile_id)
-                else:
+                if wanted is not None and os.path.relpath(full_path, materials_path) not in wanted:
+                    continue
+                if not entity:
                     logger.warning(f"Skipping {file} (No entity identified in path)")
-    
-    db.close()
+                    continue
+                relative_path = os.path.relpath(full_path, materials_path)
+                sources.append(SourceFile(
+                    filepath=full_path,
+                    relative_path=relative_path,
+                    entity_id=entity.id,
+                    profile_id=profile_id,
+                    entity_name=entity.name,
+                    material_id=material_ids.get(relative_path)
+                ))
+        topic_ids = resolve_topics(db, {source.topic for source in sources})
+        for source in sources:
+            source.topic_id = topic_ids.get(source.topic)
+        return sources
+    finally:
+        db.close()
+
+
+def resolve_topics(db, names) -> Dict[str, int]:
+    """Topic id for every name, creating the topics that do not exist yet"""
+    if not names:
+        return {}
+    def lookup() -> Dict[str, int]:
+        return dict(db.query(Topic.name, Topic.id).filter(Topic.name.in_(names)))
+
+    topic_ids = lookup()
+    missing = [name for name in names if name not in topic_ids]
+    if missing:
+        db.execute(insert(Topic), [
+            {"name": name, "description": "Creado por el generador de preguntas"} for name in sorted(missing)
+        ])
+        db.commit()
+        topic_ids = lookup()
+    return topic_ids
+
+
+def main(only: Optional[List[str]] = None, materials_path: str = MATERIALS_PATH):
+    """Generate questions for every PDF under materials_path, or only for the given relative paths"""
+    logger.info("Starting Multi-LLM Question Generator...")
+    if not os.path.exists(materials_path):
+        logger.error(f"Materials path not found: {materials_path}")
+        return
+
+    # Determine providers
+    providers = []
+    if OPENAI_KEY: providers.append("openai")
+    if GEMINI_KEY: providers.append("gemini")
+
+    if not providers:
+        logger.error("No AI providers configured (OPENAI_API_KEY or GEMINI_API_KEY needed).")
+        return
+
+    sources = discover_sources(materials_path, only=only)
+    logger.info(f"Found {len(sources)} PDFs; providers: {', '.join(providers)}")
+    asyncio.run(GenerationPipeline(providers).run(sources))
     logger.info("Generation Complete.")
 
 if __name__ == "__main__":
-    main()
+    # Optional arguments: --root DIR (default MATERIALS_PATH), then material
+    # paths relative to it (see material_indexer)
+    args = sys.argv[1:]
+    root = MATERIALS_PATH
+    if args[:1] == ["--root"]:
+        if len(args) < 2:
+            sys.exit("usage: question_generator.py [--root DIR] [PATH ...]")
+        root, args = args[1], args[2:]
+    main(args or None, root)
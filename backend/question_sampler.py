@@ -0,0 +1,137 @@
+"""
+MeritSim - Question Sampler Service
+In-memory id pools for drawing random exam questions without ORDER BY random()
+"""
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, joinedload
+
+from models import Question
+
+POOL_TTL_SECONDS = int(os.getenv("QUESTION_POOL_TTL_SECONDS", "300"))
+
+# (entity_id, profile_id, topic_id, difficulty)
+PoolKey = Tuple[Optional[int], Optional[int], Optional[int], Optional[int]]
+
+
+class QuestionSampler:
+    """
+    Keeps the ids of every active question grouped by
+    (entity, profile, topic, difficulty).
+
+    Filters that leave some dimensions open are resolved once into a merged
+    id list and memoized, so each draw is a random.sample over a list: O(n)
+    in the number of questions requested, independent of the bank size.
+
+    Rebuilds query the database outside the lock and swap the new pools in
+    under it. One thread rebuilds at a time; the others keep drawing from
+    the current pools meanwhile (they wait only for the very first build).
+    """
+
+    def __init__(self, ttl_seconds: int = POOL_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._pools: Dict[PoolKey, List[int]] = {}
+        self._views: Dict[PoolKey, List[int]] = {}
+        self._max_id: Optional[int] = None
+        self._built_at = 0.0
+        self._dirty = True
+        # Bumped by invalidate(), so one arriving during a rebuild is not lost
+        self._generation = 0
+
+    def invalidate(self):
+        """Force a rebuild on the next draw (questions inserted or deactivated)"""
+        self._dirty = True
+        self._generation += 1
+
+    def _is_stale(self, db: Session) -> bool:
+        if self._dirty or time.monotonic() - self._built_at > self.ttl_seconds:
+            return True
+        # Primary key lookup: catches inserts made by other processes
+        # (seed_init, question_generator) without scanning the table.
+        return db.query(func.max(Question.id)).scalar() != self._max_id
+
+    def _refresh(self, db: Session):
+        if not self._is_stale(db):
+            return
+        first_build = not self._built_at
+        if not self._rebuild_lock.acquire(blocking=first_build):
+            return  # another thread is rebuilding; draw from the current pools
+        try:
+            if self._is_stale(db):
+                self._rebuild(db)
+        finally:
+            self._rebuild_lock.release()
+
+    def _rebuild(self, db: Session):
+        generation = self._generation
+        max_id = db.query(func.max(Question.id)).scalar()
+        rows = db.query(
+            Question.id, Question.entity_id, Question.profile_id,
+            Question.topic_id, Question.difficulty
+        ).filter(Question.is_active == True).all()
+
+        pools: Dict[PoolKey, List[int]] = {}
+        for qid, entity_id, profile_id, topic_id, difficulty in rows:
+            pools.setdefault((entity_id, profile_id, topic_id, difficulty), []).append(qid)
+
+        with self._lock:
+            self._pools = pools
+            self._views = {}
+            self._max_id = max_id
+            self._built_at = time.monotonic()
+            self._dirty = self._generation != generation
+
+    def _view(self, key: PoolKey) -> List[int]:
+        view = self._views.get(key)
+        if view is None:
+            view = []
+            for pool_key, ids in self._pools.items():
+                if all(want is None or want == have for want, have in zip(key, pool_key)):
+                    view.extend(ids)
+            self._views[key] = view
+        return view
+
+    def sample(
+        self,
+        db: Session,
+        n: int,
+        entity_id: Optional[int] = None,
+        profile_id: Optional[int] = None,
+        topic_id: Optional[int] = None,
+        difficulty: Optional[int] = None
+    ) -> List[int]:
+        """Draw up to n distinct active question ids matching the filters"""
+        self._refresh(db)
+        with self._lock:
+            pool = self._view((entity_id, profile_id, topic_id, difficulty))
+            return random.sample(pool, min(n, len(pool)))
+
+
+sampler = QuestionSampler()
+
+
+def _on_question_change(mapper, connection, target):
+    sampler.invalidate()
+
+
+event.listen(Question, "after_insert", _on_question_change)
+event.listen(Question, "after_update", _on_question_change)
+event.listen(Question, "after_delete", _on_question_change)
+
+
+def load_questions(db: Session, ids: List[int]) -> List[Question]:
+    """Load sampled questions by primary key, preserving the sampled order"""
+    if not ids:
+        return []
+    rows = db.query(Question).options(
+        joinedload(Question.entity), joinedload(Question.topic)
+    ).filter(Question.id.in_(ids), Question.is_active == True).all()
+    by_id = {q.id: q for q in rows}
+    return [by_id[qid] for qid in ids if qid in by_id]
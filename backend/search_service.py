@@ -0,0 +1,102 @@
+"""
+MeritSim - Search Service
+Ranked Spanish full-text search over the question bank and extracted PDF pages
+"""
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.orm import Session
+
+from models import SEARCH_CONFIG, Material, MaterialPage, Question
+
+# Matches are wrapped in <mark>...</mark>; clients must render snippets as text
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter= … "
+
+
+def _tsquery(q: str):
+    # websearch syntax: "exact phrase", -excluded, OR
+    return func.websearch_to_tsquery(SEARCH_CONFIG, q)
+
+
+def _headline(column, q: str):
+    return func.ts_headline(SEARCH_CONFIG, column, _tsquery(q), HEADLINE_OPTIONS)
+
+
+def search_questions(db: Session, q: str, entity_id: Optional[int] = None, limit: int = 20) -> List[Dict]:
+    """
+    Active questions ranked by ts_rank_cd. The GIN index finds the matches;
+    snippets are only built for the top `limit` rows since ts_headline re-parses text.
+    """
+    rank = func.ts_rank_cd(Question.search_vector, _tsquery(q))
+    top = select(
+        Question.id, Question.text, Question.entity_id, Question.topic_id,
+        Question.page_reference, rank.label("rank")
+    ).where(
+        Question.search_vector.op("@@")(_tsquery(q)),
+        Question.is_active == True
+    )
+    if entity_id:
+        top = top.where(Question.entity_id == entity_id)
+    top = top.order_by(rank.desc()).limit(limit).subquery()
+
+    rows = db.execute(
+        select(top, _headline(top.c.text, q).label("snippet")).order_by(top.c.rank.desc())
+    ).all()
+    return [
+        {
+            "id": row.id,
+            "snippet": row.snippet,
+            "entity_id": row.entity_id,
+            "topic_id": row.topic_id,
+            "page_reference": row.page_reference,
+            "rank": round(row.rank, 4)
+        }
+        for row in rows
+    ]
+
+
+def search_materials(db: Session, q: str, entity_id: Optional[int] = None, limit: int = 20) -> List[Dict]:
+    """
+    Pages of active materials ranked by ts_rank_cd, with highlighted snippets.
+    Materials with the same content share their pages, so each page is one
+    hit: material_id, title and entity_id are those of its first material,
+    and "materials" lists every active material (in the entity, if given)
+    the page belongs to.
+    """
+    material_filter = and_(Material.content_hash == MaterialPage.content_hash, Material.is_active == True)
+    if entity_id:
+        material_filter = and_(material_filter, Material.entity_id == entity_id)
+
+    rank = func.ts_rank_cd(MaterialPage.search_vector, _tsquery(q))
+    top = select(
+        MaterialPage.content_hash, MaterialPage.page_number, MaterialPage.text, rank.label("rank")
+    ).where(
+        MaterialPage.search_vector.op("@@")(_tsquery(q)),
+        exists().where(material_filter)
+    ).order_by(rank.desc()).limit(limit).subquery()
+
+    owner = and_(Material.content_hash == top.c.content_hash, Material.is_active == True)
+    if entity_id:
+        owner = and_(owner, Material.entity_id == entity_id)
+    rows = db.execute(
+        select(
+            top.c.content_hash, top.c.page_number, top.c.rank, Material.id, Material.title,
+            Material.filename, Material.entity_id, _headline(top.c.text, q).label("snippet")
+        ).join(Material, owner).order_by(top.c.rank.desc(), top.c.content_hash, top.c.page_number, Material.id)
+    ).all()
+
+    hits: Dict[Tuple[str, int], Dict] = {}
+    for row in rows:
+        material = {"material_id": row.id, "title": row.title or row.filename, "entity_id": row.entity_id}
+        hit = hits.get((row.content_hash, row.page_number))
+        if hit is None:
+            hits[(row.content_hash, row.page_number)] = {
+                **material,
+                "page": row.page_number,
+                "snippet": row.snippet,
+                "rank": round(row.rank, 4),
+                "materials": [material]
+            }
+        else:
+            hit["materials"].append(material)
+    return list(hits.values())
@@ -2,18 +2,24 @@
 MeritSim - Seed Initialization Script
 Creates initial database tables and admin users
 """
+import hashlib
+import json
 import os
 import sys
 from datetime import datetime
+from typing import Dict, List
 from passlib.context import CryptContext
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from models import (
-    Base, engine, SessionLocal, 
-    User, UserRole, Entity, Profile, Topic, Question
+    SessionLocal, 
+    User, UserRole, Entity, Profile, Topic, Question, SeedVersion
 )
+from question_dedup import question_content_hash, signature, store_signatures
 from study_content import ALL_QUESTIONS
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -23,9 +29,23 @@ def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def seed_admin_users(db):
-    """Create the 3 admin users"""
-    admin_users = [
+def run_migrations():
+    """Apply Alembic migrations (the baseline revision creates missing tables)"""
+    from alembic import command
+    from alembic.config import Config
+    
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    config = Config(os.path.join(base_dir, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(base_dir, "migrations"))
+    command.upgrade(config, "head")
+
+
+SEED_NAME = "initial"
+
+
+def admin_users() -> List[Dict]:
+    """The 3 admin users (credentials come from the environment)"""
+    return [
         {
             "email": os.getenv("ADMIN_EMAIL_1", "admin@admin.com"),
             "password": os.getenv("ADMIN_PASS_1", "admin_password"),
@@ -42,189 +62,184 @@ def seed_admin_users(db):
             "full_name": "VP Admin"
         }
     ]
+
+
+# Base entities (DIAN, CAR, Acueducto)
+ENTITIES = [
+    {
+        "name": "DIAN",
+        "description": "Dirección de Impuestos y Aduanas Nacionales - Competencias tributarias y aduaneras",
+        "icon": "account_balance",
+        "color": "#3B82F6"  # Blue
+    },
+    {
+        "name": "CAR",
+        "description": "Corporación Autónoma Regional - Competencias ambientales y recursos naturales",
+        "icon": "eco",
+        "color": "#10B981"  # Green
+    },
+    {
+        "name": "Acueducto",
+        "description": "Empresa de Acueducto y Alcantarillado - Servicios públicos",
+        "icon": "water_drop",
+        "color": "#06B6D4"  # Cyan
+    },
+    {
+        "name": "General",
+        "description": "Competencias básicas del estado y conocimientos generales",
+        "icon": "school",
+        "color": "#8B5CF6"  # Purple
+    }
+]
+
+# Job profiles for each entity
+PROFILES = [
+    # DIAN profiles
+    {"entity_name": "DIAN", "name": "Gestor I", "description": "Nivel asistencial DIAN"},
+    {"entity_name": "DIAN", "name": "Gestor II", "description": "Nivel técnico DIAN"},
+    {"entity_name": "DIAN", "name": "Profesional I", "description": "Nivel profesional junior"},
+    {"entity_name": "DIAN", "name": "Profesional II", "description": "Nivel profesional senior"},
+    # CAR profiles
+    {"entity_name": "CAR", "name": "Técnico Operativo", "description": "Nivel técnico operativo"},
+    {"entity_name": "CAR", "name": "Profesional Universitario", "description": "Nivel profesional"},
+    {"entity_name": "CAR", "name": "Profesional Especializado", "description": "Nivel especializado"},
+    # Acueducto profiles
+    {"entity_name": "Acueducto", "name": "Auxiliar Administrativo", "description": "Nivel auxiliar"},
+    {"entity_name": "Acueducto", "name": "Técnico", "description": "Nivel técnico"},
+    {"entity_name": "Acueducto", "name": "Profesional", "description": "Nivel profesional"},
+    # General profiles
+    {"entity_name": "General", "name": "Competencias Comportamentales", "description": "Aplica a todas las entidades"},
+]
+
+# Base topics for questions
+TOPICS = [
+    # Derecho
+    {"name": "Derecho Administrativo", "description": "Principios y procedimientos administrativos"},
+    {"name": "Constitución Política", "description": "Constitución de Colombia 1991"},
+    {"name": "Derecho Tributario", "description": "Impuestos y obligaciones fiscales"},
+    {"name": "Derecho Aduanero", "description": "Régimen de aduanas y comercio exterior"},
+    {"name": "Derecho Ambiental", "description": "Normativa ambiental colombiana"},
     
-    for user_data in admin_users:
-        existing = db.query(User).filter(User.email == user_data["email"]).first()
-        if not existing:
-            user = User(
-                email=user_data["email"],
-                hashed_password=hash_password(user_data["password"]),
-                full_name=user_data["full_name"],
-                role=UserRole.ADMIN,
-                is_active=True,
-                xp_points=0,
-                level=1
-            )
-            db.add(user)
-            print(f"✅ Created admin user: {user_data['email']}")
-        else:
-            print(f"ℹ️ Admin user already exists: {user_data['email']}")
+    # Specific
+    {"name": "IVA", "description": "Impuesto al Valor Agregado"},
+    {"name": "Servicios Públicos", "description": "Regulación de servicios públicos domiciliarios"},
     
-    db.commit()
+    # Soft skills
+    {"name": "Competencias Comportamentales", "description": "Habilidades blandas y actitudes"},
+    {"name": "Ética Pública", "description": "Código de ética del servidor público"},
+    {"name": "Gestión Documental", "description": "Manejo de documentos y archivo"},
+]
 
 
-def seed_entities(db):
-    """Create base entities (DIAN, CAR, Acueducto)"""
-    entities_data = [
-        {
-            "name": "DIAN",
-            "description": "Dirección de Impuestos y Aduanas Nacionales - Competencias tributarias y aduaneras",
-            "icon": "account_balance",
-            "color": "#3B82F6"  # Blue
-        },
-        {
-            "name": "CAR",
-            "description": "Corporación Autónoma Regional - Competencias ambientales y recursos naturales",
-            "icon": "eco",
-            "color": "#10B981"  # Green
-        },
-        {
-            "name": "Acueducto",
-            "description": "Empresa de Acueducto y Alcantarillado - Servicios públicos",
-            "icon": "water_drop",
-            "color": "#06B6D4"  # Cyan
-        },
+def seed_fingerprint() -> str:
+    """Hash of everything seeded below: editing any of it makes the next start seed again"""
+    payload = {
+        "admins": [user["email"] for user in admin_users()],
+        "entities": ENTITIES,
+        "profiles": PROFILES,
+        "topics": TOPICS,
+        "questions": ALL_QUESTIONS,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def seed_admin_users(db) -> int:
+    """Create missing admin users (only those are hashed: bcrypt is deliberately slow)"""
+    users = admin_users()
+    existing = set(db.execute(
+        select(User.email).where(User.email.in_([u["email"] for u in users]))
+    ).scalars())
+    missing = [
         {
-            "name": "General",
-            "description": "Competencias básicas del estado y conocimientos generales",
-            "icon": "school",
-            "color": "#8B5CF6"  # Purple
+            "email": u["email"],
+            "hashed_password": hash_password(u["password"]),
+            "full_name": u["full_name"],
+            "role": UserRole.ADMIN,
+            "is_active": True,
+            "xp_points": 0,
+            "level": 1
         }
+        for u in users if u["email"] not in existing
     ]
-    
-    for entity_data in entities_data:
-        existing = db.query(Entity).filter(Entity.name == entity_data["name"]).first()
-        if not existing:
-            entity = Entity(**entity_data)
-            db.add(entity)
-            print(f"✅ Created entity: {entity_data['name']}")
-        else:
-            print(f"ℹ️ Entity already exists: {entity_data['name']}")
-    
-    db.commit()
-
-
-def seed_profiles(db):
-    """Create job profiles for each entity"""
-    profiles_data = [
-        # DIAN profiles
-        {"entity_name": "DIAN", "name": "Gestor I", "description": "Nivel asistencial DIAN"},
-        {"entity_name": "DIAN", "name": "Gestor II", "description": "Nivel técnico DIAN"},
-        {"entity_name": "DIAN", "name": "Profesional I", "description": "Nivel profesional junior"},
-        {"entity_name": "DIAN", "name": "Profesional II", "description": "Nivel profesional senior"},
-        # CAR profiles
-        {"entity_name": "CAR", "name": "Técnico Operativo", "description": "Nivel técnico operativo"},
-        {"entity_name": "CAR", "name": "Profesional Universitario", "description": "Nivel profesional"},
-        {"entity_name": "CAR", "name": "Profesional Especializado", "description": "Nivel especializado"},
-        # Acueducto profiles
-        {"entity_name": "Acueducto", "name": "Auxiliar Administrativo", "description": "Nivel auxiliar"},
-        {"entity_name": "Acueducto", "name": "Técnico", "description": "Nivel técnico"},
-        {"entity_name": "Acueducto", "name": "Profesional", "description": "Nivel profesional"},
-        # General profiles
-        {"entity_name": "General", "name": "Competencias Comportamentales", "description": "Aplica a todas las entidades"},
-    ]
-    
-    for profile_data in profiles_data:
-        entity = db.query(Entity).filter(Entity.name == profile_data["entity_name"]).first()
-        if entity:
-            existing = db.query(Profile).filter(
-                Profile.entity_id == entity.id,
-                Profile.name == profile_data["name"]
-            ).first()
-            if not existing:
-                profile = Profile(
-                    entity_id=entity.id,
-                    name=profile_data["name"],
-                    description=profile_data["description"]
-                )
-                db.add(profile)
-                print(f"✅ Created profile: {profile_data['name']} ({profile_data['entity_name']})")
-    
-    db.commit()
-
-
-def seed_topics(db):
-    """Create base topics for questions"""
-    topics_data = [
-        # Derecho
-        {"name": "Derecho Administrativo", "description": "Principios y procedimientos administrativos"},
-        {"name": "Constitución Política", "description": "Constitución de Colombia 1991"},
-        {"name": "Derecho Tributario", "description": "Impuestos y obligaciones fiscales"},
-        {"name": "Derecho Aduanero", "description": "Régimen de aduanas y comercio exterior"},
-        {"name": "Derecho Ambiental", "description": "Normativa ambiental colombiana"},
-        
-        # Specific
-        {"name": "IVA", "description": "Impuesto al Valor Agregado"},
-        {"name": "Servicios Públicos", "description": "Regulación de servicios públicos domiciliarios"},
-        
-        # Soft skills
-        {"name": "Competencias Comportamentales", "description": "Habilidades blandas y actitudes"},
-        {"name": "Ética Pública", "description": "Código de ética del servidor público"},
-        {"name": "Gestión Documental", "description": "Manejo de documentos y archivo"},
+    if missing:
+        db.execute(pg_insert(User).values(missing).on_conflict_do_nothing(index_elements=["email"]))
+    return len(missing)
+
+
+def seed_entities(db) -> Dict[str, int]:
+    """Create missing entities; returns every entity id by name"""
+    db.execute(pg_insert(Entity).values(ENTITIES).on_conflict_do_nothing(index_elements=["name"]))
+    return dict(db.execute(select(Entity.name, Entity.id)).all())
+
+
+def seed_profiles(db, entity_ids: Dict[str, int]) -> int:
+    """Create missing profiles (unique by entity and name)"""
+    existing = set(db.execute(select(Profile.entity_id, Profile.name)).all())
+    missing = [
+        {"entity_id": entity_ids[p["entity_name"]], "name": p["name"], "description": p["description"]}
+        for p in PROFILES
+        if p["entity_name"] in entity_ids and (entity_ids[p["entity_name"]], p["name"]) not in existing
     ]
-    
-    for topic_data in topics_data:
-        existing = db.query(Topic).filter(Topic.name == topic_data["name"]).first()
-        if not existing:
-            topic = Topic(**topic_data)
-            db.add(topic)
-            print(f"✅ Created topic: {topic_data['name']}")
-    
-    db.commit()
+    if missing:
+        db.execute(insert(Profile), missing)
+    return len(missing)
 
 
-def seed_questions(db):
-    """Seed real questions from study_content.py"""
-    
-    # Load entities and topics cache
-    entities = {e.name: e for e in db.query(Entity).all()}
-    topics = {t.name: t for t in db.query(Topic).all()}
-    
-    count = 0
-    
+def seed_topics(db) -> Dict[str, int]:
+    """Create missing topics, including any a seed question names; returns every topic id by name"""
+    wanted = {t["name"]: t for t in TOPICS}
+    for questions in ALL_QUESTIONS.values():
+        for q in questions:
+            if q.get("topic") and q["topic"] not in wanted:
+                wanted[q["topic"]] = {"name": q["topic"], "description": "Created during seeding"}
+    existing = set(db.execute(select(Topic.name)).scalars())
+    missing = [topic for name, topic in wanted.items() if name not in existing]
+    if missing:
+        db.execute(insert(Topic), missing)
+    return dict(db.execute(select(Topic.name, Topic.id)).all())
+
+
+def seed_questions(db, entity_ids: Dict[str, int], topic_ids: Dict[str, int]) -> int:
+    """Insert real questions from study_content.py that are not in the bank yet, in one statement"""
+    rows = []
     for entity_name, questions in ALL_QUESTIONS.items():
-        entity = entities.get(entity_name)
-        if not entity:
+        entity_id = entity_ids.get(entity_name)
+        if not entity_id:
             print(f"⚠️ Entity not found: {entity_name}")
             continue
-            
-        print(f"📚 Seeding {len(questions)} questions for {entity_name}...")
-        
         for q in questions:
-            # Find topic
-            topic_name = q.get("topic")
-            topic = topics.get(topic_name)
-            
-            # Create topic if not exists (fallback)
-            if topic_name and not topic:
-                topic = Topic(name=topic_name, description="Created during seeding")
-                db.add(topic)
-                db.commit()
-                db.refresh(topic)
-                topics[topic_name] = topic
-                print(f"Permissions Created new topic: {topic_name}")
-            
-            existing = db.query(Question).filter(Question.text == q["text"]).first()
-            if not existing:
-                question = Question(
-                    entity_id=entity.id,
-                    topic_id=topic.id if topic else None,
-                    text=q["text"],
-                    option_a=q["option_a"],
-                    option_b=q["option_b"],
-                    option_c=q["option_c"],
-                    option_d=q["option_d"],
-                    correct_answer=q["correct_answer"],
-                    explanation=q["explanation"],
-                    difficulty=q["difficulty"],
-                    page_reference=q.get("page_reference"),
-                    xp_reward=q["difficulty"] * 10
-                )
-                db.add(question)
-                count += 1
-    
-    db.commit()
-    print(f"✅ added {count} new questions to the database!")
+            rows.append({
+                "entity_id": entity_id,
+                "topic_id": topic_ids.get(q.get("topic")),
+                "text": q["text"],
+                "option_a": q["option_a"],
+                "option_b": q["option_b"],
+                "option_c": q["option_c"],
+                "option_d": q["option_d"],
+                "correct_answer": q["correct_answer"],
+                "explanation": q["explanation"],
+                "difficulty": q["difficulty"],
+                "page_reference": q.get("page_reference"),
+                "xp_reward": q["difficulty"] * 10,
+                "content_hash": question_content_hash(q["text"])
+            })
+    # The same text twice in study_content would hit the conflict target twice in one statement
+    rows = list({row["content_hash"]: row for row in rows}.values())
+    if not rows:
+        return 0
+
+    inserted = db.execute(
+        pg_insert(Question).values(rows)
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+        .returning(Question.id, Question.content_hash)
+    ).all()
+    # Index the new questions so generated near-duplicates of them are screened out
+    by_hash = {row["content_hash"]: row for row in rows}
+    store_signatures(
+        db, [question_id for question_id, _ in inserted],
+        [signature(by_hash[content_hash]) for _, content_hash in inserted]
+    )
+    return len(inserted)
 
 
 def main():
@@ -232,29 +247,37 @@ def main():
     print("🚀 MeritSim - Database Initialization")
     print("=" * 60)
     
-    # Create tables
-    print("\n📦 Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    print("✅ Tables created successfully!")
+    # Create / upgrade tables and indexes
+    print("\n📦 Running database migrations...")
+    run_migrations()
+    print("✅ Database schema is up to date!")
     
-    # Create session
     db = SessionLocal()
     
     try:
-        print("\n👤 Seeding admin users...")
-        seed_admin_users(db)
-        
-        print("\n🏛️ Seeding entities...")
-        seed_entities(db)
-        
-        print("\n💼 Seeding profiles...")
-        seed_profiles(db)
+        # One query decides whether anything needs seeding
+        fingerprint = seed_fingerprint()
+        applied = db.execute(select(SeedVersion.version).where(SeedVersion.name == SEED_NAME)).scalar()
+        if applied == fingerprint:
+            print(f"\n✅ Seed data is up to date (version {fingerprint[:12]}), skipping")
+            return
         
-        print("\n📚 Seeding topics...")
-        seed_topics(db)
+        # Everything below is one transaction: a failed start leaves no partial seed
+        print("\n🌱 Seeding admin users, entities, profiles, topics and questions...")
+        print(f"👤 {seed_admin_users(db)} admin users created")
+        entity_ids = seed_entities(db)
+        print(f"🏛️ {len(entity_ids)} entities")
+        print(f"💼 {seed_profiles(db, entity_ids)} profiles created")
+        topic_ids = seed_topics(db)
+        print(f"📚 {len(topic_ids)} topics")
+        print(f"❓ {seed_questions(db, entity_ids, topic_ids)} new questions added")
         
-        print("\n❓ Seeding exams questions...")
-        seed_questions(db)
+        marker = pg_insert(SeedVersion).values(name=SEED_NAME, version=fingerprint, applied_at=datetime.utcnow())
+        db.execute(marker.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"version": marker.excluded.version, "applied_at": marker.excluded.applied_at}
+        ))
+        db.commit()
         
         print("\n" + "=" * 60)
         print("✅ Database initialization complete!")
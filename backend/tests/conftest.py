@@ -0,0 +1,9 @@
+"""
+Unit tests for the backend's pure logic; they need no database or LLM keys.
+
+    cd backend && python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
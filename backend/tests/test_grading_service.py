@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from grading_service import grade_answers
+
+
+def q(correct, entity_id=1, xp=10):
+    return SimpleNamespace(correct_answer=correct, entity_id=entity_id, xp_reward=xp,
+                           explanation="porque sí", page_reference="p. 3")
+
+
+def a(question_id, selected, seconds=None):
+    return SimpleNamespace(question_id=question_id, selected_option=selected, time_spent_seconds=seconds)
+
+
+QUESTIONS = {1: q("A"), 2: q("B", entity_id=2, xp=20), 3: q("c", entity_id=2)}
+
+
+def test_counts_correct_answers_and_xp():
+    graded = grade_answers([a(1, "a"), a(2, "C"), a(3, "C", 12)], QUESTIONS)
+    assert graded.correct_count == 2
+    assert graded.total_xp == 20
+    assert [(g.question_id, g.selected, g.is_correct) for g in graded.answers] == [
+        (1, "A", True), (2, "C", False), (3, "C", True)
+    ]
+    assert graded.answers[2].time_spent_seconds == 12
+
+
+def test_entity_counts():
+    graded = grade_answers([a(1, "A"), a(2, "C"), a(3, "C")], QUESTIONS)
+    assert graded.entity_counts == {1: (1, 1), 2: (2, 1)}
+
+
+def test_unknown_and_repeated_answers_are_ignored():
+    graded = grade_answers([a(1, "B"), a(1, "A"), a(99, "A")], QUESTIONS)
+    assert graded.correct_count == 0
+    assert len(graded.answers) == 1
+    assert graded.entity_counts == {1: (1, 0)}
+
+
+def test_results_carry_feedback():
+    result = grade_answers([a(2, "b")], QUESTIONS).results[0]
+    assert result == {"question_id": 2, "selected": "B", "correct_answer": "B", "is_correct": True,
+                      "explanation": "porque sí", "page_reference": "p. 3"}
+
+
+def test_no_answers():
+    graded = grade_answers([], QUESTIONS)
+    assert graded.correct_count == 0 and graded.total_xp == 0 and graded.results == []
@@ -0,0 +1,46 @@
+import pytest
+
+import llm_limits
+from llm_limits import TokenBucket, UserRateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(llm_limits.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_a_burst_then_reports_the_wait(clock):
+    bucket = TokenBucket(rate_per_second=0.5, capacity=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(2.0)
+
+
+def test_bucket_refills_at_its_rate_up_to_capacity(clock):
+    bucket = TokenBucket(rate_per_second=1.0, capacity=2)
+    bucket.take()
+    bucket.take()
+    clock[0] += 1.0
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(1.0)
+    clock[0] += 100.0
+    assert [bucket.take() for _ in range(3)][:2] == [0.0, 0.0]
+    assert bucket.tokens < 1
+
+
+def test_refused_take_does_not_consume(clock):
+    bucket = TokenBucket(rate_per_second=1.0, capacity=1)
+    bucket.take()
+    bucket.take()
+    clock[0] += 1.0
+    assert bucket.take() == 0.0
+
+
+def test_user_limiter_keeps_separate_buckets_and_drops_the_oldest(clock):
+    limiter = UserRateLimiter(per_minute=60, burst=1, max_users=2)
+    assert limiter.check(1) == 0.0
+    assert limiter.check(1) > 0
+    assert limiter.check(2) == 0.0
+    assert limiter.check(3) == 0.0  # evicts user 1
+    assert limiter.check(1) == 0.0
@@ -0,0 +1,88 @@
+import pytest
+
+import llm_router
+from llm_router import CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_router.time, "monotonic", clock)
+    monkeypatch.setattr(llm_router, "LLM_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(llm_router, "LLM_BREAKER_COOLDOWN_SECONDS", 30.0)
+    monkeypatch.setattr(llm_router, "LLM_BREAKER_MAX_COOLDOWN_SECONDS", 100.0)
+    return clock
+
+
+def trip(breaker):
+    for _ in range(3):
+        breaker.failure(0.0, 0)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker()
+    breaker.failure(0.0, 0)
+    breaker.failure(0.0, 0)
+    assert breaker.state == "closed" and breaker.acquire()
+    breaker.failure(0.0, 0)
+    assert breaker.state == "open"
+    assert not breaker.acquire()
+    assert breaker.retry_in() == 30.0
+
+
+def test_opens_on_window_error_rate(clock):
+    breaker = CircuitBreaker()
+    breaker.failure(llm_router.LLM_BREAKER_ERROR_RATE, llm_router.LLM_BREAKER_MIN_CALLS)
+    assert breaker.state == "open"
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker()
+    breaker.failure(0.0, 0)
+    breaker.failure(0.0, 0)
+    breaker.success()
+    breaker.failure(0.0, 0)
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_one_probe_and_closes_on_success(clock):
+    breaker = CircuitBreaker()
+    trip(breaker)
+    clock.now += 30
+    assert breaker.acquire()
+    assert breaker.state == "half_open"
+    assert not breaker.acquire(), "only one probe at a time"
+    breaker.success()
+    assert breaker.state == "closed"
+    assert breaker.cooldown == 30.0
+    assert breaker.acquire() and breaker.acquire()
+
+
+def test_failed_probe_doubles_cooldown_up_to_the_cap(clock):
+    breaker = CircuitBreaker()
+    trip(breaker)
+    for expected in (60.0, 100.0, 100.0):
+        clock.now += breaker.cooldown
+        assert breaker.acquire()
+        breaker.failure(0.0, 0)
+        assert breaker.state == "open"
+        assert breaker.cooldown == expected
+        assert not breaker.acquire()
+    assert breaker.trips == 4
+
+
+def test_released_probe_lets_another_through(clock):
+    breaker = CircuitBreaker()
+    trip(breaker)
+    clock.now += 30
+    assert breaker.acquire()
+    breaker.release()
+    assert breaker.acquire()
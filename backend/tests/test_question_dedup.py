@@ -0,0 +1,62 @@
+from question_dedup import NUM_PERM, bucket_keys, pack, screen, signature, similarity
+
+
+def question(text, options=("Uno", "Dos", "Tres", "Cuatro")):
+    return {"text": text, **dict(zip(("option_a", "option_b", "option_c", "option_d"), options))}
+
+
+BASE = question("¿Cuál es el término para responder un derecho de petición de información según la ley?",
+                ("Diez días", "Quince días", "Treinta días", "Cinco días"))
+
+
+class FakeDB:
+    """Answers screen()'s bucket lookup from an in-memory bank of {question_id: question}"""
+
+    def __init__(self, bank=None):
+        self.bank = {qid: signature(q) for qid, q in (bank or {}).items()}
+
+    def execute(self, statement):
+        return [(key, qid, pack(sig)) for qid, sig in self.bank.items() for key in bucket_keys(sig)]
+
+
+def test_signature_is_deterministic_and_ignores_option_order():
+    sig = signature(BASE)
+    assert len(sig) == NUM_PERM
+    assert sig == signature(dict(BASE))
+    shuffled = question(BASE["text"], ("Cinco días", "Treinta días", "Diez días", "Quince días"))
+    assert signature(shuffled) == sig
+
+
+def test_signature_ignores_case_accents_and_punctuation():
+    loud = question("CUAL ES EL TERMINO para responder un derecho de peticion de informacion segun la ley",
+                    ("diez dias", "quince dias", "treinta dias", "cinco dias"))
+    assert similarity(signature(loud), signature(BASE)) == 1.0
+
+
+def test_similarity_separates_rewordings_from_other_questions():
+    reworded = question(BASE["text"].replace("¿Cuál es", "¿Cuál sería"),
+                        ("Diez días", "Quince días", "Treinta días", "Cinco días"))
+    other = question("¿Qué entidad ejerce el control fiscal sobre los recursos públicos de la Nación?",
+                     ("Contraloría", "Procuraduría", "Fiscalía", "Defensoría"))
+    assert similarity(signature(reworded), signature(BASE)) >= 0.7
+    assert similarity(signature(other), signature(BASE)) < 0.3
+
+
+def test_screen_drops_duplicates_within_the_batch():
+    other = question("¿Qué entidad ejerce el control fiscal sobre los recursos públicos de la Nación?",
+                     ("Contraloría", "Procuraduría", "Fiscalía", "Defensoría"))
+    kept = screen(FakeDB(), [BASE, other, dict(BASE)])
+    assert kept[0] == signature(BASE)
+    assert kept[1] == signature(other)
+    assert kept[2] is None
+
+
+def test_screen_drops_duplicates_of_the_bank():
+    fresh = question("¿Cuántos magistrados integran la Corte Constitucional de Colombia?",
+                     ("Siete", "Nueve", "Once", "Trece"))
+    kept = screen(FakeDB({1: BASE}), [BASE, fresh])
+    assert kept == [None, signature(fresh)]
+
+
+def test_screen_empty_batch():
+    assert screen(FakeDB(), []) == []
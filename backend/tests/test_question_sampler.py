@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+
+import question_sampler
+from question_sampler import QuestionSampler
+
+# (id, entity_id, profile_id, topic_id, difficulty)
+BANK = [
+    (1, 1, 10, 100, 1), (2, 1, 10, 100, 2), (3, 1, 10, 101, 1), (4, 1, 11, 102, 3),
+    (5, 2, 20, 200, 1), (6, 2, 20, 200, 2), (7, 2, 21, 201, 2), (8, 1, 10, 100, 1),
+]
+
+
+class FakeQuery:
+    def __init__(self, db, columns):
+        self.db = db
+        self.columns = columns
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        self.db.rebuilds += 1
+        return list(self.db.rows)
+
+    def scalar(self):
+        return max((row[0] for row in self.db.rows), default=None)
+
+
+class FakeDB:
+    """Answers the sampler's two queries: max(id), and the active question rows"""
+
+    def __init__(self, rows=BANK):
+        self.rows = list(rows)
+        self.rebuilds = 0
+
+    def query(self, *columns):
+        return FakeQuery(self, columns)
+
+
+def ids_where(**filters):
+    fields = ("entity_id", "profile_id", "topic_id", "difficulty")
+    return {row[0] for row in BANK if all(row[1 + fields.index(k)] == v for k, v in filters.items())}
+
+
+@pytest.mark.parametrize("filters", [
+    {}, {"entity_id": 1}, {"profile_id": 10}, {"topic_id": 100}, {"difficulty": 1},
+    {"entity_id": 1, "profile_id": 10, "difficulty": 1}, {"entity_id": 2, "topic_id": 201},
+    {"profile_id": 99},
+])
+def test_filtered_views(filters):
+    sampler = QuestionSampler()
+    assert set(sampler.sample(FakeDB(), 100, **filters)) == ids_where(**filters)
+
+
+def test_draws_are_distinct_and_capped_at_n():
+    sampler = QuestionSampler()
+    db = FakeDB()
+    for _ in range(50):
+        drawn = sampler.sample(db, 3, entity_id=1)
+        assert len(drawn) == 3 == len(set(drawn))
+        assert set(drawn) <= ids_where(entity_id=1)
+    assert db.rebuilds == 1, "pools are reused between draws"
+
+
+def test_invalidate_rebuilds_the_pools():
+    sampler = QuestionSampler()
+    db = FakeDB()
+    sampler.sample(db, 100, topic_id=100)
+    db.rows = [row for row in db.rows if row[0] != 2]  # question 2 deactivated; max id unchanged
+    assert 2 in sampler.sample(db, 100, topic_id=100)
+    sampler.invalidate()
+    assert set(sampler.sample(db, 100, topic_id=100)) == {1, 8}
+    assert db.rebuilds == 2
+
+
+def test_new_max_id_rebuilds_the_pools():
+    sampler = QuestionSampler()
+    db = FakeDB()
+    sampler.sample(db, 100)
+    db.rows.append((9, 1, 10, 100, 1))
+    assert 9 in sampler.sample(db, 100, topic_id=100)
+
+
+def test_ttl_rebuilds_the_pools(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(question_sampler.time, "monotonic", lambda: now[0])
+    sampler = QuestionSampler(ttl_seconds=60)
+    db = FakeDB()
+    sampler.sample(db, 1)
+    now[0] += 59
+    sampler.sample(db, 1)
+    assert db.rebuilds == 1
+    now[0] += 2
+    sampler.sample(db, 1)
+    assert db.rebuilds == 2
+
+
+def test_draws_are_served_from_current_pools_during_a_rebuild():
+    sampler = QuestionSampler()
+    sampler.sample(FakeDB(), 1)
+    loading = threading.Event()
+    release = threading.Event()
+
+    class SlowDB(FakeDB):
+        def query(self, *columns):
+            query = super().query(*columns)
+            if len(columns) > 1:
+                loading.set()
+                release.wait(5)
+            return query
+
+    sampler.invalidate()
+    rebuilder = threading.Thread(target=sampler.sample, args=(SlowDB(), 1))
+    rebuilder.start()
+    assert loading.wait(5)
+    # The rebuild is blocked in its query; this draw must not wait for it
+    assert set(sampler.sample(FakeDB(), 100)) == ids_where()
+    release.set()
+    rebuilder.join(5)
+    assert not rebuilder.is_alive()
+
+
+def test_invalidate_during_a_rebuild_is_not_lost():
+    sampler = QuestionSampler()
+
+    class InvalidatingDB(FakeDB):
+        def query(self, *columns):
+            if len(columns) > 1:
+                sampler.invalidate()
+            return super().query(*columns)
+
+    sampler.sample(InvalidatingDB(), 1)
+    db = FakeDB()
+    sampler.sample(db, 1)
+    assert db.rebuilds == 1
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from text_chunker import LegalChunker, chunk_spans, coverage, estimate_tokens, tokens_to_chars
+
+
+def legal_text(articles: int = 60, seed: int = 3) -> str:
+    rng = random.Random(seed)
+    words = "el servidor público deberá cumplir la ley conforme al reglamento vigente".split()
+    lines = ["TÍTULO I", "DISPOSICIONES GENERALES", ""]
+    for n in range(1, articles + 1):
+        if n % 10 == 1:
+            lines += ["", f"CAPÍTULO {n // 10 + 1}"]
+        lines.append(f"ARTÍCULO {n}. " + " ".join(rng.choice(words) for _ in range(rng.randint(20, 60))) + ".")
+        for numeral in range(1, rng.randint(1, 4)):
+            lines.append(f"{numeral}. " + " ".join(rng.choice(words) for _ in range(15)) + ".")
+    return "\n".join(lines)
+
+
+def assert_covers(text, spans, max_tokens):
+    assert spans[0][0] == 0
+    assert spans[-1][1] == len(text)
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        assert next_start <= end, "gap between chunks"
+        assert next_start > start, "chunking made no progress"
+    for start, end in spans:
+        assert end - start <= tokens_to_chars(max_tokens)
+    assert coverage(len(text), spans) == 1.0
+
+
+@pytest.mark.parametrize("max_tokens,overlap", [(50, 0), (50, 10), (200, 40), (1000, 100)])
+def test_spans_cover_legal_text(max_tokens, overlap):
+    text = legal_text()
+    assert_covers(text, chunk_spans(text, max_tokens, overlap), max_tokens)
+
+
+@pytest.mark.parametrize("text", ["x" * 5000, " " * 3000, "a\n" * 2000, "palabra " * 700])
+def test_spans_cover_text_without_useful_boundaries(text):
+    assert_covers(text, chunk_spans(text, 40, 20), 40)
+
+
+def test_short_and_empty_text():
+    assert chunk_spans("", 100) == []
+    assert chunk_spans("Artículo 1. Corto.", 100) == [(0, 18)]
+
+
+def test_chunks_prefer_article_boundaries():
+    text = legal_text()
+    chunker = LegalChunker(text)
+    for start, end, kind in chunker.chunks(300, 30)[:-1]:
+        if kind in ("heading", "article"):
+            assert text[end:end + 40].lstrip().upper().startswith(("ARTÍCULO", "CAPÍTULO", "TÍTULO"))
+
+
+def test_overlap_repeats_text_before_the_chunk():
+    text = legal_text()
+    spans = chunk_spans(text, 200, 50)
+    assert any(next_start < end for (_, end), (next_start, _) in zip(spans, spans[1:]))
+
+
+def test_coverage_counts_truncated_prompts():
+    assert coverage(100, [(0, 50), (50, 100)], sent_chars=25) == 0.5
+    assert coverage(0, []) == 1.0
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abc") == 1
@@ -0,0 +1,133 @@
+"""
+MeritSim - Legal Text Chunker
+Token-budgeted chunks that break on the structure of legal documents
+
+Chunks are sized in tokens for the provider that will read them, so each
+one is sent whole: nothing extracted is cut off before it reaches the LLM.
+Each chunk ends at the strongest boundary that fits in its budget, in this
+order: a heading (Libro, Título, Capítulo, Sección), an article (Artículo
+N), a numeral, literal or parágrafo, a blank line, a line, a sentence, and
+last a word. Consecutive chunks overlap by up to overlap_tokens, starting
+the next chunk at a boundary inside that window, so a question can use the
+context just before its chunk.
+
+The spans always cover the whole text: the next chunk never starts after
+the previous one ends.
+"""
+import os
+import re
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+# Spanish legal text averages about four characters per token on the
+# OpenAI and Gemini tokenizers
+CHARS_PER_TOKEN = float(os.getenv("CHUNK_CHARS_PER_TOKEN", "4"))
+
+# A chunk ends at a boundary only if that leaves it at least this full
+MIN_FILL = 0.5
+
+_HEADING = re.compile(
+    r"^[ \t]*(?:libro|t[íi]tulo|cap[íi]tulo|secci[óo]n)\s+(?:[IVXLCDM]+\b|\d+|[úu]nico|preliminar|primer|segund|tercer|cuart|quint)",
+    re.IGNORECASE | re.MULTILINE
+)
+_ARTICLE = re.compile(r"^[ \t]*(?:art[íi]culo|art\.)\s*\d+", re.IGNORECASE | re.MULTILINE)
+_NUMERAL = re.compile(
+    r"^[ \t]*(?:(?i:par[áa]grafo)\b|\d{1,3}[.)º°]\s|[a-z]\)\s|[a-z]\.\s|[IVXLC]+[.)]\s)",
+    re.MULTILINE
+)
+_BLANK_LINE = re.compile(r"\n[ \t]*\n")
+_LINE = re.compile(r"\n")
+_SENTENCE = re.compile(r"[.;:!?][\"'”»)]*\s+")
+_WORD = re.compile(r"\s+")
+
+# Strongest first; line-start patterns break before the match, separators after it
+BOUNDARIES = (
+    ("heading", _HEADING, "start"),
+    ("article", _ARTICLE, "start"),
+    ("numeral", _NUMERAL, "start"),
+    ("paragraph", _BLANK_LINE, "end"),
+    ("line", _LINE, "end"),
+    ("sentence", _SENTENCE, "end"),
+    ("word", _WORD, "end"),
+)
+
+
+def tokens_to_chars(tokens: int) -> int:
+    return max(1, int(tokens * CHARS_PER_TOKEN))
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, round(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+
+class LegalChunker:
+    """Boundary offsets of one text, computed once and reused for every chunk"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self._offsets: List[Tuple[str, List[int]]] = []
+        for name, pattern, side in BOUNDARIES:
+            offsets = sorted({m.start() if side == "start" else m.end() for m in pattern.finditer(text)})
+            self._offsets.append((name, [o for o in offsets if 0 < o < len(text)]))
+
+    def best_break(self, low: int, high: int, earliest: bool = False) -> Optional[Tuple[str, int]]:
+        """(kind, offset) of the last (or first) boundary in (low, high] of the strongest kind that has one"""
+        for name, offsets in self._offsets:
+            if earliest:
+                i = bisect_right(offsets, low)
+                if i < len(offsets) and offsets[i] <= high:
+                    return name, offsets[i]
+            else:
+                i = bisect_right(offsets, high)
+                if i and offsets[i - 1] > low:
+                    return name, offsets[i - 1]
+        return None
+
+    def spans(self, max_tokens: int, overlap_tokens: int = 0) -> List[Tuple[int, int]]:
+        return [(start, end) for start, end, _ in self.chunks(max_tokens, overlap_tokens)]
+
+    def chunks(self, max_tokens: int, overlap_tokens: int = 0) -> List[Tuple[int, int, str]]:
+        """(start, end, kind of boundary the chunk ends on) for every chunk, in order"""
+        max_chars = tokens_to_chars(max_tokens)
+        overlap_chars = min(tokens_to_chars(overlap_tokens) if overlap_tokens else 0, max_chars // 2)
+        length = len(self.text)
+        chunks = []
+        start = 0
+        while start < length:
+            if start + max_chars >= length:
+                chunks.append((start, length, "end"))
+                break
+            found = self.best_break(start + int(max_chars * MIN_FILL), start + max_chars)
+            kind, end = found if found else ("hard", start + max_chars)
+            chunks.append((start, end, kind))
+
+            next_start = end
+            if overlap_chars:
+                # Back up into the chunk, but only to a boundary, so the overlap starts cleanly
+                back = self.best_break(max(start, end - overlap_chars - 1), end - 1, earliest=True)
+                if back:
+                    next_start = back[1]
+            start = next_start
+        return chunks
+
+
+def chunk_spans(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[Tuple[int, int]]:
+    """(start, end) offsets of chunks of at most max_tokens that together cover the whole text"""
+    return LegalChunker(text).spans(max_tokens, overlap_tokens)
+
+
+def coverage(length: int, spans: List[Tuple[int, int]], sent_chars: Optional[int] = None) -> float:
+    """
+    Fraction of the text's characters that reach an LLM, given the spans and
+    how many characters of each span are actually sent (None: all of them)
+    """
+    if not length:
+        return 1.0
+    covered = 0
+    reached = 0  # end of the covered prefix so far; spans are in order
+    for start, end in spans:
+        end = min(end, start + sent_chars) if sent_chars is not None else end
+        if end > reached:
+            covered += end - max(start, reached)
+            reached = end
+    return covered / length
@@ -0,0 +1,96 @@
+"""
+MeritSim - Extracted Text Store
+Per-page PDF text, extracted once per file version and kept in material_pages
+
+Pages are keyed by the sha256 of the PDF bytes (see generation_ledger.file_hash),
+so a file is parsed again only when its content changes. Postgres compresses
+the text column (TOAST), so the store costs roughly the size of the text.
+"""
+import logging
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import SessionLocal, Material, MaterialPage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExtractedText:
+    """Joined text of a PDF and the offset at which each page starts"""
+    text: str
+    page_starts: List[int]  # page_starts[i] is where page i + 1 begins
+
+    @classmethod
+    def from_pages(cls, pages: List[str], max_pages: Optional[int] = None) -> "ExtractedText":
+        """Each non-empty page followed by a newline, the layout the generator has always chunked"""
+        parts = []
+        starts = []
+        offset = 0
+        for page in pages[:max_pages]:
+            starts.append(offset)
+            if page:
+                parts.append(page + "\n")
+                offset += len(page) + 1
+        return cls("".join(parts), starts)
+
+    def page_at(self, offset: int) -> int:
+        """1-based page number containing a character offset"""
+        return max(1, bisect_right(self.page_starts, offset))
+
+    def page_reference(self, start: int, end: int) -> str:
+        """Human-readable page span for text[start:end], e.g. "Páginas 12-14" """
+        first = self.page_at(start)
+        last = self.page_at(max(start, end - 1))
+        return f"Página {first}" if first == last else f"Páginas {first}-{last}"
+
+
+def extract_pages(filepath: str) -> List[str]:
+    """
+    Text of every page, in order ("" for pages without text).
+    Runs in worker processes, so it touches neither the database nor globals.
+    """
+    from pypdf import PdfReader
+
+    try:
+        reader = PdfReader(filepath)
+        return [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        logger.error(f"Error reading PDF {filepath}: {e}")
+        return []
+
+
+def load_pages(content_hash: str) -> Optional[List[str]]:
+    """Stored pages for a file version, or None if it was never extracted"""
+    db = SessionLocal()
+    try:
+        pages = db.execute(
+            select(MaterialPage.text)
+            .where(MaterialPage.content_hash == content_hash)
+            .order_by(MaterialPage.page_number)
+        ).scalars().all()
+        return list(pages) if pages else None
+    finally:
+        db.close()
+
+
+def save_pages(content_hash: str, pages: List[str]):
+    """Store a file version's pages and record the page count on its materials"""
+    if not pages:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(pg_insert(MaterialPage).values([
+            {"content_hash": content_hash, "page_number": i + 1, "text": text}
+            for i, text in enumerate(pages)
+        ]).on_conflict_do_nothing())
+        db.execute(
+            update(Material).where(Material.content_hash == content_hash).values(page_count=len(pages))
+        )
+        db.commit()
+    finally:
+        db.close()
@@ -1,22 +1,67 @@
+import React, { useCallback, useEffect, useState } from 'react'
+import { adminService } from '../services/api'
 
-import React, { useState } from 'react'
-import api from '../services/api'
+const ACTIVE = ['queued', 'running']
+
+const STATUS_LABELS = {
+    queued: 'En cola',
+    running: 'En progreso',
+    succeeded: 'Completado',
+    failed: 'Error',
+    cancelled: 'Cancelado'
+}
 
 export default function Admin() {
     const [loading, setLoading] = useState(false)
+    const [jobs, setJobs] = useState([])
+
+    const loadJobs = useCallback(async () => {
+        try {
+            const response = await adminService.getJobs({ kind: 'ingest', limit: 5 })
+            setJobs(response.data.jobs)
+        } catch (error) {
+            console.error(error)
+        }
+    }, [])
+
+    const hasActiveJob = jobs.some((job) => ACTIVE.includes(job.status))
+
+    useEffect(() => {
+        loadJobs()
+    }, [loadJobs])
+
+    // Poll only while a job is queued or running
+    useEffect(() => {
+        if (!hasActiveJob) return
+        const timer = setInterval(loadJobs, 3000)
+        return () => clearInterval(timer)
+    }, [hasActiveJob, loadJobs])
 
     const handleIngest = async () => {
         if (!confirm('¿Estás seguro de iniciar la ingestión de materiales? Esto puede tomar varios minutos.')) return
 
         setLoading(true)
         try {
-            await api.post('/admin/ingest-materials')
-            alert('✅ Ingestión iniciada correctamente en segundo plano. Los materiales aparecerán pronto.')
+            await adminService.ingestMaterials()
         } catch (error) {
-            console.error(error)
-            alert('❌ Error al iniciar ingestión: ' + error.message)
+            if (error.response?.status === 409) {
+                alert('ℹ️ Ya hay una ingestión en curso. Puedes seguir su progreso abajo.')
+            } else {
+                console.error(error)
+                alert('❌ Error al iniciar ingestión: ' + error.message)
+            }
         } finally {
             setLoading(false)
+            loadJobs()
+        }
+    }
+
+    const handleCancel = async (jobId) => {
+        try {
+            await adminService.cancelJob(jobId)
+            loadJobs()
+        } catch (error) {
+            console.error(error)
         }
     }
 
@@ -35,10 +80,10 @@ export default function Admin() {
 
                 <button
                     onClick={handleIngest}
-                    disabled={loading}
+                    disabled={loading || hasActiveJob}
                     className="btn-primary w-full md:w-auto"
                 >
-                    {loading ? (
+                    {loading || hasActiveJob ? (
                         <>
                             <span className="material-symbols-outlined animate-spin">refresh</span>
                             Procesando...
@@ -50,6 +95,35 @@ export default function Admin() {
                         </>
                     )}
                 </button>
+
+                {jobs.length > 0 && (
+                    <div className="mt-6 space-y-3">
+                        {jobs.map((job) => (
+                            <div key={job.id} className="p-4 rounded-lg border border-gray-100 dark:border-gray-800">
+                                <div className="flex items-center justify-between gap-4 mb-2">
+                                    <span className="font-semibold">
+                                        #{job.id} · {STATUS_LABELS[job.status] || job.status}
+                                    </span>
+                                    {ACTIVE.includes(job.status) && !job.cancel_requested && (
+                                        <button
+                                            onClick={() => handleCancel(job.id)}
+                                            className="text-sm text-red-500 hover:underline"
+                                        >
+                                            Cancelar
+                                        </button>
+                                    )}
+                                </div>
+                                <div className="w-full h-2 bg-gray-100 dark:bg-gray-800 rounded-full overflow-hidden">
+                                    <div className="h-full bg-primary" style={{ width: `${job.progress}%` }} />
+                                </div>
+                                <p className="text-sm text-gray-500 mt-2">
+                                    {job.cancel_requested && job.status === 'running' ? 'Cancelando...' : job.message}
+                                    {job.created_at && ` · ${new Date(job.created_at + 'Z').toLocaleString()}`}
+                                </p>
+                            </div>
+                        ))}
+                    </div>
+                )}
             </div>
         </div>
     )
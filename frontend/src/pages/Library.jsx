@@ -1,11 +1,26 @@
 import { useState, useEffect } from 'react'
 import { materialService, studyService } from '../services/api'
 
+// Search snippets wrap matches in <mark>; split them out instead of injecting HTML
+function Snippet({ text }) {
+    return (
+        <>
+            {text.split(/(<mark>.*?<\/mark>)/g).map((part, i) =>
+                part.startsWith('<mark>')
+                    ? <mark key={i} className="bg-primary/30 text-inherit rounded px-0.5">{part.slice(6, -7)}</mark>
+                    : <span key={i}>{part}</span>
+            )}
+        </>
+    )
+}
+
 export default function Library() {
     const [entities, setEntities] = useState([])
     const [selectedEntity, setSelectedEntity] = useState(null)
     const [materials, setMaterials] = useState([])
     const [loading, setLoading] = useState(true)
+    const [query, setQuery] = useState('')
+    const [results, setResults] = useState(null)
 
     useEffect(() => {
         loadEntities()
@@ -15,6 +30,23 @@ export default function Library() {
         loadMaterials()
     }, [selectedEntity])
 
+    useEffect(() => {
+        if (query.trim().length < 2) {
+            setResults(null)
+            return
+        }
+        // Debounced so typing does not fire a search per keystroke
+        const timer = setTimeout(async () => {
+            try {
+                const res = await materialService.search(query.trim(), selectedEntity)
+                setResults(res.data)
+            } catch (error) {
+                console.error('Search failed:', error)
+            }
+        }, 300)
+        return () => clearTimeout(timer)
+    }, [query, selectedEntity])
+
     const loadEntities = async () => {
         try {
             const res = await studyService.getEntities()
@@ -48,6 +80,18 @@ export default function Library() {
             <h1 className="text-2xl font-bold mb-2">Biblioteca</h1>
             <p className="text-gray-500 text-sm mb-6">Material de estudio indexado</p>
 
+            {/* Search */}
+            <div className="relative mb-4">
+                <span className="material-symbols-outlined absolute left-3 top-1/2 -translate-y-1/2 text-gray-400">search</span>
+                <input
+                    type="search"
+                    value={query}
+                    onChange={(e) => setQuery(e.target.value)}
+                    placeholder="Buscar en materiales y preguntas"
+                    className="w-full pl-10 pr-4 py-2 rounded-full bg-gray-100 dark:bg-gray-800 text-sm outline-none focus:ring-2 focus:ring-primary"
+                />
+            </div>
+
             {/* Entity Filter */}
             <div className="flex gap-2 overflow-x-auto hide-scrollbar mb-6 -mx-4 px-4">
                 <button
@@ -73,8 +117,35 @@ export default function Library() {
                 ))}
             </div>
 
+            {/* Search Results */}
+            {results && (
+                <div className="space-y-3 mb-6">
+                    {results.materials.length === 0 && results.questions.length === 0 && (
+                        <p className="text-gray-500 text-sm text-center py-4">Sin resultados para "{results.query}"</p>
+                    )}
+                    {results.materials.map(hit => (
+                        <div key={`${hit.material_id}-${hit.page}`} className="card p-4">
+                            <div className="flex items-center justify-between gap-2 mb-1">
+                                <h3 className="font-bold truncate">{hit.title}</h3>
+                                <span className="text-xs text-gray-500 shrink-0">Pág. {hit.page}</span>
+                            </div>
+                            <p className="text-sm text-gray-600 dark:text-gray-300"><Snippet text={hit.snippet} /></p>
+                        </div>
+                    ))}
+                    {results.questions.map(hit => (
+                        <div key={hit.id} className="card p-4">
+                            <div className="flex items-center gap-2 mb-1">
+                                <span className="material-symbols-outlined text-primary text-lg">quiz</span>
+                                <span className="text-xs text-gray-500">Pregunta{hit.page_reference ? ` · ${hit.page_reference}` : ''}</span>
+                            </div>
+                            <p className="text-sm text-gray-600 dark:text-gray-300"><Snippet text={hit.snippet} /></p>
+                        </div>
+                    ))}
+                </div>
+            )}
+
             {/* Materials List */}
-            {loading ? (
+            {results ? null : loading ? (
                 <div className="flex items-center justify-center py-12">
                     <span className="material-symbols-outlined text-primary animate-spin text-4xl">progress_activity</span>
                 </div>
@@ -85,9 +85,13 @@ export const studyService = {
 export const materialService = {
     getAll: (entityId) => api.get('/materials', { params: { entity_id: entityId } }),
     getSuggestions: () => api.get('/materials/suggestions'),
-    reindex: () => api.post('/materials/index')
+    reindex: () => api.post('/materials/index'),
+    search: (q, entityId) => api.get('/search', { params: { q, entity_id: entityId } })
 }
 
 export const adminService = {
-    getStats: () => api.get('/admin/stats')
+    getStats: () => api.get('/admin/stats'),
+    ingestMaterials: () => api.post('/admin/ingest-materials'),
+    getJobs: (params) => api.get('/admin/jobs', { params }),
+    cancelJob: (jobId) => api.post(`/admin/jobs/${jobId}/cancel`)
 }